@@ -0,0 +1,269 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+
+"""
+O_noderの同期処理のベンチマーク
+GoogleのAPIの代わりにFakeServicesを使い、src/network_data/miserables.jsonの登場人物を参加者として順に登録していき、
+call_new_answers()とupdate_databese()の1サイクルごとの、APIの呼び出し回数、送受信したバイト数、反映されるまでの時間を測る。
+実行例: python Benchmark.py --registrations 77 --per-cycle 5 --latency 0.05
+"""
+
+__author__ = 'Muto Tao'
+__version__ = '1.0.0'
+__date__ = '2025.12.4'
+
+import os
+import sys
+import json
+import time
+import argparse
+import tempfile
+from datetime import datetime, timedelta, timezone
+
+from IO import IO
+from FakeServices import FakeServices
+
+
+# Example.pyと同じ構成の、架空のIDと質問
+IDS = {
+    'partic_form': 'fake_partic_form',
+    'app_script': 'fake_app_script',
+    'raw_answers': 'fake_raw_answers',
+    'datasheets': 'fake_datasheets'
+}
+RAW_SHEET = "Form_responses"
+SHEET_NAMES = {
+    "partic": "partic_info",
+    "net": "net_info"
+}
+QUESTIONS = {
+    'name': "0100d475",
+    'prof_image': "6f45dcdb",
+    'friends': "6525c455"
+}
+ANSWERS = {
+    'name': "7157132c",
+    'prof_image': "2737d529",
+    'friends': "1cfca697"
+}
+FILE_NAMES = {
+    'token': 'token.json',
+    'credentials': 'credentials.json',
+    'no_friends_img': "0_No friends / なし",
+    'no_image_img': "NoImage.jpg"
+}
+RAW_HEADER = ["タイムスタンプ", "Name / 名前", "Profile Image / プロフィール画像", IO.FRIENDS_TITLE]
+
+SOURCE_PATH = os.path.join(os.path.dirname(os.path.abspath(__file__)), "..", "src", "network_data", "miserables.json")
+START_TIME = datetime(2025, 1, 1, tzinfo=timezone.utc)  # 最初の登録の日時（登録ごとに1秒ずつ進める）
+
+# --quotaを指定した場合の、1分あたりの呼び出し回数の上限（Googleの既定の、ユーザーあたりの上限）
+GOOGLE_QUOTAS = {
+    "sheets_read": 60,
+    "sheets_write": 60,
+    "forms": 60,
+    "drive": 100,
+    "script": 30
+}
+
+
+def load_registrations(path: str, limit: int = None):
+    """
+    pathのネットワーク（{"nodes": [{"name"}], "links": [{"source", "target"}]}）から、登録順の(名前, 友人の選択肢のリスト)のリストを作る関数
+    各参加者の友人は、その人より前に登録した参加者のうち、リンクで結ばれている人とする。
+    """
+
+    with open(path, 'r', encoding='utf-8') as f:
+        network = json.load(f)
+
+    names = [a_node['name'] for a_node in network['nodes']][:limit]
+    friends = {i: set() for i in range(len(names))}
+    for a_link in network['links']:
+        source, target = a_link['source'], a_link['target']
+        if source < len(names) and target < len(names) and source != target:
+            friends[max(source, target)].add(min(source, target))
+
+    return [
+        (a_name, [f"{j + 1}_{names[j]}" for j in sorted(friends[i])] or [FILE_NAMES['no_friends_img']])
+        for i, a_name in enumerate(names)
+    ]
+
+
+def make_response(reg_num: int, name: str, friends: list):
+    """
+    reg_num番目の登録の、participants_formの回答を作る関数
+    """
+
+    timestamp = (START_TIME + timedelta(seconds=reg_num)).isoformat(timespec='milliseconds').replace("+00:00", "Z")
+    return {
+        "responseId": f"response_{reg_num}",
+        "createTime": timestamp,
+        "lastSubmittedTime": timestamp,
+        "answers": {
+            ANSWERS['name']: {"questionId": ANSWERS['name'], "textAnswers": {"answers": [{"value": name}]}},
+            ANSWERS['friends']: {"questionId": ANSWERS['friends'], "textAnswers": {"answers": [{"value": a_friend} for a_friend in friends]}}
+        }
+    }
+
+
+def register(fake: FakeServices, reg_num: int, name: str, friends: list):
+    """
+    reg_num番目の登録を、participants_formの回答とraw_answersの行として追加する関数
+    """
+
+    response = make_response(reg_num, name, friends)
+    fake.add_response(IDS['partic_form'], response)
+    jst = datetime.fromisoformat(response['lastSubmittedTime'].replace("Z", "+00:00")).astimezone(timezone(timedelta(hours=9)))
+    fake.append_rows(IDS['raw_answers'], RAW_SHEET, [[jst.strftime('%Y/%m/%d %H:%M:%S'), name, "", ", ".join(friends)]])
+
+
+def setup_fake(latency: float, quotas: dict, error_rate: float, seed: int):
+    """
+    空のraw_answers、datasheets、participants_formを持つFakeServicesを作り、IOが使うように登録する関数
+    """
+
+    fake = FakeServices(LATENCY=latency, QUOTAS=quotas, ERROR_RATE=error_rate, SEED=seed)
+    fake.add_spreadsheet(IDS['raw_answers'], [RAW_SHEET], created_time=START_TIME.isoformat().replace("+00:00", "Z"))
+    fake.add_spreadsheet(IDS['datasheets'], list(SHEET_NAMES.values()))
+    fake.add_form(IDS['partic_form'], [
+        {"itemId": QUESTIONS['name'], "title": RAW_HEADER[1], "questionItem": {"question": {"questionId": ANSWERS['name'], "textQuestion": {}}}},
+        {"itemId": QUESTIONS['prof_image'], "title": RAW_HEADER[2], "questionItem": {"question": {"questionId": ANSWERS['prof_image'], "fileUploadQuestion": {}}}},
+        {"itemId": QUESTIONS['friends'], "title": IO.FRIENDS_TITLE, "questionItem": {"question": {"questionId": ANSWERS['friends'], "choiceQuestion": {
+            "type": "CHECKBOX", "options": [{"value": FILE_NAMES['no_friends_img']}]
+        }}}}
+    ])
+    fake.append_rows(IDS['raw_answers'], RAW_SHEET, [RAW_HEADER])
+    fake.install()
+    return fake
+
+
+def check_consistency(fake: FakeServices, an_io: IO, registered: int):
+    """
+    datasheetsのpartic_infoの行数と、participants_formの知り合いの選択肢の数が、登録数と一致し、データベースの登録番号が1から隙間なく並んでいればTrueを返す関数
+    """
+
+    partic_rows = len(fake.get_sheet_values(IDS['datasheets'], SHEET_NAMES['partic'])) - 1  # 第1行はヘッダ
+    form = fake.forms[IDS['partic_form']]['form']
+    options = sum(
+        len(an_item['questionItem']['question']['choiceQuestion']['options'])
+        for an_item in form['items'] if an_item['title'].startswith(IO.FRIENDS_TITLE)
+    ) - 1  # 最初の質問の「なし」の選択肢
+    reg_nums = [a_partic['reg_num'] for a_partic in an_io.STORE.get_participants()]
+    return partic_rows == registered and options == registered and reg_nums == list(range(1, registered + 1))
+
+
+def run(args):
+    """
+    ベンチマークを実行し、結果の辞書を返す関数
+    """
+
+    registrations = load_registrations(args.source, args.registrations)
+    fake = setup_fake(args.latency, GOOGLE_QUOTAS if args.quota else None, args.error_rate, args.seed)
+    for reg_num, (name, friends) in enumerate(registrations[:args.initial], start=1):
+        register(fake, reg_num, name, friends)
+
+    with tempfile.TemporaryDirectory() as work_dir:
+        file_paths = {
+            'net': os.path.join(work_dir, "network_data.json"),
+            'prof': os.path.join(work_dir, "images") + os.sep,
+            'db': os.path.join(work_dir, "o_noder.db")
+        }
+        os.makedirs(file_paths['prof'])
+
+        # 起動
+        start = time.perf_counter()
+        an_io = IO(IDS, RAW_SHEET, SHEET_NAMES, ANSWERS, QUESTIONS, None, file_paths, FILE_NAMES, args.layout, args.bucket_size)
+        an_io.wait_exports()
+        result = {
+            "bootstrap": {"time": round(time.perf_counter() - start, 3), "registered": args.initial, **fake.get_totals()},
+            "cycles": []
+        }
+
+        # 登録を、per_cycle人ずつ再生する。
+        reg_num = args.initial
+        while reg_num < len(registrations):
+            batch = registrations[reg_num:reg_num + args.per_cycle]
+            for counter, (name, friends) in enumerate(batch, start=1):
+                register(fake, reg_num + counter, name, friends)
+            reg_num += len(batch)
+            fake.reset_stats()
+
+            start = time.perf_counter()
+            fetched = an_io.call_new_answers()
+            fetch_time = time.perf_counter() - start
+            an_io.update_databese()
+            returned = time.perf_counter() - start
+            an_io.wait_exports()
+            latency = an_io.SCHEDULER.get_stats()
+
+            result['cycles'].append({
+                "registered": reg_num,
+                "new": fetched,
+                **fake.get_totals(),
+                "return": round(returned, 3),  # update_databese()から戻るまでの時間
+                "graph": round(fetch_time + latency['graph']['latency_last'], 3),  # 取得してから、それぞれが反映されるまでの時間
+                "form": round(fetch_time + latency['form']['latency_last'], 3),
+                "datasheets": round(fetch_time + latency['datasheets']['latency_last'], 3),
+                "calls_by_method": fake.get_stats()
+            })
+
+        result['consistent'] = check_consistency(fake, an_io, reg_num)
+        result['rate_limits'] = an_io.LIMITER.get_stats()
+        result['retries'] = an_io.get_retry_stats()
+        an_io.THUMBNAILER.wait()
+
+    return result
+
+
+def print_result(result: dict):
+    """
+    ベンチマークの結果を表として表示する関数
+    """
+
+    boot = result['bootstrap']
+    print(f"bootstrap: {boot['time']}s, {boot['registered']} registered, {boot['calls']} calls, sent {boot['bytes_sent']} B, received {boot['bytes_received']} B")
+    print(f"{'cycle':>5} {'total':>6} {'new':>4} {'calls':>6} {'errors':>6} {'sent[B]':>9} {'recv[B]':>9} {'return[s]':>9} {'graph[s]':>9} {'form[s]':>8} {'sheets[s]':>9}")
+    for i, a_cycle in enumerate(result['cycles'], start=1):
+        print(f"{i:>5} {a_cycle['registered']:>6} {a_cycle['new']:>4} {a_cycle['calls']:>6} {a_cycle['errors']:>6} {a_cycle['bytes_sent']:>9} {a_cycle['bytes_received']:>9} "
+              f"{a_cycle['return']:>9} {a_cycle['graph']:>9} {a_cycle['form']:>8} {a_cycle['datasheets']:>9}")
+
+    cycles = result['cycles']
+    if cycles:
+        calls = {}
+        for a_cycle in cycles:
+            for method_id, a_stat in a_cycle['calls_by_method'].items():
+                calls[method_id] = calls.get(method_id, 0) + a_stat['calls']
+        print(f"per cycle: {sum(c['calls'] for c in cycles) / len(cycles):.1f} calls, "
+              f"{sum(c['bytes_sent'] + c['bytes_received'] for c in cycles) / len(cycles):.0f} B, "
+              f"form visible after {sum(c['form'] for c in cycles) / len(cycles):.3f}s, graph after {sum(c['graph'] for c in cycles) / len(cycles):.3f}s")
+        print(f"calls by method: {calls}")
+    print(f"retries: {result['retries']}")
+    print(f"consistent: {result['consistent']}")
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Replay synthetic registrations against in-memory Google APIs and measure each sync cycle.")
+    parser.add_argument('--source', default=SOURCE_PATH, help="network JSON whose nodes are registered in order")
+    parser.add_argument('--registrations', type=int, default=None, help="number of registrations to replay (default: all nodes)")
+    parser.add_argument('--initial', type=int, default=0, help="registrations that already exist at startup")
+    parser.add_argument('--per-cycle', type=int, default=1, help="registrations picked up by each cycle")
+    parser.add_argument('--latency', type=float, default=0.0, help="seconds added to every API call")
+    parser.add_argument('--quota', action='store_true', help="enforce Google's default per-minute quotas (429 when exceeded)")
+    parser.add_argument('--error-rate', type=float, default=0.0, help="probability that a call fails with 429")
+    parser.add_argument('--layout', choices=IO.NET_LAYOUTS, default="matrix", help="net_info layout")
+    parser.add_argument('--bucket-size', type=int, default=0, help="FRIENDS_BUCKET_SIZE")
+    parser.add_argument('--seed', type=int, default=0)
+    parser.add_argument('--json', help="also write the full result to this file")
+    args = parser.parse_args()
+
+    result = run(args)
+    print_result(result)
+    if args.json:
+        with open(args.json, 'w', encoding='utf-8') as f:
+            json.dump(result, f, ensure_ascii=False, indent=2)
+
+    sys.exit(0 if result['consistent'] else 1)
+
+
+if __name__ == "__main__":
+    main()
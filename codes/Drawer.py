@@ -11,10 +11,18 @@ __date__ = '2025.12.4'
 
 
 import os
+import json
+import math
+import time
 import glob
+import itertools
+import random
+import hashlib
 import igraph as ig
 import re
 
+from Thumbnailer import Thumbnailer
+
 
 class Drawer:
     """
@@ -22,9 +30,37 @@ class Drawer:
     """
 
     # ハイパーパラメータ
-    LAYOUT_ALGORITHM = "kk"
+    LAYOUT_ALGORITHM = "auto"  # レイアウトの計算方法（"auto": グラフの大きさとLAYOUT_BUDGETから選ぶ, LAYOUT_ENGINESの名前: 常にそれを使う, それ以外: 警告して"kk"を使う）
+    DEFAULT_ALGORITHM = "kk"  # LAYOUT_ALGORITHMが不明な名前の場合に使う計算方法
+    LAYOUT_BUDGET = 10.0  # "auto"の場合に、ランダムな初期値からの計算にかけてよい時間の目安[秒]
+    # レイアウトの計算方法の候補（品質の良い順。"auto"では、見積もった計算時間がLAYOUT_BUDGETに収まる最初のものを選ぶ）
+    #   cost: 計算時間の見積もり[秒]の、sizeに対する係数（実際にランダムな初期値から計算した時間で更新する）
+    #   size: ノード数Nとエッジ数Lに対する計算量（FRの格子による近似は2次元のみで、3次元では全ノードの組の反発力を求めるので N×N になる）
+    #   max_nodes: これより多いノードのグラフには使わない（KKは、N×Nの距離行列を持つ）。
+    #   warm_iterations: 前回から変化したノード1つあたりの反復回数（Noneなら、反復回数を指定せずに前回の座標を初期値にする）
+    #   iterations: igraphの既定の反復回数（差分の計算は、これを上限にする）
+    #   chunk: ANYTIME_BUDGETを指定した場合に、1度に続けて行う反復回数（Noneなら、区切らずに最後まで計算する）
+    LAYOUT_ENGINES = {
+        "kk": {"cost": 2.5e-6, "size": lambda N, L: N * N, "max_nodes": 3000, "warm_iterations": 30, "iterations": lambda N: 50 * N, "chunk": lambda N: max(N, 100)},
+        "fr": {"cost": 2.0e-6, "size": lambda N, L: N * N + L, "max_nodes": None, "warm_iterations": 4, "iterations": lambda N: 500, "chunk": lambda N: 10},
+        "drl": {"cost": 2.0e-3, "size": lambda N, L: N + L, "max_nodes": None, "warm_iterations": None, "iterations": None, "chunk": None}
+    }
+    ANYTIME_BUDGET = None  # 1つのDrawerのレイアウトの計算にかける時間の上限[秒]（例えば0.2）。指定すると、区切って計算し、時間切れになったら残りを次のDrawerに持ち越す（Noneなら最後まで計算する）。
+    ENGINE_SWITCH_RATIO = 2.0  # 前回の計算方法は、見積もった計算時間が選んだものの何倍を超えたら替えるか（頻繁に替わって、グラフの見た目が変わらないようにする）。
+    WARM_START = True  # 前回のDrawerの座標を初期値にして、レイアウトを差分だけ計算し直す（Falseなら毎回ランダムな初期値から計算する）。
+    WARM_MIN_ITERATIONS = 10  # 差分の計算の最低限の反復回数
+    STRESS_SOURCES = 10  # レイアウトのストレスを、この数のノードからの距離で見積もる（ANYTIME_BUDGETの場合は区切りごとに求めるので、少なめにする）。
+    NEW_NODE_JITTER = 0.1  # 新しいノードを、友人の重心からこの距離（エッジの平均の長さとの比）だけずらして置く。
+    IMG_URL_BASE = "/img/"  # プロフィール画像を、内容のハッシュ値で配信するURL（Example.pyのルートと対応）
+
+    # プロフィール画像のハッシュ値のキャッシュ。Drawerは更新のたびに作り直されるので、クラスで共有する。
+    img_digests = {}  # (画像のpath, 更新日時, サイズ) → ハッシュ値（Drawerを作るたびに、無くなった・変わった画像の分を消す）
+    img_paths = {}  # ハッシュ値 → 画像のpath
+    versions = itertools.count(1)  # Drawerを作るたびに増える版数
+    measured_costs = {}  # レイアウトの計算方法 → 実際の計算時間から求めた、costの値
 
     # データ
+    version: int  # このDrawer（グラフの座標と描画用のデータの組）の版数
     data: dict
     node_data: dict
     edge_data: dict
@@ -35,6 +71,15 @@ class Drawer:
     L: int
     labels: list
     group: list
+    layout_time: float  # レイアウトの計算にかかった時間[秒]
+    view_json: str  # 作成時に構築した、描画用のデータ（const_view_data()）のJSON
+    layout_mode: str  # レイアウトの計算方法（"cold": ランダムな初期値から, "warm": 前回の座標から, "refine": 前回打ち切った計算の続き, "reuse": 変化が無く前回の座標をそのまま使用）
+    layout_iterations: int  # レイアウトの計算の反復回数（"cold"の場合はigraphの既定値）
+    layout_engine: str  # レイアウトの計算方法（LAYOUT_ENGINESの名前）
+    layout_report: dict  # レイアウトの計算の報告（"engine", "runtime": igraphの計算時間[秒], "stress": 正規化したストレス, "iterations": 行った反復回数）
+    layout_remaining: int  # ANYTIME_BUDGETで打ち切られ、次のDrawerに持ち越した反復回数（0なら計算が完了している）
+    layout_temp: float  # 持ち越した計算を続けるときの、FRの温度
+    changed_nodes: int  # 前回のDrawerから、追加されたか、友人関係が変わったノードの数
 
     # グラフの情報
     lyout: ig
@@ -50,12 +95,16 @@ class Drawer:
     }
 
 
-    def __init__(self, graph_data, FILE_PATHS, FILE_NAMES):
+    def __init__(self, graph_data, FILE_PATHS, FILE_NAMES, previous=None, worker=None):
         """
         コンストラクタ
+        作成後は変更しないので、完成したものを別スレッドからそのまま読める（差し替えるときは、新しいDrawerを作る）。
+            previous: 前回のDrawer。指定すると、その座標を初期値にして、変化した分だけレイアウトを計算し直す。
+            worker: レイアウトを計算するLayoutWorker。指定すると、計算を別プロセスで行う（Noneなら、このスレッドで行う）。
         """
 
         # グラフのデータを獲得
+        self.version = next(Drawer.versions)
         self.data = graph_data
         self.FILE_PATHS = FILE_PATHS
         self.FILE_NAMES = FILE_NAMES
@@ -69,19 +118,192 @@ class Drawer:
             self.group.append(0)
 
         # グラフオブジェクトの生成
-        self.laout = ig.Graph(n=self.N, edges=self.edges, directed=False).layout(self.LAYOUT_ALGORITHM, dim=3)  # 明示的にノード数を伝えることで、他と繋がりのないノードも表示できるようにする。
+        layout_start = time.perf_counter()
+        self.laout = self.compute_layout(previous, worker)
+        self.layout_time = time.perf_counter() - layout_start
 
         # 描画に向けた設定
+        Drawer.prune_img_cache()
         self.set_coord()  # グラフの要素の座標を計算
-        self.const_view_data()  # グラフの描画設定
+        self.view_json = json.dumps(self.const_view_data(), ensure_ascii=False)  # グラフの描画設定。/data はこれをそのまま返す。
+
+
+    def compute_layout(self, previous=None, worker=None):
+        """
+        グラフの3次元のレイアウトを計算して返す関数
+        previousがあれば、その座標を初期値（新しいノードは友人の重心の近く）にして、変化したノードの数に応じた少ない反復回数で計算し直す。
+        これにより、計算量がグラフ全体ではなく変化の大きさに応じたものになり、描画されたグラフも更新のたびに大きく動かなくなる。
+        """
+
+        self.changed_nodes = self.N
+        self.layout_iterations = 0
+        self.layout_remaining = 0
+        self.layout_temp = 0.0
+        self.layout_engine = self.select_engine(previous)
+        self.layout_report = {"engine": self.layout_engine, "runtime": 0.0, "stress": None, "iterations": 0}
+        engine = self.LAYOUT_ENGINES[self.layout_engine]
+        anytime = self.ANYTIME_BUDGET is not None and engine['chunk'] is not None
+        job = {"algorithm": self.layout_engine, "seed": None, "stress_sources": self.STRESS_SOURCES}  # レイアウトの計算の設定（run_layout()に渡す）
+        if not self.N:
+            self.layout_mode = "reuse"
+            return ig.Layout([], dim=3)
+        seed = None
+        if self.WARM_START and previous is not None and previous.N:
+            seed, self.changed_nodes = self.seed_coords(previous)
+        if seed is None:  # 前回のDrawerが無いか、前回と共通のノードが無い場合は、ランダムな初期値から計算する。
+            self.layout_mode = "cold"
+            if anytime:
+                job.update(iterations=engine['iterations'](self.N), start_temp=math.sqrt(self.N) / 10)
+        else:
+            carried = previous.layout_remaining if previous.layout_engine == self.layout_engine else 0  # 前回のDrawerが打ち切った反復回数
+            if self.changed_nodes == 0 and not (anytime and carried):
+                self.layout_mode = "reuse"
+                self.layout_report['stress'] = previous.layout_report['stress']
+                return ig.Layout(seed)
+
+            self.layout_mode = "warm" if self.changed_nodes else "refine"  # "refine": 変化は無いが、前回のDrawerが打ち切った計算を続ける。
+            if engine['warm_iterations'] is not None and self.changed_nodes:
+                self.layout_iterations = min(engine['iterations'](self.N), max(self.WARM_MIN_ITERATIONS, engine['warm_iterations'] * self.changed_nodes))
+            # FRは、反復の最初に動かせる距離（温度）も、変化したノードの割合に応じて小さくする（既定値は sqrt(N) / 10）。
+            start_temp = math.sqrt(self.N) / 10 * max(0.1, min(1.0, self.changed_nodes / self.N)) if self.changed_nodes else 0.0
+            if anytime and carried:
+                self.layout_iterations = min(engine['iterations'](self.N), self.layout_iterations + carried)
+                start_temp = max(start_temp, previous.layout_temp)
+            previous_names = set(previous.labels)
+            anchors = [k for k, name in enumerate(self.labels) if name in previous_names]  # 前回から引き継いだノード（向きを揃える基準）
+            job.update(seed=seed, anchors=anchors, iterations=self.layout_iterations, start_temp=start_temp)
+
+        if anytime:
+            job.update(budget=self.ANYTIME_BUDGET, chunk=engine['chunk'](self.N))
+
+        coords = None
+        if worker is not None:
+            try:
+                coords, self.layout_report = worker.layout(self.N, self.edges, job)
+            except Exception as e:  # 別プロセスで計算できなかった場合は、このスレッドで計算する。
+                print(f"Error in \"Drawer.compute_layout()\": {e}")
+        if coords is None:
+            coords, self.layout_report = run_layout(self.N, self.edges, job)
+
+        if anytime:  # 打ち切った分は、次のDrawerに持ち越す。
+            self.layout_remaining = job['iterations'] - self.layout_report['iterations']
+            self.layout_temp = job['start_temp'] * self.layout_remaining / job['iterations'] if job['iterations'] else 0.0
+            self.layout_iterations = self.layout_report['iterations']
+
+        if self.layout_mode == "cold" and not anytime:  # 次に選ぶときのために、計算時間の見積もりを実際の計算時間に合わせる。
+            size = engine['size'](self.N, self.L)
+            if size > 0:
+                cost = self.layout_report['runtime'] / size
+                Drawer.measured_costs[self.layout_engine] = (Drawer.measured_costs.get(self.layout_engine, cost) + cost) / 2  # 計算時間のばらつきをならす。
+        return ig.Layout(coords)
+
+
+    def layout_summary(self):
+        """
+        レイアウトの計算の概要（トレースのタグに使う）を辞書で返すメソッド
+        """
+
+        return {
+            "version": self.version,
+            "engine": self.layout_engine,
+            "layout": self.layout_mode,
+            "changed": self.changed_nodes,
+            "iterations": self.layout_iterations,
+            "remaining": self.layout_remaining,
+            "stress": self.layout_report['stress']
+        }
+
+
+    def select_engine(self, previous=None):
+        """
+        LAYOUT_ENGINESから、このグラフのレイアウトの計算方法を選んで、その名前を返す関数
+        LAYOUT_ALGORITHMが"auto"でなければ、それを返す（LAYOUT_ENGINESに無い名前の場合は、警告してDEFAULT_ALGORITHMを使う）。"auto"の場合は、ノード数の上限を満たし、見積もった計算時間がLAYOUT_BUDGETに収まる最初のもの（無ければ最も速いもの）を選ぶ。
+        ただし、前回のDrawer previousの計算方法が、LAYOUT_BUDGETに収まるか、選んだものより極端に遅くなければ、そのまま使い続ける。
+        """
+
+        if self.LAYOUT_ALGORITHM != "auto":
+            if self.LAYOUT_ALGORITHM not in self.LAYOUT_ENGINES:
+                print(f"Warning in \"Drawer.select_engine()\": unknown LAYOUT_ALGORITHM \"{self.LAYOUT_ALGORITHM}\", using \"{self.DEFAULT_ALGORITHM}\" instead.")
+                Drawer.LAYOUT_ALGORITHM = self.DEFAULT_ALGORITHM  # 警告はDrawerを作るたびではなく、1度だけにする。
+            return Drawer.LAYOUT_ALGORITHM
+
+        candidates = [name for name, engine in self.LAYOUT_ENGINES.items() if engine['max_nodes'] is None or self.N <= engine['max_nodes']]
+        choice = next((name for name in candidates if self.estimate_time(name) <= self.LAYOUT_BUDGET), None) or min(candidates, key=self.estimate_time)
+
+        if previous is not None and previous.layout_engine in candidates and previous.layout_engine != choice:
+            estimate = self.estimate_time(previous.layout_engine)
+            if estimate <= self.LAYOUT_BUDGET or estimate <= self.ENGINE_SWITCH_RATIO * self.estimate_time(choice):
+                return previous.layout_engine
+        return choice
+
+
+    def estimate_time(self, name: str):
+        """
+        計算方法nameで、このグラフのレイアウトをランダムな初期値から計算する時間[秒]の見積もりを返すヘルパー関数
+        """
+
+        engine = self.LAYOUT_ENGINES[name]
+        return Drawer.measured_costs.get(name, engine['cost']) * engine['size'](self.N, self.L)
+
+
+    def seed_coords(self, previous):
+        """
+        前回のDrawer previousの座標から、レイアウトの初期値と、前回から変化したノードの数を求めるヘルパー関数
+        ノードは名前で対応づける。新しいノードは、すでに座標のある友人の重心の近く（友人がいなければ、前回のグラフの範囲内のランダムな位置）に置く。
+        前回と共通のノードが1つも無い場合は、初期値としてNoneを返す。
+        """
+
+        old_coords = dict(zip(previous.labels, previous.laout.coords))  # Layout.coordsは呼ぶたびに全体を複製するので、1度だけ呼ぶ。
+        old_links = {frozenset((previous.labels[s], previous.labels[t])) for s, t in previous.edges}
+        index = {name: k for k, name in enumerate(self.labels)}
+        neighbors = [[] for _ in range(self.N)]
+        new_links = set()
+        for s, t in self.edges:
+            neighbors[s].append(t)
+            neighbors[t].append(s)
+            new_links.add(frozenset((self.labels[s], self.labels[t])))
+
+        # 追加されたノードと、友人関係が追加・削除されたノードを、変化したノードとする。
+        seed = [list(old_coords[name]) if name in old_coords else None for name in self.labels]
+        new_nodes = [k for k in range(self.N) if seed[k] is None]
+        changed = set(new_nodes)
+        for a_link in new_links ^ old_links:
+            changed.update(index[name] for name in a_link if name in index)
+
+        # 新しいノードを、すでに置いた友人の重心の近くに置く（友人も新しい場合があるので、置けるノードがなくなるまで繰り返す）。
+        placed = [c for c in seed if c is not None]
+        if not placed:
+            return None, self.N
+        center = [sum(c[d] for c in placed) / len(placed) for d in range(3)]
+        spread = max(max(abs(c[d] - center[d]) for c in placed for d in range(3)), 1.0)
+        lengths = [math.dist(seed[s], seed[t]) for s, t in self.edges if seed[s] is not None and seed[t] is not None]
+        jitter = self.NEW_NODE_JITTER * (sum(lengths) / len(lengths) if lengths else 1.0)
+        remaining = new_nodes
+        while remaining:
+            unplaced = []
+            for k in remaining:
+                friends = [seed[j] for j in neighbors[k] if seed[j] is not None]
+                if friends:
+                    seed[k] = [sum(c[d] for c in friends) / len(friends) + random.uniform(-jitter, jitter) for d in range(3)]
+                else:
+                    unplaced.append(k)
+            if len(unplaced) == len(remaining):  # 座標のある友人がいないノードは、前回のグラフの範囲内に置く。
+                for k in unplaced:
+                    seed[k] = [center[d] + random.uniform(-spread, spread) for d in range(3)]
+                break
+            remaining = unplaced
+
+        return seed, len(changed)
+
 
-    
     def set_coord(self):
         """
         グラフの要素（ノードとエッジ）の座標を計算し、フィールドに保存する関数
         """
 
-        # ノードの座標リスト作成
+        # ノードの座標リスト作成（クラスの辞書を書き換えないよう、Drawerごとに作る）
+        self.node_pos = {}
+        self.edge_pos = {}
         self.node_pos['Xn'] = [self.laout[k][0] for k in range(self.N)]
         self.node_pos['Yn'] = [self.laout[k][1] for k in range(self.N)]
         self.node_pos['Zn'] = [self.laout[k][2] for k in range(self.N)]
@@ -108,16 +330,22 @@ class Drawer:
         nodes = []
         for i, node_info in enumerate(self.data['nodes']):
             safe_name = re.sub(r'[\\/:*?"<>|]', '_', node_info['name'])  # windows禁止記号を _ に置き換える。
-            tmp = glob.glob(os.path.join(self.FILE_PATHS['prof'], f"{safe_name}.*"))
-            if tmp:  # プロフィール画像が存在する場合
+            thumb = glob.glob(os.path.join(self.FILE_PATHS['prof'], Thumbnailer.THUMB_DIR, f"{glob.escape(safe_name)}.*"))
+            tmp = glob.glob(os.path.join(self.FILE_PATHS['prof'], f"{glob.escape(safe_name)}.*"))
+            if thumb:  # 円形に切り抜いた縮小版が存在する場合は、それを渡す。
+                img_filename = f"{Thumbnailer.THUMB_DIR}/{os.path.basename(thumb[0])}"
+            elif tmp:  # プロフィール画像が存在する場合
                 img_filename = os.path.basename(tmp[0])  # 画像ファイル名を指定
             else:
-                img_filename = self.FILE_NAMES['no_image_img']
+                thumb = glob.glob(os.path.join(self.FILE_PATHS['prof'], Thumbnailer.THUMB_DIR, f"{glob.escape(os.path.splitext(self.FILE_NAMES['no_image_img'])[0])}.*"))
+                img_filename = f"{Thumbnailer.THUMB_DIR}/{os.path.basename(thumb[0])}" if thumb else self.FILE_NAMES['no_image_img']
 
             nodes.append({
                 "id": node_info.get('name', f"Node_{i}"), # 名前をIDとして使用
                 "img": img_filename,
                 "img_id": node_info.get('img_id'),
+                "img_thumb": bool(thumb),  # Trueなら、imgは切り抜き済みの縮小版
+                "img_url": self.img_url(img_filename),  # ローカルの画像を内容のハッシュ値で配信するURL
                 "fx": coords[i][0] * scale,
                 "fy": coords[i][1] * scale,
                 "fz": coords[i][2] * scale
@@ -136,3 +364,229 @@ class Drawer:
                 })
 
         return {"nodes": nodes, "links": links}
+
+
+    def img_url(self, img_filename: str):
+        """
+        プロフィール画像のディレクトリにある画像img_filenameを、内容のハッシュ値で配信するURLを返すヘルパー関数
+        ハッシュ値は、画像の更新日時とサイズが変わらない限りキャッシュを使う。画像が無い場合はNoneを返す。
+        """
+
+        path = os.path.join(self.FILE_PATHS['prof'], img_filename)
+        try:
+            stat = os.stat(path)
+        except OSError:
+            return None
+
+        key = (path, stat.st_mtime_ns, stat.st_size)
+        digest = Drawer.img_digests.get(key)
+        if digest is None:
+            with open(path, 'rb') as f:
+                digest = hashlib.sha256(f.read()).hexdigest()[:32]
+            Drawer.img_digests[key] = digest
+            Drawer.img_paths[digest] = path
+
+        return f"{self.IMG_URL_BASE}{digest}{os.path.splitext(img_filename)[1]}"
+
+
+    @classmethod
+    def find_img(cls, digest: str):
+        """
+        ハッシュ値digestの画像のpathを返すメソッド
+        画像が無いか、内容が変わっている場合はNoneを返す。
+        """
+
+        path = cls.img_paths.get(digest)
+        if path is None:
+            return None
+        try:
+            stat = os.stat(path)
+        except OSError:
+            return None
+
+        if cls.img_digests.get((path, stat.st_mtime_ns, stat.st_size)) != digest:
+            return None
+        return path
+
+
+    @classmethod
+    def prune_img_cache(cls):
+        """
+        画像のハッシュ値のキャッシュから、無くなった画像と、更新された画像の古い内容の分を消すメソッド
+        /img の応答が別スレッドで読んでいるので、辞書は書き換えずに作り直して差し替える。
+        """
+
+        current = {}
+        for path in {key[0] for key in list(cls.img_digests)}:
+            try:
+                stat = os.stat(path)
+            except OSError:
+                continue
+            current[path] = (path, stat.st_mtime_ns, stat.st_size)
+
+        digests = {key: digest for key, digest in list(cls.img_digests.items()) if current.get(key[0]) == key}
+        live = set(digests.values())
+        cls.img_paths = {digest: path for digest, path in list(cls.img_paths.items()) if digest in live}
+        cls.img_digests = digests
+
+
+def run_layout(N: int, edges: list, job: dict):
+    """
+    N個のノードとエッジedgesからなるグラフの3次元のレイアウトを、設定jobに従って計算し、座標のリストと計算の報告の組を返す関数
+    LayoutWorkerから別プロセスで実行するため、クラスの外に置く。
+        job: "algorithm"（LAYOUT_FUNCTIONSの名前）, "seed"（初期値。Noneならランダムな初期値から計算する）, "iterations"（Noneなら既定の反復回数）, "start_temp", "stress_sources",
+             "budget"（指定すると、"chunk"回ずつ反復し、この時間[秒]を過ぎたら打ち切る）
+    """
+
+    graph = ig.Graph(n=N, edges=edges, directed=False)  # 明示的にノード数を伝えることで、他と繋がりのないノードも表示できるようにする。
+    sources = random.sample(range(N), min(job.get('stress_sources', 0), N))  # 同じノードからの距離で、ストレスを比べる。
+    if job.get('budget') is not None:
+        return run_anytime(graph, job, sources)
+
+    start = time.perf_counter()
+    a_layout = LAYOUT_FUNCTIONS[job['algorithm']](graph, job)
+    runtime = time.perf_counter() - start
+    if job['seed'] is not None:
+        a_layout = align_layout(a_layout, job['seed'], job.get('anchors'))
+
+    report = {"engine": job['algorithm'], "runtime": runtime, "stress": layout_stress(graph, a_layout.coords, sources), "iterations": job.get('iterations') or 0}
+    return a_layout.coords, report
+
+
+def run_anytime(graph: ig.Graph, job: dict, sources: list):
+    """
+    graphのレイアウトを、前回の座標job["seed"]から"chunk"回ずつ、合計"iterations"回まで反復して計算し、"budget"[秒]を過ぎたら打ち切る関数
+    反復の区切りごとにストレスを求め、それまでで最も小さい座標と、計算の報告（"iterations"は実際に行った反復回数）の組を返す。
+    FRの温度は、区切りごとに、全体の進み具合に応じて下げる。
+    """
+
+    start = time.perf_counter()
+    coords = job['seed']
+    best, best_stress = coords, (layout_stress(graph, coords, sources) if coords is not None else None)
+    done = 0
+    while done < job['iterations'] and (done == 0 or time.perf_counter() - start < job['budget']):  # 最初の区切りは、時間に関わらず計算する。
+        count = min(job['chunk'], job['iterations'] - done)
+        a_job = dict(job, seed=coords, iterations=count, start_temp=job['start_temp'] * (1 - done / job['iterations']))
+        a_layout = LAYOUT_FUNCTIONS[job['algorithm']](graph, a_job)
+        if coords is not None:
+            a_layout = align_layout(a_layout, coords, job.get('anchors'))
+        coords = a_layout.coords
+        done += count
+
+        stress = layout_stress(graph, coords, sources)
+        if best is None or best_stress is None or (stress is not None and stress < best_stress):
+            best, best_stress = coords, stress
+
+    report = {"engine": job['algorithm'], "runtime": time.perf_counter() - start, "stress": best_stress, "iterations": done}
+    return best, report
+
+
+def layout_kk(graph: ig.Graph, job: dict):
+    """
+    Kamada-Kawai法で、graphのレイアウトを計算する関数
+    """
+
+    options = {"maxiter": job['iterations']} if job.get('iterations') else {}
+    return graph.layout_kamada_kawai(seed=job['seed'], dim=3, **options)
+
+
+def layout_fr(graph: ig.Graph, job: dict):
+    """
+    Fruchterman-Reingold法で、graphのレイアウトを計算する関数
+    igraphの格子による近似（grid）は2次元のレイアウトにしか使われないので、指定しない（LAYOUT_ENGINESの計算量は、これに合わせて N×N としている）。
+    """
+
+    options = {"niter": job['iterations']} if job.get('iterations') else {}
+    if job.get('start_temp'):
+        options['start_temp'] = job['start_temp']
+    return graph.layout_fruchterman_reingold(seed=job['seed'], dim=3, **options)
+
+
+def layout_drl(graph: ig.Graph, job: dict):
+    """
+    DrL法で、graphのレイアウトを計算する関数（前回の座標がある場合は、仕上げの段階の設定"refine"だけを行う）
+    """
+
+    if job['seed'] is None:
+        return graph.layout_drl(dim=3)
+    return graph.layout_drl(seed=job['seed'], options="refine", dim=3)
+
+
+# レイアウトの計算方法の名前 → 計算する関数（Drawer.LAYOUT_ENGINESの名前と対応。別プロセスからも使うので、モジュールに置く）
+LAYOUT_FUNCTIONS = {
+    "kk": layout_kk,
+    "fr": layout_fr,
+    "drl": layout_drl
+}
+
+
+def layout_stress(graph: ig.Graph, coords: list, sources: list):
+    """
+    レイアウトcoordsの、グラフ上の距離に対するストレス（sum((s * 座標の距離 - グラフ上の距離)^2 / グラフ上の距離^2) / ノードの組の数）を返す関数
+    sは、ストレスが最小になるよう全体を拡大・縮小する係数。sourcesのノードからの距離だけで見積もる（sourcesが空ならNoneを返す）。
+    """
+
+    if not sources or len(coords) < 2:
+        return None
+
+    pairs = []
+    for i, row in zip(sources, graph.distances(source=sources)):
+        for j, d in enumerate(row):
+            if 0 < d < math.inf:
+                pairs.append((math.dist(coords[i], coords[j]), d))
+    if not pairs:
+        return None
+
+    # (s * e - d)^2 / d^2 の和を最小にするsは、sum(e / d) / sum(e^2 / d^2)
+    denominator = sum((e / d) ** 2 for e, d in pairs)
+    scale = sum(e / d for e, d in pairs) / denominator if denominator else 1.0
+    return sum((scale * e / d - 1) ** 2 for e, d in pairs) / len(pairs)
+
+
+def align_layout(a_layout: ig.Layout, seed: list, anchors: list = None):
+    """
+    レイアウトa_layoutを、初期値seedに最もよく重なるよう、平行移動・回転（反転を含む）したものを返す関数
+    igraphの3次元のレイアウトは、初期値を与えても、全体が回転・反転した座標を返すことがある（形は同じなので、向きを初期値に揃える）。
+    anchorsを指定すると、そのノード（前回から引き継いだノード）だけで向きを決める（新しいノードは大きく動くことがあるため）。
+    """
+
+    coords = a_layout.coords
+    anchors = anchors or range(len(coords))
+    seed_center = [sum(seed[k][d] for k in anchors) / len(anchors) for d in range(3)]
+    center = [sum(coords[k][d] for k in anchors) / len(anchors) for d in range(3)]
+
+    # sum(|(c - center) R - (s - seed_center)|^2) を最小にする直交行列Rは、相関行列 M = sum((c - center)^T (s - seed_center)) の極分解の直交行列
+    matrix = [[sum((coords[k][i] - center[i]) * (seed[k][j] - seed_center[j]) for k in anchors) for j in range(3)] for i in range(3)]
+    rotation = orthogonal_factor(matrix) or [[1.0 if i == j else 0.0 for j in range(3)] for i in range(3)]  # 向きが決まらない場合は、平行移動のみ
+
+    aligned = []
+    for c in coords:
+        shifted = [c[d] - center[d] for d in range(3)]
+        aligned.append([seed_center[j] + sum(shifted[i] * rotation[i][j] for i in range(3)) for j in range(3)])
+    return ig.Layout(aligned)
+
+
+def orthogonal_factor(matrix: list, iterations: int = 100):
+    """
+    3×3行列matrixの極分解（matrix = 直交行列 × 対称行列）の直交行列を、ニュートン法（X ← (X + X^-T) / 2）で求めて返す関数
+    matrixが正則でない（ノードが同一平面上にあるなど）場合はNoneを返す。
+    """
+
+    scale = math.sqrt(sum(v * v for row in matrix for v in row))
+    if scale == 0:
+        return None
+    x = [[v / scale for v in row] for row in matrix]
+    for _ in range(iterations):
+        det = (x[0][0] * (x[1][1] * x[2][2] - x[1][2] * x[2][1])
+               - x[0][1] * (x[1][0] * x[2][2] - x[1][2] * x[2][0])
+               + x[0][2] * (x[1][0] * x[2][1] - x[1][1] * x[2][0]))
+        if abs(det) < 1e-12:
+            return None
+        # X^-T は、余因子行列を行列式で割ったもの
+        cofactor = [[(x[(i + 1) % 3][(j + 1) % 3] * x[(i + 2) % 3][(j + 2) % 3] - x[(i + 1) % 3][(j + 2) % 3] * x[(i + 2) % 3][(j + 1) % 3]) / det for j in range(3)] for i in range(3)]
+        updated = [[(x[i][j] + cofactor[i][j]) / 2 for j in range(3)] for i in range(3)]
+        change = max(abs(updated[i][j] - x[i][j]) for i in range(3) for j in range(3))
+        x = updated
+        if change < 1e-12:
+            break
+    return x
@@ -17,11 +17,12 @@ import json
 from google.auth.transport.requests import Request
 from google.oauth2.credentials import Credentials
 from google_auth_oauthlib.flow import InstalledAppFlow
-from flask import Flask, render_template, jsonify
+from flask import Flask, Response, request, render_template, jsonify, send_file, abort
 import threading
 
 from IO import IO
 from Drawer import Drawer
+from LayoutWorker import LayoutWorker
 
 
 # ドライブ上のファイルの識別ID
@@ -61,10 +62,27 @@ ANSWERS = {
     'friends' : "1cfca697"
 }
 
+# datasheetsのnet_infoの保存形式（"matrix": 隣接行列, "edges": 1行に1つの友人関係）。参加者が数千人規模になる場合は "edges" を推奨。
+# 変更して再起動すると、起動時の修復（IO.reconcile_datasheets()）が、ローカルのデータベースからnet_infoを新しい形式で書き直し、古い形式の余分な行と列を消す。
+NET_LAYOUT = "matrix"
+
+# participants_formの知り合いの質問を、この人数ごとの複数の質問に分ける（0なら分けない）。参加者が数百人を超える場合は、100程度を推奨。
+FRIENDS_BUCKET_SIZE = 0
+
+# グラフのレイアウトの計算方法（"auto": 参加者数とLAYOUT_BUDGETから選ぶ, "kk" / "fr" / "drl": 常にそれを使う）。
+LAYOUT_ENGINE = "auto"
+
+# LAYOUT_ENGINEが"auto"の場合に、レイアウトの計算にかけてよい時間の目安[秒]。これに収まらない規模では、より速い計算方法を選ぶ。
+LAYOUT_BUDGET = 10.0
+
+# 1回のレイアウトの計算にかける時間の上限[秒]（例えば0.2）。指定すると、参加者が多くてもグラフをすぐに表示し、残りの計算は更新の合間に続けて少しずつ整える（Noneなら、毎回最後まで計算する）。
+LAYOUT_ANYTIME_BUDGET = None
+
 NETWORK_DATA_FILE_PATH = "./../src/network_data/network_data.json"  # ネットワーク情報を保存するローカルファイルのpath
 FILE_PATHS = {
     'net': "./../src/network_data/network_data.json",  # ネットワーク情報を保存するローカルファイルのpath
-    'prof': "./static/images/"  # プロフィール画像を保存するローカルディレクトリのpath
+    'prof': "./static/images/",  # プロフィール画像を保存するローカルディレクトリのpath
+    'db': "./../src/network_data/o_noder.db"  # 回答と友人関係を保存するローカルのデータベースのpath
 }
 FILE_NAMES = {
     'token' : 'token.json',
@@ -89,10 +107,14 @@ CREDS: None
 
 app = Flask(__name__)
 
-drawer: Drawer = None
+drawer: Drawer = None  # 完成したDrawerに丸ごと差し替える（/data は、その時点のDrawerだけを読む）。
 an_io: IO = None
+layout_worker: LayoutWorker = None  # グラフのレイアウトを、Flaskとは別のプロセスで計算する。
+
+IMG_MAX_AGE = 365 * 24 * 60 * 60  # 内容のハッシュ値で配信するプロフィール画像を、ブラウザにキャッシュさせる秒数
 
 background_check_interval = 30  # 新しい回答のチェックを1度行った後次の更新まで最低何秒間を開けるか。API制限エラー対策に長めにとる。
+refine_interval = 1  # 打ち切ったレイアウトの計算の続きを、何秒ごとに行うか（LAYOUT_ANYTIME_BUDGETを指定した場合）
 
 def init():
     """
@@ -135,40 +157,100 @@ def check_updates_loop():
         # print(f"\rCheck update: {datetime.datetime.now()}", end="") # 現在時刻表示（ログ用）。ログが多すぎると見づらいので適宜調整
 
         try:
-            # 新規回答があるかチェック
-            if an_io.call_new_answers() > 0:
-                # 1. データベース（スプレッドシート・ローカルファイル）を更新
-                an_io.update_databese()
-                
-                # 2. 更新されたローカルファイルを読み込み直す。
-                with open(FILE_PATHS['net'], 'r', encoding='utf-8') as f:
-                    new_data = json.load(f)
-                
-                # 3. Drawerを作り直して、最新のグラフデータをメモリ上に用意する（これにより、次にブラウザが /data にアクセスした時、新しいグラフが返される）。
-                drawer = Drawer(new_data, FILE_PATHS, FILE_NAMES)
+            with an_io.TRACER.cycle("update") as a_cycle:
+                # 新規回答があるかチェック
+                with an_io.TRACER.span("call_new_answers"):
+                    a_cycle['tags']['answers'] = an_io.call_new_answers()
+
+                if a_cycle['tags']['answers'] > 0:
+                    # 1. データベース（スプレッドシート・ローカルファイル）を更新
+                    with an_io.TRACER.span("update_databese"):
+                        an_io.update_databese()
+
+                    # 2. 更新されたローカルファイルを読み込み直す。
+                    with open(FILE_PATHS['net'], 'r', encoding='utf-8') as f:
+                        new_data = json.load(f)
+
+                    # 3. Drawerを作り直して、最新のグラフデータをメモリ上に用意する（これにより、次にブラウザが /data にアクセスした時、新しいグラフが返される）。
+                    # レイアウトの計算中も、/data は前回のDrawerを返し続け、新しいDrawerが完成してから差し替える。
+                    with an_io.TRACER.span("drawer_rebuild", nodes=len(new_data['nodes'])) as a_span:
+                        new_drawer = Drawer(new_data, FILE_PATHS, FILE_NAMES, previous=drawer, worker=layout_worker)  # 前回の座標を引き継いで、変化した分だけレイアウトを計算し直す。
+                        drawer = new_drawer
+                        a_span['tags'].update(drawer.layout_summary())
+                    observe_layout(drawer)
+                else:
+                    an_io.TRACER.discard(a_cycle)  # 新しい回答が無かったサイクルは残さない。
 
         except Exception as e:
             print(f"\n[Error] Background loop error: {e}")
 
-        # 毎時30分ごろにデータベースをリクリエートする。
-        now = datetime.now()
-        if (30 <= now.minute and now.minute <= 35 )and now.hour != last_executed_hour:
-            print("recreating database... ", end="", flush=True)
-            an_io.recreate_databese()
-            print(" → Done.")
-            last_executed_hour = now.hour
+        # 毎時30分ごろと、APIの呼び出しがやり直しても失敗した後に、データベースの食い違いを修復する。
+        # 修復が失敗しても、ループは止めない（needs_reconcileが立っていれば、次のループでやり直す）。
+        try:
+            now = datetime.now()
+            if ((30 <= now.minute and now.minute <= 35 )and now.hour != last_executed_hour) or an_io.needs_reconcile:
+                print("reconciling database... ", end="", flush=True)
+                with an_io.TRACER.cycle("reconcile"):
+                    report = an_io.reconcile_databese()
+                print(f" → Done. {report}")
+                print(f"  API rate limits: {an_io.LIMITER.get_stats()}")
+                print(f"  update latency: {an_io.SCHEDULER.get_stats()}")
+                print(f"  API retries: {an_io.get_retry_stats()}")
+                last_executed_hour = now.hour
+
+        except Exception as e:
+            an_io.needs_reconcile = True
+            print(f"\n[Error] Background reconcile error: {e}")
+
+        refine_layout(time.monotonic() + background_check_interval)  # 次のチェックまでの間に、打ち切ったレイアウトの計算を続ける。
+
+
+def refine_layout(until: float):
+    """
+    時刻until（time.monotonic()）まで、レイアウトの計算が打ち切られていれば（Drawer.ANYTIME_BUDGET）、その続きを計算したDrawerに差し替え続ける関数
+    差し替えるたびに、/data はより整ったグラフを返す。計算が完了したら、untilまで待つ。
+    """
+    global drawer
+
+    while drawer is not None and drawer.layout_remaining > 0 and time.monotonic() < until:
+        try:
+            with an_io.TRACER.cycle("refine"):
+                with an_io.TRACER.span("drawer_refine", nodes=drawer.N) as a_span:
+                    drawer = Drawer(drawer.data, FILE_PATHS, FILE_NAMES, previous=drawer, worker=layout_worker)
+                    a_span['tags'].update(drawer.layout_summary())
+            observe_layout(drawer)
+        except Exception as e:
+            print(f"\n[Error] Layout refinement error: {e}")
+            break
+        time.sleep(max(0.0, min(refine_interval, until - time.monotonic())))
+
+    time.sleep(max(0.0, until - time.monotonic()))
+
+
+def observe_layout(a_drawer: Drawer):
+    """
+    a_drawerのレイアウトの計算時間とストレスを、指標として記録する関数
+    """
 
-        time.sleep(background_check_interval)
+    report = a_drawer.layout_report
+    an_io.METRICS.observe("onoder_drawer_layout_seconds", a_drawer.layout_time, mode=a_drawer.layout_mode)
+    if a_drawer.layout_mode != "reuse":
+        an_io.METRICS.observe("onoder_layout_engine_seconds", report['runtime'], engine=report['engine'], mode=a_drawer.layout_mode)
+    if report['stress'] is not None:
+        an_io.METRICS.set("onoder_layout_stress", report['stress'])
 
 
 def main():
-    global drawer, an_io
+    global drawer, an_io, layout_worker
 
     # 初期化
     print("initializing data... ", end="", flush=True)
     init()
-    an_io = IO(IDS, RAW_SHEET, SHEET_NAMES, ANSWERS, QUESTIONS, CREDS, FILE_PATHS, FILE_NAMES)
+    an_io = IO(IDS, RAW_SHEET, SHEET_NAMES, ANSWERS, QUESTIONS, CREDS, FILE_PATHS, FILE_NAMES, NET_LAYOUT, FRIENDS_BUCKET_SIZE)
     print(" → Done.")
+    report = an_io.bootstrap_report
+    print(f"  startup reads: {report['reads']}")
+    print(f"  sequential {report['sequential']}s → parallel {report['parallel']}s (saved {report['saved']}s), total {report['total']}s")
 
     # グラフの初期描画
     if not os.path.exists(FILE_PATHS['net']):  # 該当ファイルが存在しない場合
@@ -178,7 +260,16 @@ def main():
 
     with open(FILE_PATHS['net'], 'r', encoding='utf-8') as f:
         data = json.load(f)
-    drawer = Drawer(data, FILE_PATHS, FILE_NAMES)
+    Drawer.LAYOUT_ALGORITHM = LAYOUT_ENGINE
+    Drawer.LAYOUT_BUDGET = LAYOUT_BUDGET
+    Drawer.ANYTIME_BUDGET = LAYOUT_ANYTIME_BUDGET
+    layout_worker = LayoutWorker()
+    drawer = Drawer(data, FILE_PATHS, FILE_NAMES, worker=layout_worker)
+    an_io.METRICS.describe("onoder_drawer_layout_seconds", "histogram", "Time to compute the graph layout when the Drawer is rebuilt.")
+    an_io.METRICS.describe("onoder_layout_engine_seconds", "histogram", "Time the layout engine itself spent computing the layout.")
+    an_io.METRICS.describe("onoder_layout_stress", "gauge", "Normalized stress of the current layout against graph distances.")
+    an_io.METRICS.describe("onoder_data_serve_seconds", "histogram", "Time from the start of a /data request until its response is closed (sent).")
+    observe_layout(drawer)
 
     # 裏方のループ処理を別スレッドで開始
     print("Starting server and background task... ", end="", flush=True)
@@ -188,6 +279,7 @@ def main():
     # Webサーバーを起動（これはメインスレッドで動き続け、ブロックする）
     print(" → Done.")
     app.run(host='0.0.0.0', port=5001, debug=True, use_reloader=False)  # debug=True だとリロード機能が働きスレッドが2重起動することがあるので、本番に近い挙動確認に推奨される use_reloader=False を指定する。
+    layout_worker.close()
 
     return 0
 
@@ -199,10 +291,50 @@ def index():
 @app.route('/data')
 def data():
     # ブラウザがここへアクセスするたびに、その時点での最新の drawer のデータを返す
-    if drawer is not None:
-        return jsonify(drawer.const_view_data())
+    start = time.perf_counter()
+    a_drawer = drawer  # 途中で差し替えられても、同じDrawerから応答を作る。
+    if a_drawer is not None:
+        response = Response(a_drawer.view_json, mimetype="application/json")  # 描画用のデータは、Drawerを作るときに構築済み。
+        response.headers['X-Onoder-Version'] = str(a_drawer.version)  # どの版のグラフを返したか
     else:
-        return jsonify({}) # データがない場合の空返し
+        response = jsonify({}) # データがない場合の空返し
+    if an_io is not None:  # 応答を送り終えて閉じたときに記録する（Responseを作った時点では、まだ送っていない）。
+        response.call_on_close(lambda: an_io.METRICS.observe("onoder_data_serve_seconds", time.perf_counter() - start))
+    return response
+
+@app.route('/debug/cycles')
+def debug_cycles():
+    # 直近の更新のサイクルごとの、処理とAPIの呼び出しの時系列を、新しい順のJSONで返す（?limit=件数&kind=update|bootstrap|reconcile）。
+    if an_io is None:
+        abort(503)
+    return jsonify(an_io.TRACER.get_cycles(request.args.get('limit', type=int), request.args.get('kind')))
+
+@app.route('/debug/cycles/trace')
+def debug_cycles_trace():
+    # 同じ時系列を、Chromeのトレース形式で返す。保存して chrome://tracing や https://ui.perfetto.dev で開くと、フレームチャートとして見られる。
+    if an_io is None:
+        abort(503)
+    response = jsonify(an_io.TRACER.chrome_trace(request.args.get('limit', type=int), request.args.get('kind')))
+    response.headers['Content-Disposition'] = "attachment; filename=o_noder_trace.json"
+    return response
+
+@app.route('/metrics')
+def metrics():
+    # APIの呼び出しや同期の状況の指標を、Prometheusのテキスト形式で返す。
+    if an_io is None:
+        abort(503)
+    return Response(an_io.METRICS.render(), mimetype="text/plain; version=0.0.4")
+
+@app.route(f'{Drawer.IMG_URL_BASE}<digest>.<ext>')
+def img(digest, ext):
+    # プロフィール画像を内容のハッシュ値で配信する。URLが同じなら内容も同じなので、ブラウザには無期限にキャッシュさせる。
+    path = Drawer.find_img(digest)
+    if path is None or os.path.splitext(path)[1] != f".{ext}":  # 拡張子が違うURLで、同じ画像が別々にキャッシュされないようにする。
+        abort(404)
+    response = send_file(os.path.abspath(path), etag=digest, conditional=True, max_age=IMG_MAX_AGE)  # If-None-Matchが一致すれば304を返す。
+    response.cache_control.public = True
+    response.cache_control.immutable = True
+    return response
 
 
 if __name__ == '__main__':
@@ -0,0 +1,663 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+
+"""
+O_noderにおける、GoogleのAPIサービスのメモリ上の代用品を扱うコード
+"""
+
+__author__ = 'Muto Tao'
+__version__ = '1.0.0'
+__date__ = '2025.12.4'
+
+
+import re
+import copy
+import json
+import time
+import random
+import threading
+import collections
+from datetime import datetime, timezone
+import httplib2
+from googleapiclient.errors import HttpError
+
+from Services import Services
+
+
+class FakeServices:
+    """
+    IOが用いるGoogle Forms、Sheets、Drive、Apps ScriptのAPIサービスを、メモリ上で模倣するクラス
+    IOと同じ呼び出し方（例: service.spreadsheets().values().get(...).execute()）を受け付け、呼び出しごとの回数と送受信したバイト数を記録する。
+    呼び出しの遅延、1分あたりの呼び出し回数の上限（超えると429を返す）、意図的な429の注入を設定できる。
+    install()でServicesのキャッシュに登録すると、IOは本物の代わりにこれを使う（通信も認証も行わない）。
+    """
+
+    SERVICES = {"drive": "v3", "forms": "v1", "sheets": "v4", "script": "v1"}  # サービス名 → バージョン
+    DEFAULT_ROWS = 1000  # 新しいシートの行数
+    DEFAULT_COLUMNS = 26  # 新しいシートの列数
+
+    LATENCY: float  # 1回の呼び出しにかかる時間[秒]
+    QUOTAS: dict  # バケット名（"sheets_read", "sheets_write", "forms", "drive", "script"）→ 1分あたりの呼び出し回数の上限。無いバケットは無制限。
+    ERROR_RATE: float  # 呼び出しが、ランダムに429で失敗する確率
+
+    spreadsheets: dict  # スプレッドシートID → シート名 → {"sheetId", "rowCount", "columnCount", "cells": (行, 列) → 値}（行と列は1始まり）
+    forms: dict  # フォームID → {"form": フォームの定義, "responses": 回答のリスト}
+    files: dict  # ファイルID → ファイルのメタデータ
+    injected: dict  # methodId → 注入された、次の呼び出しで返すエラーのリスト
+    calls: dict  # バケット名 → 直近1分間の呼び出し時刻のdeque
+    stats: dict  # methodId → {"calls", "errors", "bytes_sent", "bytes_received"}
+    random: random.Random
+    lock: threading.RLock
+
+
+    def __init__(self, LATENCY=0.0, QUOTAS=None, ERROR_RATE=0.0, SEED=None):
+        """
+        コンストラクタ
+        """
+
+        self.LATENCY = LATENCY
+        self.QUOTAS = QUOTAS or {}
+        self.ERROR_RATE = ERROR_RATE
+
+        self.spreadsheets = {}
+        self.forms = {}
+        self.files = {}
+        self.injected = {}
+        self.calls = collections.defaultdict(collections.deque)
+        self.stats = {}
+        self.random = random.Random(SEED)
+        self.lock = threading.RLock()
+
+
+    def install(self):
+        """
+        Servicesのキャッシュに登録し、IOが本物のAPIサービスの代わりにこれを使うようにするメソッド
+        元に戻すには、Services.clear()を呼ぶ。
+        """
+
+        with Services.lock:
+            for name, version in self.SERVICES.items():
+                Services.services[(name, version)] = self.service(name)
+
+
+    def service(self, name: str):
+        """
+        サービス名nameのAPIサービスの代用品を返すメソッド
+        """
+
+        return {"drive": FakeDrive, "forms": FakeForms, "sheets": FakeSheets, "script": FakeScript}[name](self)
+
+
+    # ---- 状態の準備 ----
+
+    def add_spreadsheet(self, spreadsheet_id: str, sheet_names: list, created_time: str = None):
+        """
+        シート名sheet_namesの空のシートを持つスプレッドシートを作るメソッド
+        """
+
+        with self.lock:
+            self.spreadsheets[spreadsheet_id] = {
+                a_name: {"sheetId": i, "rowCount": self.DEFAULT_ROWS, "columnCount": self.DEFAULT_COLUMNS, "cells": {}}
+                for i, a_name in enumerate(sheet_names)
+            }
+            self.files[spreadsheet_id] = {"id": spreadsheet_id, "createdTime": created_time or now_timestamp()}
+
+
+    def add_form(self, form_id: str, items: list):
+        """
+        質問itemsを持つフォームを作るメソッド
+        """
+
+        with self.lock:
+            self.forms[form_id] = {"form": {"formId": form_id, "revisionId": "1", "items": copy.deepcopy(items)}, "responses": []}
+
+
+    def add_response(self, form_id: str, response: dict):
+        """
+        フォームform_idに、回答responseを追加するメソッド
+        """
+
+        with self.lock:
+            self.forms[form_id]['responses'].append(copy.deepcopy(response))
+
+
+    def append_rows(self, spreadsheet_id: str, sheet_name: str, rows: list):
+        """
+        シートsheet_nameの最後の行の次から、rowsを書き込むメソッド（呼び出しとしては数えない）
+        """
+
+        with self.lock:
+            last_row = max((r for r, c in self.spreadsheets[spreadsheet_id][sheet_name]['cells']), default=0)
+            write_cells(self, spreadsheet_id, f"{sheet_name}!A{last_row + 1}", rows)
+
+
+    def inject(self, method_id: str, status: int = 429, count: int = 1, retry_after: str = None):
+        """
+        methodId（例: "sheets.spreadsheets.values.batchUpdate"）の次のcount回の呼び出しを、ステータスstatusで失敗させるメソッド
+        """
+
+        with self.lock:
+            self.injected.setdefault(method_id, []).extend([(status, retry_after)] * count)
+
+
+    def get_sheet_values(self, spreadsheet_id: str, sheet_name: str):
+        """
+        シートの中身を、行のリストとして返すメソッド（末尾の空の行と列は含まない）
+        """
+
+        with self.lock:
+            return read_cells(self.spreadsheets[spreadsheet_id][sheet_name]['cells'], 1, 1, None, None)
+
+
+    # ---- 統計 ----
+
+    def get_stats(self):
+        """
+        methodIdごとの、呼び出し回数、失敗した回数、送受信したバイト数を返すメソッド
+        """
+
+        with self.lock:
+            return {method_id: dict(a_stat) for method_id, a_stat in sorted(self.stats.items())}
+
+
+    def get_totals(self):
+        """
+        すべての呼び出しの、呼び出し回数、失敗した回数、送受信したバイト数の合計を返すメソッド
+        """
+
+        totals = {"calls": 0, "errors": 0, "bytes_sent": 0, "bytes_received": 0}
+        for a_stat in self.get_stats().values():
+            for key in totals:
+                totals[key] += a_stat[key]
+        return totals
+
+
+    def reset_stats(self):
+        """
+        統計を消去するメソッド
+        """
+
+        with self.lock:
+            self.stats.clear()
+
+
+    # ---- 呼び出し ----
+
+    def request(self, method_id: str, bucket: str, handler, **params):
+        """
+        呼び出されるとhandler(**params)を実行する、リクエストの代用品を作るヘルパー関数
+        """
+
+        return FakeRequest(self, method_id, bucket, handler, params)
+
+
+    def call(self, a_request):
+        """
+        リクエストの代用品a_requestを実行し、レスポンスを返すメソッド
+        遅延を模倣した後、注入されたエラー、1分あたりの上限、ランダムな失敗の順に判定し、いずれにも当たらなければ状態を読み書きする。
+        """
+
+        if self.LATENCY:
+            time.sleep(self.LATENCY)
+
+        sent = len(json.dumps(a_request.params, ensure_ascii=False).encode('utf-8'))
+        with self.lock:
+            a_stat = self.stats.setdefault(a_request.methodId, {"calls": 0, "errors": 0, "bytes_sent": 0, "bytes_received": 0})
+            a_stat['calls'] += 1
+            a_stat['bytes_sent'] += sent
+
+            error = self.check_error(a_request)
+            if error is not None:
+                a_stat['errors'] += 1
+                raise error
+
+            try:
+                response = a_request.handler(**a_request.params)
+            except HttpError:
+                a_stat['errors'] += 1
+                raise
+            response = copy.deepcopy(response)  # 呼び出し側が書き換えても、状態に影響しないようにする。
+            a_stat['bytes_received'] += len(json.dumps(response, ensure_ascii=False).encode('utf-8'))
+            return response
+
+
+    def check_error(self, a_request):
+        """
+        a_requestを失敗させる場合は、そのHttpErrorを返すヘルパー関数（ロックを取得してから呼ぶ）
+        """
+
+        injected = self.injected.get(a_request.methodId)
+        if injected:
+            status, retry_after = injected.pop(0)
+            return make_error(status, "Injected error.", a_request.uri, retry_after)
+
+        quota = self.QUOTAS.get(a_request.bucket)
+        if quota is not None:
+            now = time.monotonic()
+            calls = self.calls[a_request.bucket]
+            while calls and calls[0] <= now - 60:
+                calls.popleft()
+            if len(calls) >= quota:
+                return make_error(429, f"Quota exceeded for \"{a_request.bucket}\".", a_request.uri, str(max(1, int(calls[0] + 60 - now) + 1)))
+            calls.append(now)
+
+        if self.ERROR_RATE and self.random.random() < self.ERROR_RATE:
+            return make_error(429, "Random rate limit error.", a_request.uri)
+
+        return None
+
+
+class FakeRequest:
+    """
+    googleapiclientのHttpRequestの代用品
+    IOが参照するmethodIdとmethod、body、execute()のみを持つ。
+    """
+
+    def __init__(self, fake: FakeServices, method_id: str, bucket: str, handler, params: dict):
+        """
+        コンストラクタ
+        """
+
+        self.fake = fake
+        self.methodId = method_id
+        self.method = "GET" if bucket == "sheets_read" or method_id.endswith((".get", ".list")) else "POST"
+        self.bucket = bucket
+        self.handler = handler
+        self.params = params
+        self.body = json.dumps(params['body']) if 'body' in params else None  # HttpRequestと同じく、リクエストボディのJSON文字列
+        self.uri = f"fake://{method_id}"
+
+
+    def execute(self, http=None, num_retries: int = 0):
+        """
+        リクエストを実行し、レスポンスを返すメソッド
+        """
+
+        return self.fake.call(self)
+
+
+class FakeSheets:
+    """
+    Google Sheets APIサービスの代用品
+    """
+
+    def __init__(self, fake: FakeServices):
+        self.fake = fake
+
+    def spreadsheets(self):
+        return FakeSpreadsheets(self.fake)
+
+
+class FakeSpreadsheets:
+    """
+    Google Sheets APIのspreadsheetsリソースの代用品
+    """
+
+    def __init__(self, fake: FakeServices):
+        self.fake = fake
+
+    def values(self):
+        return FakeValues(self.fake)
+
+    def get(self, **params):
+        return self.fake.request("sheets.spreadsheets.get", "sheets_read", self.handle_get, **params)
+
+    def batchUpdate(self, **params):
+        return self.fake.request("sheets.spreadsheets.batchUpdate", "sheets_write", self.handle_batch_update, **params)
+
+    def handle_get(self, spreadsheetId, includeGridData=False, fields=None, ranges=None):
+        return {"sheets": [
+            {"properties": {"sheetId": a_sheet['sheetId'], "title": a_name, "gridProperties": {"rowCount": a_sheet['rowCount'], "columnCount": a_sheet['columnCount']}}}
+            for a_name, a_sheet in find_spreadsheet(self.fake, spreadsheetId).items()
+        ]}
+
+    def handle_batch_update(self, spreadsheetId, body):
+        sheets = {a_sheet['sheetId']: a_sheet for a_sheet in find_spreadsheet(self.fake, spreadsheetId).values()}
+        replies = []
+        for a_request in body.get('requests', []):
+            if 'appendDimension' in a_request:
+                append = a_request['appendDimension']
+                key = "columnCount" if append['dimension'] == "COLUMNS" else "rowCount"
+                sheets[append['sheetId']][key] += append['length']
+            replies.append({})
+        return {"spreadsheetId": spreadsheetId, "replies": replies}
+
+
+class FakeValues:
+    """
+    Google Sheets APIのspreadsheets.valuesリソースの代用品
+    """
+
+    def __init__(self, fake: FakeServices):
+        self.fake = fake
+
+    def get(self, **params):
+        return self.fake.request("sheets.spreadsheets.values.get", "sheets_read", self.handle_get, **params)
+
+    def batchGet(self, **params):
+        return self.fake.request("sheets.spreadsheets.values.batchGet", "sheets_read", self.handle_batch_get, **params)
+
+    def update(self, **params):
+        return self.fake.request("sheets.spreadsheets.values.update", "sheets_write", self.handle_update, **params)
+
+    def batchUpdate(self, **params):
+        return self.fake.request("sheets.spreadsheets.values.batchUpdate", "sheets_write", self.handle_batch_update, **params)
+
+    def append(self, **params):
+        return self.fake.request("sheets.spreadsheets.values.append", "sheets_write", self.handle_append, **params)
+
+    def clear(self, **params):
+        return self.fake.request("sheets.spreadsheets.values.clear", "sheets_write", self.handle_clear, **params)
+
+    def handle_get(self, spreadsheetId, range, majorDimension="ROWS"):
+        a_sheet, r1, c1, r2, c2 = find_range(self.fake, spreadsheetId, range)
+        values = read_cells(a_sheet['cells'], r1, c1, r2, c2)
+        response = {"range": range, "majorDimension": "ROWS"}
+        if values:
+            response['values'] = values
+        return response
+
+    def handle_batch_get(self, spreadsheetId, ranges, majorDimension="ROWS"):
+        return {"spreadsheetId": spreadsheetId, "valueRanges": [self.handle_get(spreadsheetId, a_range) for a_range in ranges]}
+
+    def handle_update(self, spreadsheetId, range, body, valueInputOption=None):
+        write_cells(self.fake, spreadsheetId, range, body.get('values', []), body.get('majorDimension', "ROWS"))
+        return {"spreadsheetId": spreadsheetId, "updatedRange": range}
+
+    def handle_batch_update(self, spreadsheetId, body):
+        for entry in body.get('data', []):  # 範囲外への書き込みがあれば、何も書き込まずに失敗させる。
+            find_range(self.fake, spreadsheetId, entry['range'], entry.get('values', []), entry.get('majorDimension', "ROWS"))
+        for entry in body.get('data', []):
+            write_cells(self.fake, spreadsheetId, entry['range'], entry.get('values', []), entry.get('majorDimension', "ROWS"))
+        return {"spreadsheetId": spreadsheetId, "totalUpdatedRanges": len(body.get('data', []))}
+
+    def handle_append(self, spreadsheetId, range, body, valueInputOption=None, insertDataOption=None):
+        find_range(self.fake, spreadsheetId, range)
+        self.fake.append_rows(spreadsheetId, range.split('!')[0], body.get('values', []))
+        return {"spreadsheetId": spreadsheetId}
+
+    def handle_clear(self, spreadsheetId, range, body=None):
+        a_sheet, r1, c1, r2, c2 = find_range(self.fake, spreadsheetId, range)
+        for key in [key for key in a_sheet['cells'] if in_range(key, r1, c1, r2, c2)]:
+            del a_sheet['cells'][key]
+        return {"spreadsheetId": spreadsheetId, "clearedRange": range}
+
+
+class FakeForms:
+    """
+    Google Forms APIサービスの代用品
+    """
+
+    def __init__(self, fake: FakeServices):
+        self.fake = fake
+
+    def forms(self):
+        return self
+
+    def responses(self):
+        return FakeResponses(self.fake)
+
+    def get(self, **params):
+        return self.fake.request("forms.forms.get", "forms", self.handle_get, **params)
+
+    def batchUpdate(self, **params):
+        return self.fake.request("forms.forms.batchUpdate", "forms", self.handle_batch_update, **params)
+
+    def handle_get(self, formId):
+        return find_form(self.fake, formId)['form']
+
+    def handle_batch_update(self, formId, body):
+        form = find_form(self.fake, formId)['form']
+        items = form['items']
+        replies = []
+        for a_request in body.get('requests', []):
+            if 'updateItem' in a_request:
+                update = a_request['updateItem']
+                index = update['location']['index']
+                if index >= len(items) or items[index].get('itemId') != update['item'].get('itemId', items[index].get('itemId')):
+                    raise make_error(400, f"No item with the given ID at index {index}.", f"fake://forms/{formId}")
+                merge_masked(items[index], update['item'], update.get('updateMask', ""))
+                replies.append({})
+            elif 'createItem' in a_request:
+                item = copy.deepcopy(a_request['createItem']['item'])
+                item['itemId'] = new_id(self.fake)
+                question_ids = []
+                if 'questionItem' in item:
+                    item['questionItem']['question']['questionId'] = new_id(self.fake)
+                    question_ids.append(item['questionItem']['question']['questionId'])
+                items.insert(a_request['createItem']['location']['index'], item)
+                replies.append({"createItem": {"itemId": item['itemId'], "questionId": question_ids}})
+            elif 'deleteItem' in a_request:
+                del items[a_request['deleteItem']['location']['index']]
+                replies.append({})
+            else:
+                replies.append({})
+        form['revisionId'] = str(int(form['revisionId']) + 1)
+        response = {"replies": replies, "writeControl": {"requiredRevisionId": form['revisionId']}}
+        if body.get('includeFormInResponse'):
+            response['form'] = form
+        return response
+
+
+class FakeResponses:
+    """
+    Google Forms APIのforms.responsesリソースの代用品
+    """
+
+    def __init__(self, fake: FakeServices):
+        self.fake = fake
+
+    def list(self, **params):
+        return self.fake.request("forms.forms.responses.list", "forms", self.handle_list, **params)
+
+    def handle_list(self, formId, filter=None, pageSize=5000, pageToken=None):
+        responses = find_form(self.fake, formId)['responses']
+        if filter:  # "timestamp >= 2025-01-01T00:00:00Z" または "timestamp > ..." の形式のみ
+            match = re.fullmatch(r"\s*timestamp\s*(>=|>)\s*(\S+)\s*", filter)
+            if match is None:
+                raise make_error(400, f"Invalid filter \"{filter}\".", f"fake://forms/{formId}")
+            op, timestamp = match.groups()
+            responses = [resp for resp in responses if (resp['lastSubmittedTime'] >= timestamp if op == ">=" else resp['lastSubmittedTime'] > timestamp)]
+        start = int(pageToken or 0)
+        page = responses[start:start + pageSize]
+        response = {"responses": page} if page else {}
+        if start + pageSize < len(responses):
+            response['nextPageToken'] = str(start + pageSize)
+        return response
+
+
+class FakeDrive:
+    """
+    Google Drive APIサービスの代用品
+    """
+
+    def __init__(self, fake: FakeServices):
+        self.fake = fake
+
+    def files(self):
+        return self
+
+    def get(self, **params):
+        return self.fake.request("drive.files.get", "drive", self.handle_get, **params)
+
+    def handle_get(self, fileId, fields=None):
+        if fileId not in self.fake.files:
+            raise make_error(404, f"File not found: {fileId}.", f"fake://drive/{fileId}")
+        a_file = self.fake.files[fileId]
+        if fields:
+            return {key: value for key, value in a_file.items() if key in fields.split(",")}
+        return a_file
+
+
+class FakeScript:
+    """
+    Apps Script APIサービスの代用品
+    """
+
+    def __init__(self, fake: FakeServices):
+        self.fake = fake
+
+    def scripts(self):
+        return self
+
+    def run(self, **params):
+        return self.fake.request("script.scripts.run", "script", self.handle_run, **params)
+
+    def handle_run(self, scriptId, body):
+        return {"done": True, "response": {"@type": "type.googleapis.com/google.apps.script.v1.ExecutionResponse", "result": None}}
+
+
+def now_timestamp():
+    """
+    現在時刻を、フォームの日時データ形式で返す関数
+    """
+
+    return datetime.now(timezone.utc).isoformat(timespec='milliseconds').replace("+00:00", "Z")
+
+
+def make_error(status: int, message: str, uri: str, retry_after: str = None):
+    """
+    Googleのエラーレスポンスと同じ形式のHttpErrorを作る関数
+    """
+
+    headers = {"status": str(status), "content-type": "application/json"}
+    if retry_after:
+        headers['retry-after'] = retry_after
+    content = json.dumps({"error": {"code": status, "message": message}}).encode('utf-8')
+    return HttpError(httplib2.Response(headers), content, uri=uri)
+
+
+def new_id(fake: FakeServices):
+    """
+    フォームの質問などの、8桁の16進数のIDを作る関数
+    """
+
+    return f"{fake.random.getrandbits(32):08x}"
+
+
+def find_spreadsheet(fake: FakeServices, spreadsheet_id: str):
+    """
+    スプレッドシートspreadsheet_idのシートの辞書を返す関数（無ければ404）
+    """
+
+    if spreadsheet_id not in fake.spreadsheets:
+        raise make_error(404, f"Requested entity was not found: {spreadsheet_id}.", f"fake://sheets/{spreadsheet_id}")
+    return fake.spreadsheets[spreadsheet_id]
+
+
+def find_form(fake: FakeServices, form_id: str):
+    """
+    フォームform_idを返す関数（無ければ404）
+    """
+
+    if form_id not in fake.forms:
+        raise make_error(404, f"Requested entity was not found: {form_id}.", f"fake://forms/{form_id}")
+    return fake.forms[form_id]
+
+
+def find_range(fake: FakeServices, spreadsheet_id: str, a1_range: str, values: list = None, major_dimension: str = "ROWS"):
+    """
+    A1形式の範囲a1_range（例: "net_info!A2:C"、"partic_info!1:1"、"net_info"）を、(シート, 開始行, 開始列, 終了行, 終了列)に変換する関数
+    終了行・終了列が無い（シートの端まで）場合はNoneとする。valuesを渡すと、書き込みがシートの範囲を超える場合に400を返す。
+    """
+
+    sheet_name, _, cells = a1_range.partition("!")
+    sheets = find_spreadsheet(fake, spreadsheet_id)
+    if sheet_name not in sheets:
+        raise make_error(400, f"Unable to parse range: {a1_range}", f"fake://sheets/{spreadsheet_id}")
+    a_sheet = sheets[sheet_name]
+
+    r1, c1, r2, c2 = 1, 1, None, None
+    if cells:
+        match = re.fullmatch(r"([A-Z]*)(\d*)(?::([A-Z]*)(\d*))?", cells)
+        if match is None:
+            raise make_error(400, f"Unable to parse range: {a1_range}", f"fake://sheets/{spreadsheet_id}")
+        start_col, start_row, end_col, end_row = match.groups()
+        c1 = col_letter_to_num(start_col) if start_col else 1
+        r1 = int(start_row) if start_row else 1
+        if match.group(3) is None and match.group(4) is None:  # 1つのセル
+            r2, c2 = (r1 if start_row else None), (c1 if start_col else None)
+        else:
+            c2 = col_letter_to_num(end_col) if end_col else None
+            r2 = int(end_row) if end_row else None
+
+    if values is not None:
+        width = max((len(a_line) for a_line in values), default=0)
+        columns = c1 - 1 + (len(values) if major_dimension == "COLUMNS" else width)
+        if columns > a_sheet['columnCount']:
+            raise make_error(400, f"Range ({a1_range}) exceeds grid limits. Max rows: {a_sheet['rowCount']}, max columns: {a_sheet['columnCount']}", f"fake://sheets/{spreadsheet_id}")
+
+    return a_sheet, r1, c1, r2, c2
+
+
+def write_cells(fake: FakeServices, spreadsheet_id: str, a1_range: str, values: list, major_dimension: str = "ROWS"):
+    """
+    a1_rangeの開始セルから、valuesを書き込む関数
+    値は、スプレッドシート上で表示される文字列として保存する。行は足りなければ増やす。
+    """
+
+    a_sheet, r1, c1, _, _ = find_range(fake, spreadsheet_id, a1_range, values, major_dimension)
+    for i, a_line in enumerate(values):
+        for j, value in enumerate(a_line):
+            r, c = (r1 + j, c1 + i) if major_dimension == "COLUMNS" else (r1 + i, c1 + j)
+            if value is None:
+                continue
+            a_sheet['cells'][(r, c)] = "TRUE" if value is True else "FALSE" if value is False else str(value)
+            a_sheet['rowCount'] = max(a_sheet['rowCount'], r)
+
+
+def read_cells(cells: dict, r1: int, c1: int, r2: int, c2: int):
+    """
+    cellsの範囲内の値を、行のリストとして返す関数（各行と全体の末尾の空の部分は含まない）
+    """
+
+    if not cells:
+        return []
+    last_row = r2 if r2 is not None else max(r for r, c in cells)
+    last_col = c2 if c2 is not None else max(c for r, c in cells)
+    values = []
+    for r in range(r1, last_row + 1):
+        a_line = [cells.get((r, c), "") for c in range(c1, last_col + 1)]
+        while a_line and a_line[-1] == "":
+            a_line.pop()
+        values.append(a_line)
+    while values and not values[-1]:
+        values.pop()
+    return values
+
+
+def in_range(key: tuple, r1: int, c1: int, r2: int, c2: int):
+    """
+    セル(行, 列)keyが範囲内にあればTrueを返す関数
+    """
+
+    r, c = key
+    return r1 <= r and (r2 is None or r <= r2) and c1 <= c and (c2 is None or c <= c2)
+
+
+def merge_masked(item: dict, update: dict, update_mask: str):
+    """
+    フォームの質問itemに、updateのうちupdate_mask（カンマ区切りのフィールドのパス）で指定された部分を上書きする関数
+    """
+
+    for a_path in filter(None, update_mask.split(",")):
+        keys = a_path.strip().split(".")
+        source, target = update, item
+        for key in keys[:-1]:
+            source = source.get(key, {})
+            target = target.setdefault(key, {})
+        if keys[-1] in source:
+            target[keys[-1]] = copy.deepcopy(source[keys[-1]])
+        else:
+            target.pop(keys[-1], None)
+
+
+def col_letter_to_num(letter: str):
+    """
+    列のアルファベット（例: "AB"）を、1始まりの列番号に変換する関数
+    """
+
+    num = 0
+    for a_char in letter:
+        num = num * 26 + ord(a_char) - ord("A") + 1
+    return num
@@ -15,10 +15,28 @@ import time
 import os
 import glob
 import requests
+import requests.adapters
 import json
 import re
+import hashlib
+import random
+import email.utils
+import threading
+import queue
+import concurrent.futures
 from datetime import datetime, timedelta, timezone
+import httplib2
+import google_auth_httplib2
 import googleapiclient.discovery
+from googleapiclient.errors import HttpError
+
+from Store import Store
+from Thumbnailer import Thumbnailer
+from Services import Services
+from Limiter import Limiter
+from Scheduler import Scheduler
+from Metrics import Metrics
+from Tracer import Tracer
 
 
 class IO:
@@ -36,32 +54,93 @@ class IO:
     DRIVE_SERVICE: googleapiclient.discovery 
     FORM_SERVICE: googleapiclient.discovery
     SHEET_SERVICE: googleapiclient.discovery
+    SCRIPT_SERVICE: googleapiclient.discovery
 
     FILE_PATHS: dict
     FILE_NAMES: dict
 
+    NET_LAYOUT: str  # net_infoの保存形式。"matrix"なら隣接行列、"edges"なら1行に1つの友人関係(source, target, timestamp)を保存する。形式を変えて起動すると、reconcile_datasheets()が新しい形式で書き直す（移行）。
+    NET_LAYOUTS = ("matrix", "edges")
+    EDGES_HEADER = ["source", "target", "timestamp"]  # net_infoを"edges"形式で保存するときのヘッダ
+    FRIENDS_BUCKET_SIZE: int  # participants_formの知り合いの質問を、登録番号の範囲ごとに分ける場合の、1つの質問あたりの参加者数。0なら分けない。
+    FRIENDS_TITLE = 'Participants List / 参加者リスト'  # 知り合いの質問のタイトル。分けた質問には、登録番号の範囲を付ける。
+
     ADDITIONAL_COLUMN = 30  # スプレッドシートの列を増やすときに、一度に増やす列の数
+    MAX_REQUEST_BYTES = 2 * 1024 * 1024  # values.batchUpdateの1リクエストあたりの最大サイズ（Sheets APIの推奨上限2MB）
+    MIN_SPLIT_BYTES = 1024  # これより小さいリクエストはエラーが返されても分割しない
+    SIZE_LIMIT_PATTERN = re.compile(r"payload|too large|request size|size limit", re.IGNORECASE)  # リクエストサイズの上限を超えたことを示す400のエラーメッセージ
+    COLUMN_REPAIR_MIN = 3  # reconcile_databese()で、この数以上の行で食い違っている列は、行ごとではなく列ごと書き直す。
+    RESPONSES_PAGE_SIZE = 500  # participants_formの回答を取得するときの、1ページあたりの回答数（Forms APIの上限は5000）
+    PREFETCH_PAGES = 1  # 回答を処理している間に、先読みしておくページ数
+    DOWNLOAD_WORKERS = 4  # プロフィール画像を同時にダウンロードする数
+    BOOTSTRAP_WORKERS = 4  # 起動時のリモートの読み込みを、同時に行う数
+    BOOTSTRAP_REQUIRED = ("responses", "form", "datasheets")  # 起動時の読み込みのうち、失敗するとデータベースを作り直せないもの
+    DOWNLOAD_TIMEOUT = (5, 30)  # プロフィール画像のダウンロードのタイムアウト（接続, 読み込み）[秒]
+    DOWNLOAD_CHUNK_SIZE = 64 * 1024  # プロフィール画像をファイルに書き込むときの、1回あたりのバイト数
+    MAX_RETRIES = 5  # 一時的なエラー（429や5xx、接続の切断）で、APIの呼び出しをやり直す最大の回数
+    RETRY_BASE = 1.0  # やり直すまでの待ち時間の基準[秒]。やり直すごとに2倍にし、0からその値までの乱数だけ待つ。
+    RETRY_CAP = 32.0  # やり直すまでの待ち時間の上限[秒]
+    RETRY_STATUSES = (429, 500, 502, 503, 504)  # やり直すHTTPステータス
+    # やり直すと結果が重複しうるリクエスト。methodId → その中の、項目や行・列を追加するリクエストの種類（Noneなら、そのメソッド自体が追加を行う）
+    NON_IDEMPOTENT = {
+        "forms.forms.batchUpdate": ("createItem",),
+        "sheets.spreadsheets.batchUpdate": ("appendDimension", "insertDimension", "appendCells", "insertRange", "addSheet", "duplicateSheet"),
+        "sheets.spreadsheets.values.append": None
+    }
 
     # 回答データ用変数
-    partic_form_meta_info = {
-        "all_answers_num": 0,
-        "new_answers_num": 0,
-        "last_timestamp": None  # フォームの形式
-    }
+    partic_form_meta_info: dict  # {"all_answers_num", "new_answers_num", "edges_num": net_infoが"edges"形式の場合の友人関係の行数, "last_timestamp": フォームの形式}
+    meta_lock: threading.Lock  # partic_form_meta_infoのedges_numは、書き出し用のスレッドでも更新するので、ロックをかける。
     new_answers: list  # 取得した未処理の回答を保存するリスト。キューとして利用。
-
-    # APIの制限で1分間に60回までしか書き込みリクエストができず、それを超えるとエラーになるので、リクエストのレートに制限をかけるための、書き込み状況を監視する変数
-    timer = time.time()
-    write_count = 0  # 書き込み回数を記録
-    COUNT_THRESHOLD = 50  # 連続書き込み回数の上限
-    LIMIT = 60  # 連続書き込み回数の上限を考える時間の長さ
+    edited_answers: list  # 取得した、登録済みの回答が編集されたもの。登録番号を変えずに、データベースの行を置き換える。
+    net_model: dict  # ローカルファイルに書き出すネットワーク情報のメモリ上のモデル
+    net_synced: dict  # net_modelに取り込み済みの参加者の数と、その参加者名のチェックサム
+    thread_local: threading.local  # スレッドごとのhttpオブジェクトと、datasheetsへの未送信の書き込みを溜めるリストを保存する。httplib2はスレッドセーフではないため。
+    STORE: Store  # 回答と友人関係のローカルのデータベース。読み込みはGoogleのAPIではなく、こちらから行う。
+    SCHEDULER: Scheduler  # participants_formの更新や、datasheetsへの書き出しなどを、優先度ごとのスレッドで実行する。
+    download_session: requests.Session  # プロフィール画像のダウンロードで、接続を使い回すためのセッション
+    THUMBNAILER: Thumbnailer  # プロフィール画像の、円形に切り抜いた縮小版を作る。
+    bootstrap_report: dict  # 起動時の読み込みごとの所要時間と、並行して行ったことで短縮された時間[秒]
+    sheets_meta: dict  # スプレッドシートのメタデータのキャッシュ。IDSのキー → シート名 → {"sheetId", "rowCount", "columnCount"}
+    sheets_meta_lock: threading.Lock
+    form_mirror: dict  # participants_formの知り合いの質問のローカルの写し。{"item_index": 最初の質問のフォーム内の位置, "options": 登録番号順の選択肢（画像のURLを含む）, "buckets": 質問ごとの{"itemId", "questionId"}, "question_ids": 削除した質問も含む、知り合いの質問のすべての質問ID}
+
+    # APIの制限（ユーザーあたり1分間に60回など）を超えるとエラーになるので、APIごとにリクエストのレートを制限する。バケット名 → (連続して呼び出せる回数, 1秒あたりに回復する回数)
+    LIMITS = {
+        "sheets_read": (50, 60 / 60),
+        "sheets_write": (50, 60 / 60),
+        "forms": (50, 60 / 60),
+        "drive": (50, 100 / 60),
+        "script": (20, 30 / 60)
+    }
+    LIMITER: Limiter  # IOのインスタンスごとのレート制限
+    retry_stats: dict  # エンドポイント（例: "sheets.spreadsheets.values.batchUpdate"）→ {"retries": やり直した回数, "recovered": やり直して成功した回数, "gave_up": やり直しても失敗した回数}
+    retry_lock: threading.Lock
+    needs_reconcile: bool  # やり直してもAPIの呼び出しが失敗し、リモートに書き込めなかった内容がある場合にTrue。reconcile_databese()で修復するとFalseに戻る。
+    bootstrapped: bool  # 起動時の読み込みがすべて成功し、ローカルのデータベースを作り直せた場合にTrue。Falseの間は、reconcile_databese()がbootstrap()からやり直す。
+    METRICS: Metrics  # APIの呼び出しや同期の状況の指標。Example.pyの/metricsで出力する。
+    last_check_time: float  # 最後にparticipants_formの回答の取得に成功した時刻（time.time()）
+    last_update_time: float  # 最後にupdate_databese()を終えた時刻（time.time()）
+    TRACER: Tracer  # 更新のサイクルごとの、処理とAPIの呼び出しの時系列。Example.pyの/debug/cyclesで出力する。
+
+    # 別スレッドで実行する処理の優先度。"visible"は参加者に見える更新（participants_formの選択肢）、"bulk"は見えない書き出し（datasheetsへの追加や作り直し）。
+    LANES = {
+        "visible": 0,
+        "bulk": 1
+    }
+    LIMIT_RESERVE = 10  # "bulk"の処理がAPIを呼ぶときに、"visible"の処理のために残しておくトークンの数
     
 
-    def __init__(self, IDS, RAW_SHEET, SHEET_NAMES, ANSWERS, QUESTIONS, CREDS, FILE_PATHS, FILE_NAMES):
+    def __init__(self, IDS, RAW_SHEET, SHEET_NAMES, ANSWERS, QUESTIONS, CREDS, FILE_PATHS, FILE_NAMES, NET_LAYOUT="matrix", FRIENDS_BUCKET_SIZE=0):
         """
         コンストラクタ
+        NET_LAYOUTでnet_infoの保存形式（"matrix" または "edges"）を指定する。
+        FRIENDS_BUCKET_SIZEを指定すると、知り合いの質問を、その人数ごとの複数の質問に分ける。
         """
 
+        if NET_LAYOUT not in self.NET_LAYOUTS:
+            raise ValueError(f"NET_LAYOUT must be one of {self.NET_LAYOUTS}.")
+
         # 通信用情報を保存
         self.IDS = IDS
         self.RAW_SHEET = RAW_SHEET
@@ -71,770 +150,1348 @@ class IO:
         self.FILE_PATHS = FILE_PATHS
         self.FILE_NAMES = FILE_NAMES
         self.CREDS = CREDS
+        self.NET_LAYOUT = NET_LAYOUT
+        self.FRIENDS_BUCKET_SIZE = FRIENDS_BUCKET_SIZE
 
-        # APIサービスを構築
-        self.DRIVE_SERVICE = googleapiclient.discovery.build('drive', 'v3', credentials=CREDS)  # Google Drive APIサービスの構築
-        self.FORM_SERVICE = googleapiclient.discovery.build('forms', 'v1', credentials=CREDS)  # Google Forms APIサービスの構築
-        self.SHEET_SERVICE = googleapiclient.discovery.build('sheets', 'v4', credentials=CREDS)  # Google Sheet APIサービスの構築
+        # APIサービスを構築（同梱のディスカバリ文書から構築するので、通信は発生しない）
+        self.DRIVE_SERVICE = Services.get('drive', 'v3', CREDS)  # Google Drive APIサービスの構築
+        self.FORM_SERVICE = Services.get('forms', 'v1', CREDS)  # Google Forms APIサービスの構築
+        self.SHEET_SERVICE = Services.get('sheets', 'v4', CREDS)  # Google Sheet APIサービスの構築
+        self.SCRIPT_SERVICE = Services.get('script', 'v1', CREDS)  # Apps Script APIサービスの構築（フォームの受付状態の変更に用いる）
 
         # 回答情報を初期設定
+        self.partic_form_meta_info = {"all_answers_num": 0, "new_answers_num": 0, "edges_num": 0, "last_timestamp": None}
+        self.meta_lock = threading.Lock()
         self.new_answers = []
-        try:  # raw_answerのタイムスタンプ情報のみを取得する。
-            sheet_raw_answer = self.SHEET_SERVICE.spreadsheets()
-            response = sheet_raw_answer.values().get(
-                spreadsheetId=self.IDS['raw_answers'],
-                range=f"{self.RAW_SHEET}!A:B"  # 名前と日付の情報を取れる範囲を取得する。
-                ).execute()
-            
-            if not response.get('values', []):
-                print("Error in \"IO.init()\": sheet \"raw_answer\" not found.")
+        self.edited_answers = []
+        self.net_model = None
+        self.net_synced = {"rows": 0, "checksum": None}
+        self.thread_local = threading.local()
+        self.sheets_meta = {}
+        self.sheets_meta_lock = threading.Lock()
+        self.form_mirror = {"item_index": None, "options": [], "buckets": [], "question_ids": []}
+        self.LIMITER = Limiter(self.LIMITS)
+        self.retry_stats = {}
+        self.retry_lock = threading.Lock()
+        self.needs_reconcile = False
+        self.bootstrapped = False
+        self.last_check_time = None
+        self.last_update_time = None
+        self.METRICS = Metrics()
+        self.describe_metrics()
+        self.TRACER = Tracer()
+
+        # ローカルのデータベースと、participants_formの更新やdatasheetsへの書き出し用のスレッドを準備
+        self.STORE = Store(self.FILE_PATHS['db'])
+        self.form_mirror['buckets'] = self.STORE.get_meta('friends_buckets') or [{"itemId": self.QUESTIONS['friends'], "questionId": self.ANSWERS['friends']}]  # 分けた質問の回答を読むために、質問IDを保存しておく。
+        self.form_mirror['question_ids'] = self.STORE.get_meta('friends_question_ids') or [self.ANSWERS['friends']]  # 質問を削除した後も、過去の回答を読めるようにする。
+        self.SCHEDULER = Scheduler(self.LANES)
+
+        # プロフィール画像のダウンロード用のセッションを準備（同時にダウンロードする数だけ接続を保持する）
+        self.download_session = requests.Session()
+        adapter = requests.adapters.HTTPAdapter(pool_connections=1, pool_maxsize=self.DOWNLOAD_WORKERS)
+        self.download_session.mount("https://", adapter)
+        self.THUMBNAILER = Thumbnailer(self.FILE_PATHS['prof'])
+        self.THUMBNAILER.make([self.FILE_NAMES['no_image_img']])
+
+        # データベースを初期化（互いに独立したリモートの読み込みを並行して行い、その結果を使って食い違いを修復する）
+        with self.TRACER.cycle("bootstrap"):
+            if not self.bootstrap():  # 起動時にraw_answersを読めなければ、続けられない。
                 sys.exit(1)
 
-            sheet_raw_answer_values = response.get('values', [])[1:]  # 第1要素はヘッダなので取り除く
-            if len(sheet_raw_answer_values) > 0:  # 回答がある場合
-                self.partic_form_meta_info['all_answers_num'] = len(sheet_raw_answer_values)
-                
-                ## フォーム上の日時情報がミリ秒単位であるのに対し、スプレッドシート上の日時情報は秒単位であり低精度で、このズレから不具合（ミリ秒単位では回答順序の判断がつく回答に正しい判断を下せないなど）が生じうるので、call_new_answers()でフォームの日時情報を用いていることから、それを用いる方に統一する。
-                # raw_answers上の日時情報を取得
-                latest_answer = sorted(sheet_raw_answer_values, key=lambda x: x[0])[-1]  # 第0要素=タイムスタンプでソートし、そのうち最大のもの=最新の回答を取得。タイムスタンプが無い回答がある場合は考えない。
-                low_latest_timestamp = self.convert_timedata(latest_answer[0], "StoF")  # 低精度のタイムスタンプに変換
 
-                # participants_formから回答を取得し、名前と低精度タイムスタンプが一致する回答を探してきて、そこから正確なタイムスタンプを得る。
-                try:
-                    response = self.FORM_SERVICE.forms().responses().list(
-                        formId=self.IDS['partic_form'],
-                        filter=f"timestamp >= {low_latest_timestamp}"
-                    ).execute()  # low_latest_timestamp以降の回答を得る。
-
-                    candidates = []
-                    for each in response.get('responses', []):
-                        each_name = each.get('answers', {}).get(self.ANSWERS['name'], {}).get('textAnswers', {}).get('answers', [{}])[0].get('value')  # 候補の名前を取得
-                        raw_time = each.get('lastSubmittedTime') or each.get('createTime')
-                        each_time = self.convert_timedata(self.convert_timedata(raw_time, "FtoS"), "StoF")  # 一度スプレッドシートの形式にすることで精度を落とし、その上でフォームの日時形式にする。
-                        if each_name == latest_answer[1] and each_time == low_latest_timestamp:
-                            candidates.append(raw_time)
-                    
-                    if candidates:
-                        self.partic_form_meta_info['last_timestamp'] = max(candidates)
-                    else:  # 名前で一致が見つからない場合は、最初の低精度のタイムスタンプを採用（重複のリスクがあるが動作はする）
-                        self.partic_form_meta_info['last_timestamp'] = low_latest_timestamp
+    def bootstrap(self):
+        """
+        起動時に必要なリモートの読み込み（raw_answersのヘッダとタイムスタンプ、participants_formの定義と回答、datasheetsの中身とメタデータ）を、
+        BOOTSTRAP_WORKERS個のスレッドで並行して行い、その結果からローカルのデータベースを作り直し、datasheets、participants_form、プロフィール画像の食い違いを修復するメソッド
+        BOOTSTRAP_REQUIRED の読み込みが失敗した場合は、一部の情報からデータベースやリモートを書き換えないよう、既存のものをそのまま使い、needs_reconcileを立てて後でやり直す。
+        読み込みごとの所要時間と、逐次に読み込んだ場合との差をself.bootstrap_reportに保存する。
+        raw_answersを読めなかった場合は、何も書き換えずにneeds_reconcileを立ててFalseを返す（それ以外はTrueを返す）。
+        """
+
+        bootstrap_start = time.perf_counter()
+
+        # ローカルのデータベースにある回答を読み込み、participants_formからはそれ以後の回答のみを取得する。
+        stored = {resp.get('responseId'): resp for resp in self.STORE.get_answers()}
+        stored_timestamp = max((resp.get('lastSubmittedTime') for resp in stored.values()), default=None)
+
+        sheets = self.SHEET_SERVICE.spreadsheets()
+        reads = {
+            "raw_timestamps": lambda: self.execute(sheets.values().get(spreadsheetId=self.IDS['raw_answers'], range=f"{self.RAW_SHEET}!A:B")),
+            "raw_header": lambda: self.execute(sheets.values().get(spreadsheetId=self.IDS['raw_answers'], range=f"{self.RAW_SHEET}!1:1")),
+            "raw_created": lambda: self.execute(self.DRIVE_SERVICE.files().get(fileId=self.IDS['raw_answers'], fields='createdTime')),
+            "form": lambda: self.execute(self.FORM_SERVICE.forms().get(formId=self.IDS['partic_form'])),
+            "responses": lambda: list(self.iter_responses(stored_timestamp)),
+            "datasheets": lambda: self.execute(sheets.values().batchGet(spreadsheetId=self.IDS['datasheets'], ranges=list(self.SHEET_NAMES.values()))),
+            "datasheets_meta": lambda: self.get_sheets_meta('datasheets')
+        }
 
+        def timed(a_read):
+            read_start = time.perf_counter()
+            return a_read(), time.perf_counter() - read_start
+
+        # 並行して読み込む。
+        results = {key: None for key in reads}
+        durations = {}
+        reads_start = time.perf_counter()
+        with concurrent.futures.ThreadPoolExecutor(max_workers=self.BOOTSTRAP_WORKERS) as executor:
+            futures = {executor.submit(self.TRACER.bind(timed, f"read {key}"), a_read): key for key, a_read in reads.items()}
+            for future in concurrent.futures.as_completed(futures):
+                key = futures[future]
+                try:
+                    results[key], durations[key] = future.result()
                 except Exception as e:
-                    print(f"Error in \"IO.init()\": {e}")
+                    print(f"Error while reading \"{key}\" in \"IO.bootstrap()\": {e}")
+        reads_wall = time.perf_counter() - reads_start
+
+        if not (results['raw_timestamps'] or {}).get('values', []):
+            print("Error in \"IO.bootstrap()\": sheet \"raw_answer\" not found.")
+            self.needs_reconcile = True
+            return False
+
+        missing = [key for key in self.BOOTSTRAP_REQUIRED if results[key] is None]
+        if missing:  # 回答やフォーム、datasheetsを読めなかった場合は、既存のデータベースの回答のまま起動する。
+            print(f"Error in \"IO.bootstrap()\": failed to read {missing}. The local database and the remote files are kept as they are until the next reconcile.")
+            answers = list(stored.values())
+        else:
+            # ローカルのデータベースを作り直す。回答が編集されていた場合は、登録番号を変えずに新しい方で上書きし、新しい回答は投稿日時順に後ろに加える。
+            answers = dict(stored)  # 登録番号順
+            new_responses = []
+            for resp in results['responses']:
+                if resp.get('responseId') in answers:
+                    answers[resp.get('responseId')] = resp
+                else:
+                    new_responses.append(resp)
+            answers = list(answers.values()) + sorted(new_responses, key=lambda x: x.get('lastSubmittedTime'))
+            self.STORE.clear()
+            self.store_answers(answers, 0)
 
-            else:  # 回答がない場合
-                self.partic_form_meta_info['all_answers_num'] = 0
-                sheet_raw_answer_metadata = self.DRIVE_SERVICE.files().get(
-                    fileId=self.IDS['raw_answers'],
-                    fields='createdTime'
-                    ).execute()  # raw_answerの作成日時情報を得る。
-                self.partic_form_meta_info['last_timestamp'] = sheet_raw_answer_metadata.get('createdTime')
+        raw_answers_num = len(results['raw_timestamps']['values']) - 1  # 第1要素はヘッダ
+        if raw_answers_num != len(answers) and not missing:
+            print(f"Warning in \"IO.bootstrap()\": {raw_answers_num} answers in \"raw_answers\", but {len(answers)} answers in \"participants_form\".")
 
-        except Exception as e:
-            print(f"Error in \"IO.init()\": {e}")
+        # 参加者フォームのメタ情報を更新（回答がない場合は、raw_answersの作成日時をタイムスタンプにする）
+        self.new_answers = []
+        self.partic_form_meta_info['all_answers_num'] = len(answers)
+        self.partic_form_meta_info['new_answers_num'] = 0
+        if answers:
+            self.partic_form_meta_info['last_timestamp'] = max(x.get('lastSubmittedTime') for x in answers)
+        else:
+            self.partic_form_meta_info['last_timestamp'] = (results['raw_created'] or {}).get('createdTime')
+        # "edges"形式のnet_infoの行数は、データベースの友人関係の数と同じ（修復でnet_infoを書き直した場合は、その行数で上書きされる）。
+        with self.meta_lock:
+            self.partic_form_meta_info['edges_num'] = self.STORE.count_edges() if self.NET_LAYOUT == "edges" else 0
+
+        # 読み込んだ結果を使って、食い違いを修復する。
+        if missing:
+            reconcile_report = None
+            self.needs_reconcile = True  # Example.pyのループが、reconcile_databese()からbootstrap()をやり直す。
+        else:
+            reconcile_report = self.reconcile_databese(prefetched=results)
+            self.bootstrapped = True
+        self.STORE.set_meta('partic_form_meta_info', self.partic_form_meta_info)
+
+        sequential = sum(durations.values())
+        self.bootstrap_report = {
+            "reads": {key: round(duration, 3) for key, duration in sorted(durations.items())},
+            "sequential": round(sequential, 3),  # 逐次に読み込んだ場合の所要時間
+            "parallel": round(reads_wall, 3),  # 並行して読み込んだ所要時間
+            "saved": round(sequential - reads_wall, 3),
+            "total": round(time.perf_counter() - bootstrap_start, 3),  # 修復も含めた全体の所要時間
+            "reconcile": reconcile_report
+        }
+        return True
+
+
+    def describe_metrics(self):
+        """
+        self.METRICSに、IOが記録する指標の説明と、出力するたびに値を求める指標を登録するヘルパー関数
+        """
 
-        # データベースを初期化
-        self.recreate_databese()
+        metrics = self.METRICS
+        metrics.describe("onoder_api_requests_total", "counter", "Google API calls by endpoint (methodId) and HTTP status.")
+        metrics.describe("onoder_api_request_duration_seconds", "histogram", "Duration of each Google API call attempt.")
+        metrics.describe("onoder_api_retries_total", "counter", "Retries of transient API errors, and whether they recovered or gave up.")
+        metrics.describe("onoder_rate_limit_wait_seconds", "histogram", "Time spent waiting for a rate-limit token before an API call.")
+        metrics.describe("onoder_update_duration_seconds", "histogram", "Time from the start of update_databese() until the local graph file is rewritten.")
+
+        def age(timestamp):
+            return time.time() - timestamp if timestamp is not None else float('nan')
+
+        metrics.gauge_function("onoder_new_answers_queue", lambda: len(self.new_answers), "Fetched answers not yet processed by update_databese().")
+        metrics.gauge_function("onoder_participants", lambda: self.partic_form_meta_info['all_answers_num'], "Registered participants.")
+        metrics.gauge_function("onoder_last_check_age_seconds", lambda: age(self.last_check_time), "Seconds since answers were last fetched successfully.")
+        metrics.gauge_function("onoder_last_update_age_seconds", lambda: age(self.last_update_time), "Seconds since update_databese() last finished.")
+        metrics.gauge_function("onoder_needs_reconcile", lambda: self.needs_reconcile, "1 if a write gave up after retries and awaits reconcile_databese().")
+        metrics.gauge_function(
+            "onoder_rate_limit_tokens",
+            lambda: {(("bucket", name),): a_stat['tokens'] for name, a_stat in self.LIMITER.get_stats().items()},
+            "Rate-limit tokens currently available per bucket."
+        )
+        metrics.gauge_function(
+            "onoder_scheduler_pending",
+            lambda: {(("lane", lane),): num for lane, num in self.SCHEDULER.get_stats()['pending'].items()},
+            "Jobs waiting or running per scheduler lane."
+        )
+        metrics.gauge_function(
+            "onoder_visibility_seconds",
+            lambda: {(("class", label),): a_stat['latency_last'] for label, a_stat in self.SCHEDULER.get_stats().items() if label != "pending"},
+            "Latency of the last update from cycle start until it was visible, per class."
+        )
 
 
     def call_new_answers(self):
         """
         呼び出すと、pratic_formに新規追加された回答を取得し、インスタンスのフィールドself.new_answersに保存するメソッド。
-        取得された回答数を返す。
+        登録済みの回答が編集されたもの（同じ回答IDで、投稿日時が新しいもの）は、新しい参加者とせずにself.edited_answersに保存する。
+        取得された回答数（編集されたものを含む）を返す。
         """
 
         new_answer_nums = 0
         try:
-            response = self.FORM_SERVICE.forms().responses().list(
-                formId=self.IDS['partic_form'],
-                filter=f"timestamp >= {self.partic_form_meta_info['last_timestamp']}"
-                ).execute()  # last_timestamp以後の回答のみを取得する。
-
-            raw_responses = response.get('responses', [])
             self.new_answers = []
-            for resp in raw_responses:
+            self.edited_answers = []
+            fetched = []
+            for resp in self.iter_responses(self.partic_form_meta_info['last_timestamp']):  # last_timestamp以後の回答のみを、ページごとに取得する。
                 resp_time = resp.get('lastSubmittedTime') or resp.get('createTime')
                 if resp_time > self.partic_form_meta_info['last_timestamp']:
-                    self.new_answers.append(resp)
+                    fetched.append(resp)
+            stored = self.STORE.get_reg_nums([resp.get('responseId') for resp in fetched])
+            for resp in fetched:
+                (self.edited_answers if resp.get('responseId') in stored else self.new_answers).append(resp)
 
             if self.new_answers:  # 新しい回答がない場合には、self.new_answersは空リストになっている。
                 new_answer_nums = len(self.new_answers)
                 self.partic_form_meta_info["new_answers_num"] = new_answer_nums
                 self.partic_form_meta_info["all_answers_num"] += new_answer_nums
+            new_answer_nums += len(self.edited_answers)
+            self.last_check_time = time.time()
         except Exception as e:
             print(f"Error in \"IO.call_new_answers()\": {e}")
 
         return new_answer_nums
 
 
+    def iter_responses(self, timestamp: str = None, page_size: int = None):
+        """
+        participants_formの回答を1件ずつ返すジェネレータ
+        nextPageTokenをたどってすべてのページを取得する。あるページの回答を呼び出し側が処理している間に、次のページを別スレッドで先読みする。
+            timestamp: 指定した場合、この日時以後の回答のみを取得する。
+            page_size: 1ページあたりの回答数。省略した場合はRESPONSES_PAGE_SIZE。
+        """
+
+        pages = queue.Queue(maxsize=self.PREFETCH_PAGES)
+        stop = threading.Event()  # 呼び出し側が途中で読むのをやめた場合に、先読みを止める。
+
+        def fetch_pages():
+            page_token = None
+            try:
+                while not stop.is_set():
+                    params = {
+                        'formId': self.IDS['partic_form'],
+                        'pageSize': page_size or self.RESPONSES_PAGE_SIZE
+                    }
+                    if timestamp:
+                        params['filter'] = f"timestamp >= {timestamp}"
+                    if page_token:
+                        params['pageToken'] = page_token
+
+                    response = self.execute(self.FORM_SERVICE.forms().responses().list(**params))
+                    pages.put(response.get('responses', []))
+
+                    page_token = response.get('nextPageToken')
+                    if not page_token:
+                        break
+            except Exception as e:
+                pages.put(e)  # 例外は呼び出し側のスレッドで投げ直す。
+            pages.put(None)  # 終了の合図
+
+        fetcher = threading.Thread(target=self.TRACER.bind(fetch_pages), daemon=True)
+        fetcher.start()
+        try:
+            while True:
+                page = pages.get()
+                if page is None:
+                    break
+                if isinstance(page, Exception):
+                    raise page
+                for resp in page:
+                    yield resp
+        finally:
+            stop.set()
+            while fetcher.is_alive():  # 先読み中のスレッドがキューで詰まらないように読み捨てる。
+                try:
+                    pages.get(timeout=0.1)
+                except queue.Empty:
+                    pass
+
+
+    def thread_http(self):
+        """
+        呼び出したスレッド専用の、認証済みhttpオブジェクトを返すヘルパー関数
+        """
+
+        if not hasattr(self.thread_local, 'http'):
+            self.thread_local.http = google_auth_httplib2.AuthorizedHttp(self.CREDS, http=httplib2.Http())
+        return self.thread_local.http
+
+
+    def execute(self, request):
+        """
+        googleapiclientのリクエストを実行し、レスポンスを返すヘルパー関数
+        APIの呼び出しはすべてこの関数を経由する。datasheetsへの書き出しなどを別スレッドで行うため、スレッドごとのhttpオブジェクトを用いる。
+        呼び出しの前に、APIごとのレート制限のトークンを取得する（足りない場合は待つ）。優先度の低い処理は、LIMIT_RESERVE個のトークンを残して取得する。
+        一時的なエラーの場合は、待ち時間を指数的に増やしながら（Retry-Afterが返された場合はそれ以上待って）最大MAX_RETRIES回やり直す。
+        ただし、やり直すと重複しうるリクエスト（is_idempotent()）は、処理される前に拒否されたことが確かな429の場合のみやり直す。
+        それ以外のエラーや、やり直しても失敗した場合は、例外をそのまま投げる。
+        """
+
+        reserve = self.LIMIT_RESERVE if self.SCHEDULER.priority() > 0 else 0
+        endpoint = getattr(request, 'methodId', None) or "unknown"
+        with self.TRACER.span(f"api {endpoint}", endpoint=endpoint) as a_span:
+            attempt = 0
+            while True:
+                bucket = self.limit_bucket(request)
+                waited = self.LIMITER.acquire(bucket, reserve=reserve)
+                self.METRICS.observe("onoder_rate_limit_wait_seconds", waited, bucket=bucket)
+                a_span['tags']['waited'] = round(a_span['tags'].get('waited', 0) + waited, 6)
+                start = time.perf_counter()
+                try:
+                    response = request.execute(http=self.thread_http())
+                except Exception as e:
+                    a_span['tags']['status'] = e.resp.status if isinstance(e, HttpError) else "exception"
+                    self.record_call(endpoint, start, a_span['tags']['status'])
+                    if not self.is_retryable(e):
+                        raise
+                    if not self.is_idempotent(request) and not (isinstance(e, HttpError) and e.resp.status == 429):  # 5xxや切断では、サーバー側で処理されたかが分からない。
+                        self.needs_reconcile = True
+                        raise
+                    if attempt >= self.MAX_RETRIES:
+                        self.count_retry(endpoint, "gave_up")
+                        self.needs_reconcile = True
+                        raise
+                    if not isinstance(e, HttpError):  # 切断された接続を使い続けないよう、httpオブジェクトを作り直す。
+                        self.thread_local.__dict__.pop('http', None)
+                    self.count_retry(endpoint, "retries")
+                    time.sleep(self.retry_delay(e, attempt))
+                    attempt += 1
+                    a_span['tags']['attempts'] = attempt + 1
+                    continue
+
+                a_span['tags']['status'] = 200
+                self.record_call(endpoint, start, 200)
+                if attempt:
+                    self.count_retry(endpoint, "recovered")
+                return response
+
+
+    def record_call(self, endpoint: str, start: float, status):
+        """
+        エンドポイントendpointの呼び出しの結果statusと、start（time.perf_counter()）からの所要時間を、指標に記録するヘルパー関数
+        """
+
+        self.METRICS.inc("onoder_api_requests_total", endpoint=endpoint, status=status)
+        self.METRICS.observe("onoder_api_request_duration_seconds", time.perf_counter() - start, endpoint=endpoint)
+
+
+    def is_retryable(self, error: Exception):
+        """
+        APIの呼び出しで発生した例外errorが、やり直せば成功しうる一時的なものならTrueを返すヘルパー関数
+        429と5xx、レート制限による403、接続の切断やタイムアウトを一時的なものとする。
+        """
+
+        if isinstance(error, HttpError):
+            if error.resp.status in self.RETRY_STATUSES:
+                return True
+            return error.resp.status == 403 and "ratelimitexceeded" in str(error).lower()  # Drive APIは、レート制限を403で返す。
+        return isinstance(error, (ConnectionError, TimeoutError, httplib2.ServerNotFoundError))
+
+
+    def is_idempotent(self, request):
+        """
+        googleapiclientのリクエストが、やり直しても結果が重複しないものならTrueを返すヘルパー関数
+        項目を作るforms.batchUpdate（createItem）や、行・列を追加するsheets.batchUpdate（appendDimensionなど）は、やり直すと2回追加されうるので、Falseとする（NON_IDEMPOTENT）。
+        """
+
+        method_id = getattr(request, 'methodId', None)
+        if method_id not in self.NON_IDEMPOTENT:
+            return True
+        if self.NON_IDEMPOTENT[method_id] is None:
+            return False
+        try:
+            sub_requests = json.loads(getattr(request, 'body', None) or "{}").get('requests', [])
+        except ValueError:
+            return False  # 中身が分からない場合は、やり直さない。
+        return not any(kind in a_request for a_request in sub_requests for kind in self.NON_IDEMPOTENT[method_id])
+
+
+    def retry_delay(self, error: Exception, attempt: int):
+        """
+        attempt回目のやり直しの前に待つ時間[秒]を返すヘルパー関数
+        0からRETRY_BASE×2^attempt（上限RETRY_CAP）までの乱数とし、Retry-Afterが返された場合はその時間以上にする。
+        """
+
+        delay = random.uniform(0, min(self.RETRY_CAP, self.RETRY_BASE * 2 ** attempt))  # 複数のスレッドが同時にやり直さないよう、待ち時間をばらつかせる。
+
+        retry_after = error.resp.get('retry-after') if isinstance(error, HttpError) else None
+        if retry_after:
+            try:
+                delay = max(delay, float(retry_after))
+            except ValueError:  # 日時の形式で返された場合
+                try:
+                    delay = max(delay, email.utils.parsedate_to_datetime(retry_after).timestamp() - time.time())
+                except (TypeError, ValueError):
+                    pass
+
+        return delay
+
+
+    def count_retry(self, endpoint: str, key: str):
+        """
+        エンドポイントendpointの、やり直しの統計のkeyを1増やすヘルパー関数
+        """
+
+        self.METRICS.inc("onoder_api_retries_total", endpoint=endpoint, result=key)
+        with self.retry_lock:
+            if endpoint not in self.retry_stats:
+                self.retry_stats[endpoint] = {"retries": 0, "recovered": 0, "gave_up": 0}
+            self.retry_stats[endpoint][key] += 1
+
+
+    def get_retry_stats(self):
+        """
+        エンドポイントごとの、やり直しの統計を返すメソッド
+        """
+
+        with self.retry_lock:
+            return {endpoint: dict(a_stat) for endpoint, a_stat in self.retry_stats.items()}
+
+
+    def limit_bucket(self, request):
+        """
+        googleapiclientのリクエストが消費する、レート制限のバケット名を返すヘルパー関数
+        """
+
+        api = getattr(request, 'methodId', '').split(".")[0]  # 例: "sheets.spreadsheets.values.get" → "sheets"
+        if api == "sheets":
+            return "sheets_read" if getattr(request, 'method', 'GET') == "GET" else "sheets_write"
+        if api in self.LIMITS:
+            return api
+        return "drive"  # 不明なものは、最も制限の緩いバケットで数える。
+
+
+    def export(self, job, *args, label: str = None, submitted: float = None):
+        """
+        datasheetsへの書き出しなどの、画面に見えない処理jobを、優先度の低い"bulk"のスレッドで非同期に実行するよう予約するヘルパー関数
+        予約された処理は、予約された順に1つずつ実行される。
+        """
+
+        self.SCHEDULER.submit("bulk", job, *args, label=label, submitted=submitted)
+
+
+    def wait_exports(self):
+        """
+        別スレッドに予約された処理が、すべて終わるまで待つヘルパー関数
+        """
+
+        self.SCHEDULER.join()
+
+
     def update_databese(self):
         """
         datasheetsとparticipants_formを更新するメソッド
         更新後、new_answersにある回答をフラッシュする。
+        participants_formの更新は優先度の高い"visible"のスレッドで、datasheetsへの書き出しは優先度の低い"bulk"のスレッドで非同期に行い、
+        ローカルファイル（グラフ）の更新はその完了を待たずに行う。それぞれが反映されるまでの時間は、self.SCHEDULER.get_stats()で確認できる。
         """
-        
-        # クラウド上のデータを更新
-        self.update_datasheets()
-        self.update_form()
+
+        submitted = time.monotonic()
+        registered_num = self.partic_form_meta_info["all_answers_num"] - self.partic_form_meta_info["new_answers_num"]  # call_new_answers()で加算済みなので、今回の回答より前に登録されていた回答数を求める。
+        answers = list(self.new_answers)
+
+        # ローカルのデータベースを更新
+        with self.TRACER.span("store_answers", answers=len(answers)):
+            self.store_answers(answers, registered_num)
+        if self.edited_answers:  # 編集された回答は、登録番号を変えずに置き換え、datasheetsなどは修復で書き直す。
+            with self.TRACER.span("store_edited_answers", answers=len(self.edited_answers)):
+                self.store_edited_answers(self.edited_answers)
+            self.needs_reconcile = True
+
+        # クラウド上のデータを更新（参加者に見えるフォームの選択肢を先に更新する）
+        if answers:
+            self.SCHEDULER.submit("visible", self.TRACER.bind(self.update_form, "update_form", answers=len(answers)), answers, registered_num, label="form", submitted=submitted)
+            self.export(self.TRACER.bind(self.update_datasheets, "update_datasheets", answers=len(answers)), answers, registered_num, label="datasheets", submitted=submitted)
 
         # ローカルファイルの更新1
-        self.get_img_to_local()
+        with self.TRACER.span("get_img_to_local", answers=len(answers)) as a_span:
+            a_span['tags']['downloaded'] = len(self.get_img_to_local(answers, registered_num))
 
         # 参加者フォームのメタ情報を更新
-        if self.new_answers:
-            new_timestamps = [x.get('lastSubmittedTime') for x in self.new_answers]
-            if new_timestamps:  # new_answers が空でない場合のみ更新
-                self.partic_form_meta_info['last_timestamp'] = max(new_timestamps)
+        new_timestamps = [x.get('lastSubmittedTime') for x in self.new_answers + self.edited_answers]
+        if new_timestamps:  # 新しい回答か編集された回答がある場合のみ更新
+            self.partic_form_meta_info['last_timestamp'] = max(new_timestamps)
 
         # 処理した新しい回答のキューを削除
         self.new_answers.clear()
+        self.edited_answers.clear()
         self.partic_form_meta_info['new_answers_num'] = 0
+        self.STORE.set_meta('partic_form_meta_info', self.partic_form_meta_info)
 
         # ローカルファイルの更新2
-        self.recreat_local_file()
+        with self.TRACER.span("recreat_local_file"):
+            self.recreat_local_file()
+        self.SCHEDULER.record("graph", submitted)
+        self.last_update_time = time.time()
+        self.METRICS.observe("onoder_update_duration_seconds", time.monotonic() - submitted)
 
 
-    def update_datasheets(self):
+    def update_datasheets(self, answers: list = None, registered_num: int = None):
         """
         datasheetsを更新するメソッド
-        self.new_answersの回答をdatasheetsに追加する。
+        answers（省略した場合はself.new_answers）の回答を、登録番号registered_num+1から順にdatasheetsに追加する。
+        書き込みはすべて書き込みバッファに溜め、1回のvalues.batchUpdateでまとめて送信する。
+        "edges"形式の友人関係の行数（edges_num）は、送信が成功してから進める（失敗した場合は、修復で書き直す）。
         """
 
-        self.writing_keeper("set")
-        self.add_column_if_needed('datasheets', 'net_info', self.ADDITIONAL_COLUMN)
-        self.writing_keeper("check")
-
-        for counter, a_new_answer in enumerate(self.new_answers, start=0):  # 未処理の回答を一つずつ処理する。
-            # 現在の最終列を確認するために、1行目(ヘッダー行)だけを取得
-            try:  
-                response = self.SHEET_SERVICE.spreadsheets().values().get(
-                    spreadsheetId=self.IDS['datasheets'],
-                    range=f"{self.SHEET_NAMES['net']}!1:1"  # 1行目全体
-                ).execute()
+        if answers is None:
+            answers = self.new_answers
+        if registered_num is None:
+            registered_num = self.partic_form_meta_info["all_answers_num"] - self.partic_form_meta_info["new_answers_num"]  # call_new_answers()で加算済みなので、今回の回答より前に登録されていた回答数を求める。
+        total_num = registered_num + len(answers)
+
+        if self.NET_LAYOUT == "matrix":  # 隣接行列の場合のみ、列を増やす必要がある。
+            self.add_column_if_needed('datasheets', 'net_info', self.ADDITIONAL_COLUMN, total_num)
+        with self.meta_lock:
+            edges_num = self.partic_form_meta_info['edges_num']
+        appended = 0  # 今回追加する友人関係の行数
+
+        for counter, a_new_answer in enumerate(answers, start=0):  # 未処理の回答を一つずつ処理する。
+            reg_num = registered_num + counter + 1  # 登録番号
+            a_body = self.make_body(a_new_answer, reg_num, total_num)
+
+            # partic_infoの、登録番号に対応する行（ヘッダの分だけずれる）に書き込む。
+            self.buffer_write(f"{self.SHEET_NAMES['partic']}!A{reg_num + 1}", [a_body['partic']])
+
+            if self.NET_LAYOUT == "matrix":
+                # 末尾の列に、ヘッダ（第1行）の名前と、既存の行の分の0を追加する。今回の回答の行は、下のmake_body()の行で埋まる。
+                new_column_data = [a_body['partic'][0]]
+                for i in range(registered_num):
+                    new_column_data.append(0)
+                start_col_letter = self.col_num_to_letter(reg_num + 2)  # 第1列は名前、第2列は「0_No friends / なし」なので、その分オフセットを施す。
+                self.buffer_write(f"{self.SHEET_NAMES['net']}!{start_col_letter}1", [new_column_data], "COLUMNS")
+                self.buffer_write(f"{self.SHEET_NAMES['net']}!A{reg_num + 1}", [a_body['net']])
+
+            elif a_body['net']:  # 友人関係を、既存の友人関係の行の後ろに追加する。
+                self.buffer_write(f"{self.SHEET_NAMES['net']}!A{edges_num + appended + 2}", a_body['net'])
+                appended += len(a_body['net'])
+
+        if self.flush_write_buffer():
+            with self.meta_lock:
+                self.partic_form_meta_info['edges_num'] = edges_num + appended
+        else:
+            self.needs_reconcile = True
 
-            except Exception as e:
-                print(f"Error while making a column for the datasheets in \"IO.update_datasheets()\": {e}")
-            
-            next_col_num = self.partic_form_meta_info["all_answers_num"] + counter + 2  # データがある列数 + 1 が書き込み開始位置
-            start_col_letter = self.col_num_to_letter(next_col_num)  # 列番号をアルファベットに変換
-            target_range = f"{self.SHEET_NAMES['net']}!{start_col_letter}1"  # 書き込む範囲を指定
-
-            # 末尾の行までの行列の、末尾の列を0で埋める。
-            new_column_data = [f"{self.partic_form_meta_info['all_answers_num']+counter}_{a_new_answer.get('answers', {}).get(self.ANSWERS['name'], {}).get('textAnswers', {}).get('answers', [{}])[0].get('value')}"]  # ヘッダ（第1行）に名前を追加
-            for i in range(self.partic_form_meta_info['all_answers_num'] + counter - 1):
-                new_column_data.append(0)
-            body = {
-                "majorDimension": "COLUMNS",
-                'values' : [new_column_data]
-            }
 
-            # 末尾の列に追加する。
-            try:
-                self.SHEET_SERVICE.spreadsheets().values().update(
-                    spreadsheetId=self.IDS['datasheets'], # 対象のスプレッドシートID
-                    range=target_range,
-                    valueInputOption="USER_ENTERED",      # 自動フォーマット（日付や数値の認識）
-                    body=body
-                ).execute()
-                self.writing_keeper("check")
+    def buffer_write(self, target_range: str, values: list, major_dimension: str = "ROWS"):
+        """
+        datasheetsへの書き込みを書き込みバッファに溜めるヘルパー関数
+        target_rangeは "シート名!A1" のように、書き込み開始セルのみで指定する（バッチを分割するときに範囲を計算し直すため）。
+        書き込みバッファは、呼び出したスレッドごとに分ける（書き出し用のスレッドと、修復を行うスレッドの書き込みが混ざらないようにする）。溜めた書き込みはflush_write_buffer()で送信する。
+        """
 
-            except Exception as e:
-                print(f"Error while adding a column to the datasheets in \"IO.update_datasheets()\": {e}")
+        self.thread_write_buffer().append({
+            "range": target_range,
+            "majorDimension": major_dimension,
+            "values": values
+        })
 
-            # 各シートに順番に、最新の1行を書き込む。
-            a_body = self.make_body(a_new_answer, counter)
-            for a_sheet in list(self.SHEET_NAMES.keys()):
-                try:
-                    self.SHEET_SERVICE.spreadsheets().values().append(
-                        spreadsheetId=self.IDS['datasheets'],
-                        range=f"{self.SHEET_NAMES[a_sheet]}!A1",  # シート名を指定し、末尾に追加
-                        valueInputOption='USER_ENTERED',  # スプレッドシート上で入力したのと同じ挙動（日付などが自動変換される）
-                        insertDataOption='INSERT_ROWS',  # 必要に応じて新しい行を作成して挿入
-                        body={'values' : [a_body[a_sheet]]}
-                    ).execute()
-                    self.writing_keeper("check")
 
+    def thread_write_buffer(self):
+        """
+        呼び出したスレッド専用の書き込みバッファ（datasheetsへの未送信の書き込みのリスト）を返すヘルパー関数
+        """
 
-                except Exception as e:
-                    print(f"Error while adding a row to the datasheets in \"IO.update_datasheets()\": {e}")
+        if not hasattr(self.thread_local, 'write_buffer'):
+            self.thread_local.write_buffer = []
+        return self.thread_local.write_buffer
 
 
-    def update_form(self):
+    def flush_write_buffer(self):
         """
-        participants_formの知り合いの質問を更新するメソッド
-        self.new_answersの回答を知り合いの選択肢として追加する。
-        また、フォームの書き換えを行う間はフォームへの回答を停止する。
+        呼び出したスレッドの書き込みバッファに溜まった書き込みを、values.batchUpdateでdatasheetsに送信するヘルパー関数
+        リクエストサイズがMAX_REQUEST_BYTESを超える場合は、複数のバッチに分割して送信する。
+        すべての書き込みが成功した場合にTrueを返す。
         """
 
-        targe_item_id = self.QUESTIONS['friends']
-        url_base = "https://drive.google.com/uc?export=view&id="
-        no_friends_img = url_base + "1JeCihM9JrBho6ZHnP9MY6aL8ngEGAFhB"
-        no_image_url = url_base + "1hVD7XBwRcpp46XvQSl-hjW70JgfKsKfU"
+        data = self.thread_write_buffer()
+        self.thread_local.write_buffer = []
+        if not data:
+            return True
+
+        # リクエストサイズの上限に収まるようにバッチを分ける。
+        batch = []
+        batch_size = 0
+        succeeded = True
+        for entry in data:
+            entry_size = len(json.dumps(entry))
+            if batch and batch_size + entry_size > self.MAX_REQUEST_BYTES:
+                succeeded = self.send_write_batch(batch) and succeeded
+                batch = []
+                batch_size = 0
+            batch.append(entry)
+            batch_size += entry_size
+        if batch:
+            succeeded = self.send_write_batch(batch) and succeeded
+        return succeeded
+
+
+    def send_write_batch(self, batch: list, retry: bool = True):
+        """
+        書き込みのバッチをvalues.batchUpdateで1回のリクエストとして送信するヘルパー関数
+        リクエストが大きすぎるとしてエラー（413、またはリクエストサイズの上限を示すメッセージの400）が返された場合は、バッチを半分に分割して送り直す。それ以外の400は、分割しても直らないので送り直さない。
+        シートの範囲外への書き込みとしてエラーが返された場合は、メタデータのキャッシュが古いと考えられるので、キャッシュを破棄し、列を確保してから1度だけ送り直す。
+        書き込みが（送り直しや分割を含めて）すべて成功した場合にTrueを返す。
+        """
 
         try:
-            # 現在のフォーム情報を取得
-            current_form = self.FORM_SERVICE.forms().get(formId=self.IDS['partic_form']).execute()
-
-            # 対象のアイテム(質問)を探す。
-            current_item = None
-            target_index = -1
-            for i, item in enumerate(current_form.get('items', [])):  # enumerateでインデックスを取得
-                if item.get('itemId') == targe_item_id:
-                    current_item = item
-                    target_index = i
-                    break            
-            if not current_item:
-                print("Error in \"IO.update_form()\": No proper question in the form.")
-                return
-            options = current_item['questionItem']['question']['choiceQuestion']['options']  # 現在の選択肢リストと「インデックス(場所)」を抽出
-
-            # 既存の投稿のプロフィール情報を反映
-            sheet_raw_answer = self.SHEET_SERVICE.spreadsheets()
-            response = sheet_raw_answer.values().get(
-                spreadsheetId=self.IDS['raw_answers'],
-                range=f"{self.RAW_SHEET}!A:D"  # 名前とプロフィール画像の情報が取れる範囲を取得する。
-                ).execute()
-            sheet_raw_answer_values = response.get('values', [])[1:]  # 第1要素はヘッダなので取り除く
-            if not response.get('values', []):  # participants_formが無い場合
-                print("Error in \"IO.init()\": sheet \"participants_form\" not found.")
-                sys.exit(1)
+            self.execute(self.SHEET_SERVICE.spreadsheets().values().batchUpdate(
+                spreadsheetId=self.IDS['datasheets'],
+                body={
+                    "valueInputOption": "USER_ENTERED",  # スプレッドシート上で入力したのと同じ挙動（日付などが自動変換される）
+                    "data": batch
+                }
+            ))
+            return True
+
+        except HttpError as e:
+            if e.resp.status == 400 and "exceeds grid limits" in str(e) and retry:
+                self.invalidate_sheets_meta('datasheets')
+                if self.NET_LAYOUT == "matrix":
+                    self.add_column_if_needed('datasheets', 'net_info', self.ADDITIONAL_COLUMN)
+                return self.send_write_batch(batch, retry=False)
+            if self.is_too_large(e) and len(json.dumps(batch)) > self.MIN_SPLIT_BYTES:  # リクエストサイズが原因の場合のみ分割する。
+                halves = self.split_write_batch(batch)
+                if len(halves) == 2:
+                    return all([self.send_write_batch(a_half) for a_half in halves])  # 片方が失敗しても、もう片方は送る。
+            print(f"Error while writing to the datasheets in \"IO.send_write_batch()\": {e}")
 
-            for an_option in options:
-                register_num = int(an_option['value'].split("_")[0])  # 登録番号=名前の先頭の番号を取得
+        except Exception as e:
+            print(f"Error while writing to the datasheets in \"IO.send_write_batch()\": {e}")
 
-                if register_num == 0:
-                    img = no_friends_img
-                else:
-                    if sheet_raw_answer_values[register_num-1][2] == "":  # 画像が選択されていない場合
-                        img = no_image_url
-                    else:
-                        img = url_base + sheet_raw_answer_values[register_num-1][2].split("=")[1]
+        return False
 
-                if 'image' in an_option:  # 画像情報を削除してエラーを回避（画像URL問題を避けるため）
-                    an_option['image'] = {'sourceUri': img}
 
-        except Exception as e:
-            print(f"Error while making \"participants_form\" with old answers in \"IO.update_form()\": {e}")
+    def is_too_large(self, error: HttpError):
+        """
+        エラーerrorが、リクエストサイズの上限を超えたことによるものかを判定するヘルパー関数
+        """
+
+        if error.resp.status == 413:
+            return True
+        return error.resp.status == 400 and bool(self.SIZE_LIMIT_PATTERN.search(error.reason or ""))  # str(error)はURL（"requesting ..."）を含むので、メッセージのみを見る。
+
+
+    def split_write_batch(self, batch: list):
+        """
+        書き込みのバッチを2つに分割するヘルパー関数
+        書き込みが複数ある場合は書き込み単位で、1つしかない場合はその書き込みの値を行（または列）単位で分割する。
+        分割できない場合は、元のバッチのみを含むリストを返す。
+        """
+
+        if len(batch) > 1:
+            return [batch[:len(batch)//2], batch[len(batch)//2:]]
+
+        entry = batch[0]
+        values = entry['values']
+        if len(values) < 2:
+            return [batch]
+
+        sheet_name, start_cell = entry['range'].split("!")
+        col_letter = re.match(r"[A-Z]+", start_cell).group()
+        row_num = int(start_cell[len(col_letter):])
+        half = len(values) // 2
+
+        if entry['majorDimension'] == "COLUMNS":  # 列ごとの値なので、後半は列をずらして書き込む。
+            second_range = f"{sheet_name}!{self.col_num_to_letter(self.col_letter_to_num(col_letter) + half)}{row_num}"
+        else:  # 行ごとの値なので、後半は行をずらして書き込む。
+            second_range = f"{sheet_name}!{col_letter}{row_num + half}"
+
+        return [
+            [{"range": entry['range'], "majorDimension": entry['majorDimension'], "values": values[:half]}],
+            [{"range": second_range, "majorDimension": entry['majorDimension'], "values": values[half:]}]
+        ]
+
+
+    def update_form(self, answers: list = None, registered_num: int = None):
+        """
+        participants_formの知り合いの質問を更新するメソッド
+        answers（省略した場合はself.new_answers）の回答を、登録番号registered_num+1からの知り合いの選択肢として追加する。
+        選択肢の一覧はローカルの写しself.form_mirrorから作るので、フォームやraw_answersの読み込みは行わない。
+        また、フォームの書き換えを行う間はフォームへの回答を停止する。
+        """
+
+        if answers is None:
+            answers = self.new_answers
+        if registered_num is None:
+            registered_num = self.partic_form_meta_info["all_answers_num"] - self.partic_form_meta_info["new_answers_num"]  # call_new_answers()で加算済みなので、今回の回答より前に登録されていた回答数を求める。
 
         try:
-            # 新しい投稿を反映
-            for counter, an_answer in enumerate(self.new_answers):
-                # 回答情報を取得
+            # 写しに質問の位置が無い場合のみ、フォームから探す。
+            if self.form_mirror['item_index'] is None:
+                current_form = self.execute(self.FORM_SERVICE.forms().get(formId=self.IDS['partic_form']))
+                self.form_mirror['item_index'] = self.find_friends_item(current_form)
+                if self.form_mirror['item_index'] is None:
+                    print("Error in \"IO.update_form()\": No proper question in the form.")
+                    return
+
+            # 登録済みの回答の選択肢は写しから、写しが足りない場合はローカルのデータベースから作る。
+            options = self.form_mirror['options'][:registered_num + 1]
+            if len(options) < registered_num + 1:
+                options = self.form_options(self.STORE.get_answers()[:registered_num])
 
-                if self.partic_form_meta_info['all_answers_num'] == 0:
-                    reg_num = self.partic_form_meta_info['all_answers_num'] + counter + 1 
-                else:
-                    reg_num = self.partic_form_meta_info['all_answers_num'] + counter + 1 - self.partic_form_meta_info['new_answers_num']
-                name = f"{reg_num}_{an_answer.get('answers', {}).get(self.ANSWERS['name'], {}).get('textAnswers', {}).get('answers', [{}])[0].get('value')}"
-                prof_img_id = an_answer.get('answers', {}).get(self.ANSWERS['prof_image'], {}).get('fileUploadAnswers', {}).get('answers', [{}])[0].get('fileId')
-
-                # 採用する画像を選ぶ
-                if name == self.FILE_NAMES['no_friends_img']:
-                    img = no_friends_img
-                elif prof_img_id == None:  # 画像が選択されていない場合
-                    img = no_image_url
-                else:
-                    img = url_base + prof_img_id
+            # 新しい投稿を反映
+            for counter, an_answer in enumerate(answers, start=1):
+                options.append(self.make_option(an_answer, registered_num + counter))
 
-                # 新しい選択肢の追加
-                new_option = {
-                    "value": name,
-                    "image": {
-                        "sourceUri": img
-                    }
-                }
-                options.append(new_option)
-
-            # 更新リクエストの作成
-            update_body = {
-                "requests": [
-                    {
-                        "updateItem": {
-                            "item": {
-                                "itemId": targe_item_id,
-                                "questionItem": {
-                                    "question": {
-                                        "choiceQuestion": {
-                                            "type": "CHECKBOX",
-                                            "options": options
-                                        }
-                                    }
-                                }
-                            },
-                            "location": {"index": target_index},
-                            "updateMask": "questionItem.question.choiceQuestion.options"
-                        }
-                    }
-                ]
-            }
+            # 新しい投稿が入る質問のみを書き換える。作り直す場合（registered_num == 0）は、すべての質問を書き換え、余分な質問を削除する。
+            total_num = len(options) - 1
+            if not answers and registered_num > 0:
+                return
+            first_bucket = 0 if registered_num == 0 else self.bucket_of(registered_num + 1)
+            last_bucket = self.bucket_of(total_num)
+            buckets_options = {k: self.bucket_options(options, k) for k in range(first_bucket, last_bucket + 1)}
 
             # API実行
-            self.change_form_status(False)
-            self.FORM_SERVICE.forms().batchUpdate(formId=self.IDS['partic_form'], body=update_body).execute()
-            self.change_form_status(True)
+            self.set_form_options(buckets_options, last_bucket + 1 if registered_num == 0 else None)
+            self.form_mirror['options'] = options
 
         except Exception as e:
+            self.form_mirror['item_index'] = None  # 質問の位置が変わった可能性があるので、次回はフォームから探し直す。
             print(f"Error while making \"participants_form\" with new answers in \"IO.update_form()\": {e}")
 
 
-    def set_datasheets(self):
+    def bucket_of(self, reg_num: int):
         """
-        datasheetsを更新するメソッド
-        self.new_answersの回答からdatasheetsを構築する。
+        登録番号reg_numの参加者の選択肢が入る、知り合いの質問の番号を返すヘルパー関数（「0_No friends / なし」は最初の質問に入る）
         """
 
-        self.writing_keeper("set")
-        self.add_column_if_needed('datasheets', 'net_info', self.ADDITIONAL_COLUMN)
-        self.writing_keeper("check")
+        if not self.FRIENDS_BUCKET_SIZE or reg_num <= 0:
+            return 0
+        return (reg_num - 1) // self.FRIENDS_BUCKET_SIZE
 
-        # 本処理
-        num = 1 if self.partic_form_meta_info['all_answers_num'] - 1 <= 0 else 0  # 回答が0件のときと1件以上のときで、新しい回答をdatasheetsに追加する際の回答番号の振る舞いを変えなければいけないから。これがないと、番号がズレる。
-        line_counter = 2
-        for counter, a_new_answer in enumerate(self.new_answers, start=num):  # 未処理の回答を一つずつ処理する。
-            # 各シートに順番に、最新の1行を書き込む。
-            a_body = self.make_body(a_new_answer, counter)
-            for a_sheet in list(self.SHEET_NAMES.keys()):
-                try:
-                    self.SHEET_SERVICE.spreadsheets().values().append(
-                        spreadsheetId=self.IDS['datasheets'],
-                        range=f"{self.SHEET_NAMES[a_sheet]}!A1",  # シート名を指定し、末尾に追加
-                        valueInputOption='USER_ENTERED',  # スプレッドシート上で入力したのと同じ挙動（日付などが自動変換される）
-                        insertDataOption='INSERT_ROWS',  # 必要に応じて新しい行を作成して挿入
-                        body={'values' : [a_body[a_sheet]]}
-                    ).execute()
-                    self.writing_keeper("check")
 
-                except Exception as e:
-                    print(f"Error while adding a row to the datasheets in \"IO.update_datasheets()\": {e}")
+    def bucket_options(self, options: list, bucket: int):
+        """
+        登録番号順の選択肢optionsのうち、bucket番目の知り合いの質問に入る選択肢を返すヘルパー関数
+        """
 
-            # ヘッダを書き込む。
-            try:  # 現在の最終列を確認するために、1行目(ヘッダー行)だけを取得
-                response = self.SHEET_SERVICE.spreadsheets().values().get(
-                    spreadsheetId=self.IDS['datasheets'],
-                    range=f"{self.SHEET_NAMES['net']}!1:1"  # 1行目全体
-                ).execute()
+        if not self.FRIENDS_BUCKET_SIZE:
+            return options
+        start = 0 if bucket == 0 else bucket * self.FRIENDS_BUCKET_SIZE + 1
+        return options[start:(bucket + 1) * self.FRIENDS_BUCKET_SIZE + 1]
 
-            except Exception as e:
-                print(f"Error while making a column for the datasheets in \"IO.update_datasheets()\": {e}")
-            
-            next_col_num = self.partic_form_meta_info["all_answers_num"] + counter + 2  # データがある列数 + 1 が書き込み開始位置
-            start_col_letter = self.col_num_to_letter(next_col_num)  # 列番号をアルファベットに変換
-            target_range = f"{self.SHEET_NAMES['net']}!{start_col_letter}1"  # 書き込む範囲を指定
-
-            new_column_data = [f"{self.partic_form_meta_info['all_answers_num']+counter}_{a_new_answer.get('answers', {}).get(self.ANSWERS['name'], {}).get('textAnswers', {}).get('answers', [{}])[0].get('value')}"]  # ヘッダ（第1行）に名前を追加            
-            body = {
-                'majorDimension': 'COLUMNS',
-                'values' : [new_column_data]
-            }
-            try:
-                self.SHEET_SERVICE.spreadsheets().values().update(
-                    spreadsheetId=self.IDS['datasheets'],  # 対象のスプレッドシートID
-                    range=target_range,
-                    valueInputOption="USER_ENTERED",  # 自動フォーマット（日付や数値の認識）
-                    body=body
-                ).execute()
-                self.writing_keeper("check")
 
-            except Exception as e:
-                print(f"Error while adding a column to the datasheets in \"IO.update_datasheets()\": {e}")
+    def find_friends_item(self, form: dict):
+        """
+        フォームの定義formから、知り合いの質問の位置を返すヘルパー関数（見つからない場合はNone）
+        """
+
+        for i, item in enumerate(form.get('items', [])):
+            if item.get('itemId') == self.QUESTIONS['friends']:
+                return i
+        return None
 
-            # 空欄に0を挿入していく。
-            try:
-                # 行ごとに足りない部分を0で埋めたリストを作る。
-                response = self.SHEET_SERVICE.spreadsheets().values().get(
-                    spreadsheetId=self.IDS['datasheets'],
-                    range=f"{self.SHEET_NAMES['net']}!{line_counter}:{line_counter}"  # line_counter行目全体を取得
-                ).execute()
-                a_row = response.get('values', [])[0]  # 二重リストなので、内側のリストを取り出す。
-                for i in range(self.partic_form_meta_info["all_answers_num"] + self.partic_form_meta_info["new_answers_num"] - len(a_row) + 2):
-                    a_row.append(0)
-
-                # 作成したリストをnet_infoに反映する。
-                target_cell = f"{self.SHEET_NAMES['net']}!A{line_counter}"  # 書き込む場所を指定
-                self.SHEET_SERVICE.spreadsheets().values().update(
-                    spreadsheetId=self.IDS['datasheets'],  # 対象のスプレッドシートID
-                    range=target_cell,
-                    valueInputOption="USER_ENTERED",  # 自動フォーマット（日付や数値の認識）
-                    body={'values' : [a_row]}
-                ).execute()
-                self.writing_keeper("check")
-
-                # 処理する行を次に進める
-                line_counter += 1
-            except Exception as e:
-                print(f"Error while filling up the datasheets in \"IO.update_datasheets()\": {e}")
-                
 
-    def recreate_databese(self):
+    def form_options(self, answers: list):
         """
-        datasheetsとparticipants_formのネットワーク情報の選択肢を、既存のものを破壊した後にparticipants_formから作り直すメソッド
+        answers（登録番号順の回答）から、知り合いの質問の選択肢の一覧を作るヘルパー関数
+        選択肢の位置は登録番号と一致する（0番目は「知り合いなし」）。
         """
-        # datasheetsの内容をすべて消去する。
-        for a_sheet in list(self.SHEET_NAMES.keys()):
-            try:
-                self.SHEET_SERVICE.spreadsheets().values().clear(
-                    spreadsheetId=self.IDS['datasheets'],
-                    range=self.SHEET_NAMES[a_sheet]
-                ).execute()
-            except Exception as e:
-                print(f"Error while deleting datasheets in \"recreate_databese()\": {e}")
 
-        # net_infoの最初のフォーマットを整える。
-        try:
-            self.SHEET_SERVICE.spreadsheets().values().update(
-                spreadsheetId=self.IDS['datasheets'],  # 対象のスプレッドシートID
-                range=f"{self.SHEET_NAMES['net']}!A1",  # 1行1列成分から書き込む。
-                valueInputOption="USER_ENTERED",  # 自動フォーマット（日付や数値の認識）
-                body={'values' : [["-", self.FILE_NAMES['no_friends_img']]]}
-            ).execute()
-        except Exception as e:
-            print(f"Error while writing first format to the datasheets in \"IO.recreate_databese()\": {e}")
+        url_base = "https://drive.google.com/uc?export=view&id="
+        no_friends_img = url_base + "1JeCihM9JrBho6ZHnP9MY6aL8ngEGAFhB"
 
-        # partic_info用の最初のフォーマットを整える。
-        try:
-            response = self.SHEET_SERVICE.spreadsheets().values().get(
-                spreadsheetId=self.IDS['raw_answers'],
-                range=f"{self.RAW_SHEET}!1:1"
-            ).execute()
-            questions = response['values'][0]
+        options = [{"value": self.FILE_NAMES['no_friends_img'], "image": {"sourceUri": no_friends_img}}]
+        options += [self.make_option(an_answer, reg_num) for reg_num, an_answer in enumerate(answers, start=1)]
+        return options
 
-            questions[0], questions[1] = questions[1], questions[0]  # 先頭2つの質問の順序が、partic_infoとraw_answersで異なるので、整える。
-            self.SHEET_SERVICE.spreadsheets().values().update(
-                spreadsheetId=self.IDS['datasheets'],  # 対象のスプレッドシートID
-                range=f"{self.SHEET_NAMES['partic']}!A1",  # 1行1列成分から書き込む。
-                valueInputOption="USER_ENTERED",  # 自動フォーマット（日付や数値の認識）
-                body={'values' : [questions]}
-            ).execute()
 
-        except Exception as e:
-            print(f"Error while writing first format to the partic_info in \"IO.recreate_datasheets()\": {e}")
+    def make_option(self, answer, reg_num: int):
+        """
+        登録番号reg_numの回答answerから、participants_formの知り合いの質問の選択肢を作るヘルパー関数
+        """
 
-        target_title = 'Participants List / 参加者リスト'
-        retain_option = "0_No friends / なし"
         url_base = "https://drive.google.com/uc?export=view&id="
         no_friends_img = url_base + "1JeCihM9JrBho6ZHnP9MY6aL8ngEGAFhB"
-        
-        # 対象の質問項目（Item）と現在の選択肢を特定
-        form_data = self.FORM_SERVICE.forms().get(formId=self.IDS['partic_form']).execute()  # 現在のフォーム情報を取得
-        target_item = None
-        target_index = 0 # インデックスを保持する変数を追加
-
-        # enumerateを使って、アイテムと同時にインデックス(i)も取得する
-        for i, item in enumerate(form_data.get('items', [])):
-            if item.get('title') == target_title:
-                target_item = item
-                target_index = i # インデックスを保存
-                break
-
-        if not target_item:
-            print(f"Error in \"IO.recreate_databese()\": Not found the question {target_title}")
-            return # エラー時はここで中断したほうが安全です
+        no_image_url = url_base + "1hVD7XBwRcpp46XvQSl-hjW70JgfKsKfU"
+
+        name = f"{reg_num}_{answer.get('answers', {}).get(self.ANSWERS['name'], {}).get('textAnswers', {}).get('answers', [{}])[0].get('value')}"
+        prof_img_id = answer.get('answers', {}).get(self.ANSWERS['prof_image'], {}).get('fileUploadAnswers', {}).get('answers', [{}])[0].get('fileId')
+
+        # 採用する画像を選ぶ
+        if name == self.FILE_NAMES['no_friends_img']:
+            img = no_friends_img
+        elif prof_img_id == None:  # 画像が選択されていない場合
+            img = no_image_url
         else:
-            target_item_id = target_item['itemId']
+            img = url_base + prof_img_id
 
-        # 新しい選択肢リストを作成（保持対象以外を削除）
-        new_option = {
-            "value": retain_option,
+        return {
+            "value": name,
             "image": {
-                "sourceUri": no_friends_img
+                "sourceUri": img
             }
         }
 
-        # APIリクエスト（batchUpdate）の作成
-        update_body = {
-            "requests": [
-                {
+
+    def set_form_options(self, buckets_options: dict, bucket_num: int = None):
+        """
+        participants_formの知り合いの質問の選択肢を置き換えるヘルパー関数
+        buckets_optionsは、質問の番号 → その質問の選択肢 の辞書。まだ無い質問は、前の質問の直後に作成する。
+        bucket_numを指定した場合は、bucket_num番目以降の質問を削除する。
+        すべての変更を1回のbatchUpdateで行い、書き換えを行う間はフォームへの回答を停止する。
+        """
+
+        buckets = self.form_mirror['buckets']
+        item_index = self.form_mirror['item_index']
+
+        # 更新リクエストの作成
+        requests = []
+        for k in sorted(buckets_options):
+            choice_question = {
+                "choiceQuestion": {
+                    "type": "CHECKBOX",
+                    "options": buckets_options[k]
+                }
+            }
+            if k < len(buckets):  # 既存の質問の選択肢を置き換える。
+                requests.append({
                     "updateItem": {
                         "item": {
-                            "itemId": target_item_id,
-                            "questionItem": {
-                                "question": {
-                                    "choiceQuestion": {
-                                        "type": "CHECKBOX",
-                                        "options": [new_option]
-                                    }
-                                }
-                            }
+                            "itemId": buckets[k]['itemId'],
+                            "questionItem": {"question": choice_question}
                         },
-                        "location": {"index": target_index},  # 場所(index)を指定することで "A Location is required" エラーを回避
+                        "location": {"index": item_index + k},
                         "updateMask": "questionItem.question.choiceQuestion.options"
                     }
-                }
-            ]
-        }
+                })
+            else:  # 質問を作成する。
+                start = k * self.FRIENDS_BUCKET_SIZE + 1
+                requests.append({
+                    "createItem": {
+                        "item": {
+                            "title": f"{self.FRIENDS_TITLE} ({start}-{start + self.FRIENDS_BUCKET_SIZE - 1})",
+                            "questionItem": {"question": choice_question}
+                        },
+                        "location": {"index": item_index + k}
+                    }
+                })
+        if bucket_num is not None:  # 余分な質問を、後ろから削除する。
+            for k in range(len(buckets) - 1, max(bucket_num, 1) - 1, -1):
+                requests.append({"deleteItem": {"location": {"index": item_index + k}}})
 
-        # APIを実行して更新
+        # API実行
+        with self.TRACER.span("change_form_status", is_open=False):
+            self.change_form_status(False)
         try:
-            self.FORM_SERVICE.forms().batchUpdate(
-                formId=self.IDS['partic_form'], 
-                body=update_body
-            ).execute()
-            
-        except Exception as e:
-            print(f"Error while resting \"participants_form\" in \"IO.recreate_form()\":{e}")
+            response = self.execute(self.FORM_SERVICE.forms().batchUpdate(formId=self.IDS['partic_form'], body={"requests": requests}))
+        finally:
+            with self.TRACER.span("change_form_status", is_open=True):
+                self.change_form_status(True)  # 失敗しても、フォームを閉じたままにしない。
+
+        # 作成・削除した質問を写しに反映し、質問IDを保存する。
+        if bucket_num is not None:
+            del buckets[max(bucket_num, 1):]
+        for a_request, a_reply in zip(requests, response.get('replies', [])):
+            if 'createItem' in a_request:
+                buckets.append({"itemId": a_reply['createItem']['itemId'], "questionId": a_reply['createItem']['questionId'][0]})
+                self.form_mirror['question_ids'].append(a_reply['createItem']['questionId'][0])
+        self.STORE.set_meta('friends_buckets', buckets)
+        self.STORE.set_meta('friends_question_ids', self.form_mirror['question_ids'])
+
+
+    def make_tables(self, answers: list, registered_num: int):
+        """
+        回答のリストから、datasheetsの各シートの表をメモリ上に構築するヘルパー関数
+        answersの先頭の回答の登録番号をregistered_num+1として、シートごとの行のリストを値とする辞書を返す。
+        """
 
-        # ローカルのプロフィール画像を更新
-        target_dir = self.FILE_PATHS['prof']
-        target_imgs = glob.glob(os.path.join(target_dir, '*'))
-        for each in target_imgs:
-            img_name = os.path.basename(each)  # ファイル名を取り出す。
-            if not img_name == self.FILE_NAMES['no_image_img']:  # self.FILE_NAMES['no_image_img']以外の画像を削除
-                os.remove(each)
+        total_num = registered_num + len(answers)
+        tables = {a_sheet: [] for a_sheet in self.SHEET_NAMES.keys()}
+        for counter, an_answer in enumerate(answers, start=1):
+            a_body = self.make_body(an_answer, registered_num + counter, total_num)
+            tables['partic'].append(a_body['partic'])
+            if self.NET_LAYOUT == "matrix":
+                tables['net'].append(a_body['net'])
+            else:  # "edges"形式では、1つの回答が複数行になる。
+                tables['net'].extend(a_body['net'])
 
-        # クラウド上のデータを更新
-        self.set_all_answers_as_new()
-        self.set_datasheets()
-        self.update_form()
+        return tables
 
-        # ローカルファイルの更新1
-        self.get_img_to_local()
 
-        # 処理した新しい回答のキューを削除
-        self.partic_form_meta_info['all_answers_num'] = len(self.new_answers)
-        self.new_answers.clear()
-        self.partic_form_meta_info['new_answers_num'] = 0
+    def reconcile_databese(self, prefetched: dict = None):
+        """
+        datasheets、participants_formの知り合いの質問の選択肢、ローカルのプロフィール画像を、ローカルのデータベースにある回答から期待される状態と比較し、
+        食い違っている行・列・選択肢・画像だけを書き直すメソッド
+        既存のものを破壊しないので、実行中もフォームとグラフはそのまま使える。
+        prefetchedには、bootstrap()で読み込み済みのリモートの情報（"raw_header", "datasheets", "form"）を渡せる。渡されたものは読み込み直さない。
+        修復した内容を辞書で返す。
+        """
+
+        self.wait_exports()  # 別スレッドでの書き込みが終わってから比較する。
+        if not self.bootstrapped and prefetched is None:  # 起動時の読み込みが失敗していた場合は、データベースを作り直すところからやり直す。
+            self.needs_reconcile = False
+            if not self.bootstrap():
+                return None
+            return self.bootstrap_report['reconcile']
+        prefetched = prefetched or {}
+        self.needs_reconcile = False
+
+        answers = self.STORE.get_answers()  # 登録番号順
+        report = {}
+        with self.TRACER.span("reconcile_datasheets"), self.SCHEDULER.running("bulk"):  # datasheetsの修復は参加者に見えないので、余ったトークンだけを使う。
+            report['datasheets'] = self.reconcile_datasheets(answers, prefetched.get('raw_header'), prefetched.get('datasheets'))
+        with self.TRACER.span("reconcile_form"):
+            report['form'] = self.reconcile_form(answers, prefetched.get('form'))
+        with self.TRACER.span("reconcile_images"):
+            report['images'] = self.reconcile_images(answers)
+
+        with self.TRACER.span("recreat_local_file", full=True):
+            self.recreat_local_file(full=True)  # ローカルファイルは、通信が不要なので作り直す。
 
-        # ローカルファイルを更新2
-        self.recreat_local_file()
+        return report
 
 
-    def recreate_datasheets(self):
+    def reconcile_datasheets(self, answers: list, raw_header: dict = None, datasheets: dict = None):
         """
-        datasheetsを、既存のものを破壊した後にparticipants_formから作り直すメソッド
+        datasheetsの各シートを、answersから期待される表と比較し、食い違っている部分だけを書き直すヘルパー関数
+        raw_answersのヘッダと、datasheetsの中身（values.batchGetのレスポンス）は、渡されなければ読み込む。
+        シートごとに、書き直した行・列と消去した行数を返す。
+        NET_LAYOUTを変えて起動した場合は、net_info全体が食い違うので、新しい形式で書き直され、古い形式の余分な行と列も消される（形式の移行は、これで行う）。
         """
 
-        # datasheetsの内容をすべて消去する。
-        for a_sheet in list(self.SHEET_NAMES.keys()):
-            try:
-                self.SHEET_SERVICE.spreadsheets().values().clear(
+        report = {}
+        try:
+            # 期待される表をメモリ上に作る。
+            tables = self.make_tables(answers, 0)
+            names = [a_line[0] for a_line in tables['partic']]
+
+            if raw_header is None:
+                raw_header = self.execute(self.SHEET_SERVICE.spreadsheets().values().get(
+                    spreadsheetId=self.IDS['raw_answers'],
+                    range=f"{self.RAW_SHEET}!1:1"
+                ))
+            questions = list(raw_header['values'][0])
+            questions[0], questions[1] = questions[1], questions[0]  # 先頭2つの質問の順序が、partic_infoとraw_answersで異なるので、整える。
+
+            expected = {
+                "partic": [questions] + tables['partic'],
+                "net": [self.net_header() + (names if self.NET_LAYOUT == "matrix" else [])] + tables['net']
+            }
+
+            # 現在のシートを1回のvalues.batchGetで取得する。
+            sheet_keys = list(self.SHEET_NAMES.keys())
+            if datasheets is None:
+                datasheets = self.execute(self.SHEET_SERVICE.spreadsheets().values().batchGet(
                     spreadsheetId=self.IDS['datasheets'],
-                    range=self.SHEET_NAMES[a_sheet]
-                ).execute()
-            except Exception as e:
-                print(f"Error while deleting datasheets in \"recreate_datasheets()\": {e}")
+                    ranges=[self.SHEET_NAMES[a_sheet] for a_sheet in sheet_keys]
+                ))
+            remote = {a_sheet: a_range.get('values', []) for a_sheet, a_range in zip(sheet_keys, datasheets.get('valueRanges', []))}
+
+            if self.NET_LAYOUT == "matrix":
+                self.add_column_if_needed('datasheets', 'net_info', self.ADDITIONAL_COLUMN, len(answers))
+            for a_sheet in sheet_keys:
+                report[a_sheet] = self.reconcile_grid(self.SHEET_NAMES[a_sheet], expected[a_sheet], remote[a_sheet], repair_columns=(a_sheet == 'net' and self.NET_LAYOUT == "matrix"))
+            if self.flush_write_buffer():
+                with self.meta_lock:
+                    self.partic_form_meta_info['edges_num'] = len(tables['net']) if self.NET_LAYOUT == "edges" else 0
+            else:
+                self.needs_reconcile = True
 
-        # net_infoの最初のフォーマットを整える。
-        try:
-            self.SHEET_SERVICE.spreadsheets().values().update(
-                spreadsheetId=self.IDS['datasheets'],  # 対象のスプレッドシートID
-                range=f"{self.SHEET_NAMES['net']}!A1",  # 1行1列成分から書き込む。
-                valueInputOption="USER_ENTERED",  # 自動フォーマット（日付や数値の認識）
-                body={'values' : [["-", self.FILE_NAMES['no_friends_img']]]}
-            ).execute()
         except Exception as e:
-            print(f"Error while writing first format to the net_info in \"IO.recreate_datasheets()\": {e}")
+            print(f"Error in \"IO.reconcile_datasheets()\": {e}")
 
-        # partic_info用の最初のフォーマットを整える。
-        try:
-            response = self.SHEET_SERVICE.spreadsheets().values().get(
-                spreadsheetId=self.IDS['raw_answers'],
-                range=f"{self.RAW_SHEET}!1:1"
-            ).execute()
-            questions = response['values'][0]
+        return report
 
-            questions[0], questions[1] = questions[1], questions[0]  # 先頭2つの質問の順序が、partic_infoとraw_answersで異なるので、整える。
-            self.SHEET_SERVICE.spreadsheets().values().update(
-                spreadsheetId=self.IDS['datasheets'],  # 対象のスプレッドシートID
-                range=f"{self.SHEET_NAMES['partic']}!A1",  # 1行1列成分から書き込む。
-                valueInputOption="USER_ENTERED",  # 自動フォーマット（日付や数値の認識）
-                body={'values' : [questions]}
-            ).execute()
 
-        except Exception as e:
-            print(f"Error while writing first format to the partic_info in \"IO.recreate_datasheets()\": {e}")
+    def reconcile_grid(self, sheet_name: str, expected: list, remote: list, repair_columns: bool = False):
+        """
+        シートsheet_nameの値remoteを、期待される値expectedと行ごとのハッシュで比較し、食い違っている行を書き込みバッファに溜めるヘルパー関数
+        repair_columns=Trueの場合、COLUMN_REPAIR_MIN以上の行で食い違っている列は、列ごと書き直す。
+        余分な行は消去する。書き直した行番号・列番号と、消去した行数を返す。
+        """
 
-        # 書き込む。
-        self.set_all_answers_as_new()
-        self.set_datasheets()
+        expected = [self.normalize_row(a_row) for a_row in expected]
+        remote = [self.normalize_row(a_row) for a_row in remote]
+        report = {"rows": [], "columns": [], "cleared_rows": 0}
+
+        bad_rows = []
+        for i, a_row in enumerate(expected):
+            if i >= len(remote) or self.row_hash(a_row) != self.row_hash(remote[i]):
+                bad_rows.append(i)
+
+        # 食い違っているセルを列ごとに数える。
+        bad_cells = {}
+        for i in bad_rows:
+            got = remote[i] if i < len(remote) else []
+            bad_cells[i] = [j for j in range(max(len(expected[i]), len(got))) if (expected[i][j] if j < len(expected[i]) else "") != (got[j] if j < len(got) else "")]
+
+        bad_cols = set()
+        if repair_columns:
+            col_counts = {}
+            for cols in bad_cells.values():
+                for j in cols:
+                    col_counts[j] = col_counts.get(j, 0) + 1
+            bad_cols = {j for j, count in col_counts.items() if count >= self.COLUMN_REPAIR_MIN}
+
+        # 列ごとに書き直す。
+        for j in sorted(bad_cols):
+            a_column = [a_row[j] if j < len(a_row) else "" for a_row in expected]  # 余分な行は、後で消去する。
+            self.buffer_write(f"{sheet_name}!{self.col_num_to_letter(j + 1)}1", [a_column], "COLUMNS")
+            report['columns'].append(j + 1)
+
+        # 列の書き直しで直らない行を、行ごとに書き直す。既存の行の方が長い場合は、余分なセルを空にする。
+        for i in bad_rows:
+            if all(j in bad_cols for j in bad_cells[i]):
+                continue
+            width = len(remote[i]) if i < len(remote) else 0
+            self.buffer_write(f"{sheet_name}!A{i + 1}", [expected[i] + [""] * (width - len(expected[i]))])
+            report['rows'].append(i + 1)
+
+        # 余分な行を消去する。
+        if len(remote) > len(expected):
+            self.execute(self.SHEET_SERVICE.spreadsheets().values().clear(
+                spreadsheetId=self.IDS['datasheets'],
+                range=f"{sheet_name}!{len(expected) + 1}:{len(remote)}"
+            ))
+            report['cleared_rows'] = len(remote) - len(expected)
 
-        # 処理した新しい回答のキューを削除
-        self.partic_form_meta_info['all_answers_num'] = len(self.new_answers)
-        self.new_answers.clear()
-        self.partic_form_meta_info['new_answers_num'] = 0
+        return report
 
-    
-    def recreate_form(self):
+
+    def normalize_row(self, a_row: list):
         """
-        participants_formのネットワーク情報の選択肢を、既存のものを破壊した後にraw_answersから作り直すメソッド
+        シートの1行を、比較のために文字列のリストに揃えるヘルパー関数（Noneは空欄とし、末尾の空欄は取り除く）
         """
 
-        target_title = 'Participants List / 参加者リスト'
-        retain_option = "0_No friends / なし"
-        url_base = "https://drive.google.com/uc?export=view&id="
-        no_friends_img = url_base + "1JeCihM9JrBho6ZHnP9MY6aL8ngEGAFhB"
-        
-        # 対象の質問項目（Item）と現在の選択肢を特定
-        form_data = self.FORM_SERVICE.forms().get(formId=self.IDS['partic_form']).execute()  # 現在のフォーム情報を取得
-        target_item = None
-        target_index = 0 # インデックスを保持する変数を追加
-
-        # enumerateを使って、アイテムと同時にインデックス(i)も取得する
-        for i, item in enumerate(form_data.get('items', [])):
-            if item.get('title') == target_title:
-                target_item = item
-                target_index = i # インデックスを保存
-                break
-
-        if not target_item:
-            print(f"Error in \"IO.recreate_form()\": Not found the question {target_title}")
-            return # エラー時はここで中断したほうが安全です
-        else:
-            target_item_id = target_item['itemId']
+        result = ["" if a_value is None else str(a_value) for a_value in a_row]
+        while result and result[-1] == "":
+            result.pop()
+        return result
 
-        # 新しい選択肢リストを作成（保持対象以外を削除）
-        new_option = {
-            "value": retain_option,
-            "image": {
-                "sourceUri": no_friends_img
-            }
-        }
 
-        # APIリクエスト（batchUpdate）の作成
-        update_body = {
-            "requests": [
-                {
-                    "updateItem": {
-                        "item": {
-                            "itemId": target_item_id,
-                            "questionItem": {
-                                "question": {
-                                    "choiceQuestion": {
-                                        "type": "CHECKBOX",
-                                        "options": [new_option]
-                                    }
-                                }
-                            }
-                        },
-                        "location": {"index": target_index},  # 場所(index)を指定することで "A Location is required" エラーを回避
-                        "updateMask": "questionItem.question.choiceQuestion.options"
-                    }
-                }
-            ]
-        }
+    def row_hash(self, a_row: list):
+        """
+        シートの1行のハッシュ値を計算するヘルパー関数
+        """
+
+        return hashlib.sha1(json.dumps(a_row, ensure_ascii=False).encode('utf-8')).hexdigest()
+
+
+    def reconcile_form(self, answers: list, current_form: dict = None):
+        """
+        participants_formの知り合いの質問の選択肢を、answersから期待される選択肢と比較し、食い違っていれば書き直すヘルパー関数
+        フォームから取得できる選択肢には画像のURLが含まれないので、選択肢の文字列のみを比較する。フォームの定義current_formは、渡されなければ読み込む。
+        ローカルの写しself.form_mirrorも、期待される選択肢に揃える。
+        書き直した場合は、食い違っていた選択肢の数を返す。
+        """
+
+        expected = self.form_options(answers)
 
-        # APIを実行して更新
         try:
-            self.FORM_SERVICE.forms().batchUpdate(
-                formId=self.IDS['partic_form'], 
-                body=update_body
-            ).execute()
-            
+            if current_form is None:
+                current_form = self.execute(self.FORM_SERVICE.forms().get(formId=self.IDS['partic_form']))
+            i = self.find_friends_item(current_form)
+            if i is not None:
+                self.form_mirror['item_index'] = i
+                items = current_form.get('items', [])
+                buckets = self.form_mirror['buckets']
+
+                # 分けた質問が、最初の質問の直後に順に並んでいる範囲のみを使う。
+                consistent_num = 1
+                while consistent_num < len(buckets) and i + consistent_num < len(items) and items[i + consistent_num].get('itemId') == buckets[consistent_num]['itemId']:
+                    consistent_num += 1
+                if consistent_num < len(buckets):
+                    print(f"Warning in \"IO.reconcile_form()\": {len(buckets) - consistent_num} divided question(s) are not found in place.")
+                    del buckets[consistent_num:]
+
+                # 質問ごとに比較し、食い違っている質問のみを書き直す。
+                bucket_num = self.bucket_of(len(answers)) + 1
+                diff_num = 0
+                buckets_options = {}
+                for k in range(max(bucket_num, len(buckets))):
+                    expected_values = [an_option['value'] for an_option in self.bucket_options(expected, k)] if k < bucket_num else []
+                    current_values = []
+                    if k < len(buckets):
+                        current_values = [an_option.get('value') for an_option in items[i + k]['questionItem']['question']['choiceQuestion'].get('options', [])]
+                    if current_values != expected_values:
+                        diff_num += sum(1 for a, b in zip(current_values, expected_values) if a != b) + abs(len(current_values) - len(expected_values))
+                        if k < bucket_num:
+                            buckets_options[k] = self.bucket_options(expected, k)
+
+                if diff_num:
+                    self.set_form_options(buckets_options, bucket_num)
+                self.form_mirror['options'] = expected
+                return diff_num
+
+            print("Error in \"IO.reconcile_form()\": No proper question in the form.")
+
         except Exception as e:
-            print(f"Error while resting \"participants_form\" in \"IO.recreate_form()\":{e}")
+            print(f"Error in \"IO.reconcile_form()\": {e}")
 
-        # 選択肢を作り直す。
-        self.set_all_answers_as_new()
-        self.update_form()
+        return 0
 
-        # 処理した新しい回答のキューを削除
-        self.partic_form_meta_info['all_answers_num'] = len(self.new_answers)
-        self.new_answers.clear()
-        self.partic_form_meta_info['new_answers_num'] = 0
 
-    
-    def recreat_local_file(self):
+    def reconcile_images(self, answers: list):
         """
-        datasheetsのデータをローカルに落とすメソッド
-        range: 取得するデータの範囲
-            ・all: シート全体
-            ・diff: 差分のみ
+        ローカルのプロフィール画像を、answersから期待される画像と比較し、足りない画像をダウンロードし、余分な画像を削除するヘルパー関数
+        ダウンロードした画像と削除した画像のファイル名を返す。
         """
 
-        img_dir = "./../src/prof_imgs/"
+        return {
+            "downloaded": self.get_img_to_local(answers, 0),  # 既にある画像はダウンロードされない。
+            "removed": self.remove_local_imgs(answers)
+        }
 
-        edge_value = 1  # データフォーマット的に必要な値。本アプリケーションでは使用しないので、適当に決めた。
 
-        # データの取得
-        try:
-            # datasheetsの情報を取得
-            ans_num = self.partic_form_meta_info["all_answers_num"]
-            tmp = int(ans_num if ans_num > 0 else 1) + 2  # net_infoの第1、2列の分を回答数にオフセットしてシート全体の列数を取得
-            col_letter = self.col_num_to_letter(tmp)
+    def recreat_local_file(self, full: bool = False):
+        """
+        ローカルのデータベースのデータを、ローカルファイルに落とすメソッド
+        前回の同期以降に追加された参加者と友人関係だけをメモリ上のネットワーク情報(self.net_model)に統合し、差分があればローカルファイルを書き出す。
+        full=True の場合、または同期済みの部分のチェックサムが一致しない場合は、データベース全体から作り直す。
+        追加されたノードとエッジを、ファイルと同じ形式の辞書として返す。
+        """
 
-            # net_infoが表す隣接行列を取得
-            response = self.SHEET_SERVICE.spreadsheets().values().get(
-                spreadsheetId=self.IDS['datasheets'],
-                range=f"{self.SHEET_NAMES['net']}!A2:{col_letter}{ans_num+1}"
-            ).execute()
-            net_mat = response['values']
-
-            # 質問数を取得
-            response = self.SHEET_SERVICE.spreadsheets().values().get(
-                spreadsheetId=self.IDS['raw_answers'],
-                range=f"{self.RAW_SHEET}!1:1"
-            ).execute()
-            questions_num = len(response['values'][0])
-
-            # partic_infoの情報を取得
-            col_letter = self.col_num_to_letter(questions_num+2)  # partic_infoの第1列は名前、第2列はタイムスタンプなので、その分オフセットを施す。
-            response = self.SHEET_SERVICE.spreadsheets().values().get(
-                spreadsheetId=self.IDS['datasheets'],
-                range=f"{self.SHEET_NAMES['partic']}!A2:{col_letter}{ans_num+1}"  # 一列目はヘッダなので、その分オフセットを施す。
-            ).execute()
-            partic_list = response['values']
+        delta = None
+        if not full and self.net_model is not None:
+            try:
+                delta = self.fetch_local_model_delta()
+                if delta is None:
+                    print("Checksum mismatch in \"IO.recreat_local_file()\": rebuilding the whole local file.")
+
+            except Exception as e:
+                print(f"Error while getting data in \"IO.recreat_local_file()\": {e}")
+                return {"nodes": [], "links": []}
+
+        if delta is None:  # データベース全体から作り直す。
+            delta = self.fetch_local_model()
+            full = True
 
-        except Exception as e:
-            print(f"Error while getting data in \"IO.save_to_local()\": {e}")
-        
         # ファイルへの書き出し
-        node_lst = []
-        edge_lst = []
-        for i in range(ans_num):
-            if len(partic_list[i]) > 3:  # プロフィール画像を選択していない投稿は、partic_list[i]が短くなる。
-                node_a_line = {"name": partic_list[i][0], "img_id": partic_list[i][2]}  # 名前とプロフィール画像idを取得
-            else:
-                node_a_line = {"name": partic_list[i][0], "img_id": "null"}  # 名前とプロフィール画像idを取得
+        if full or delta['nodes'] or delta['links']:
+            with open(self.FILE_PATHS['net'], 'w') as f:
+                json.dump(self.net_model, f, indent=2)
+
+        return delta
 
-            j = 2  # net_mat[i]の第1要素は名前、第2要素は「0_No friends / なし」との接続なので、除外する。
-            while j < len(net_mat[i]):
-                if net_mat[i][j] == '1':
-                    edge_lst.append({"source": i, "target": j-2, "value": edge_value})
 
-                j += 1
+    def fetch_local_model(self):
+        """
+        ローカルのデータベース全体から、メモリ上のネットワーク情報(self.net_model)と同期状況(self.net_synced)を作り直すヘルパー関数
+        """
 
-            node_lst.append(node_a_line)
+        self.net_model = {"nodes": [], "links": []}
+        self.net_synced = {"rows": 0, "checksum": self.names_checksum([])}
 
-        d = {
-            "nodes": node_lst,
-            "links": edge_lst
-        }
-        with open(self.FILE_PATHS['net'], 'w') as f:
-            json.dump(d, f, indent=2)
+        delta = self.fetch_local_model_delta()
+        return {"nodes": list(delta['nodes']), "links": list(delta['links'])}
 
 
-    def get_img_to_local(self):
+    def fetch_local_model_delta(self):
+        """
+        前回の同期以降にローカルのデータベースに追加された参加者と友人関係だけを、メモリ上のネットワーク情報(self.net_model)に統合するヘルパー関数
+        追加されたノードとエッジを返す。同期済みの参加者名のチェックサムが一致しない場合はNoneを返す。
+        """
+
+        synced_num = self.net_synced['rows']
+        delta = {"nodes": [], "links": []}
+
+        participants = self.STORE.get_participants()
+        if len(participants) < synced_num:  # 参加者が減っている場合は、作り直す。
+            return None
+
+        # 同期済みの部分が変わっていないか確認する。
+        if self.names_checksum([a_partic['name'] for a_partic in participants[:synced_num]]) != self.net_synced['checksum']:
+            return None
+        if len(participants) == synced_num:
+            return delta
+
+        # 新しいノード
+        for a_partic in participants[synced_num:]:
+            delta['nodes'].append(self.make_node([a_partic['name'], a_partic['timestamp'], a_partic['img_id']]))
+        node_num = len(participants)
+
+        # 新しいエッジ
+        for source, target, _ in self.STORE.get_edges(synced_num):
+            if 0 < source <= node_num and 0 < target <= node_num:
+                delta['links'].append(self.make_link(source, target))
+
+        # メモリ上のネットワーク情報に統合する。
+        self.net_model['nodes'].extend(delta['nodes'])
+        self.net_model['links'].extend(delta['links'])
+        self.net_synced['rows'] = node_num
+        self.net_synced['checksum'] = self.names_checksum([node['name'] for node in self.net_model['nodes']])
+
+        return delta
+
+
+    def make_node(self, a_row: list):
+        """
+        partic_infoの1行から、ローカルファイル用のノードの辞書を作るヘルパー関数
+        """
+
+        if len(a_row) > 2 and a_row[2]:  # プロフィール画像を選択していない投稿は、a_rowが短くなる。
+            return {"name": a_row[0], "img_id": a_row[2]}  # 名前とプロフィール画像idを取得
+        return {"name": a_row[0], "img_id": "null"}
+
+
+    def make_link(self, source: int, target: int):
+        """
+        登録番号source, targetの友人関係から、ローカルファイル用のエッジの辞書を作るヘルパー関数
+        """
+
+        edge_value = 1  # データフォーマット的に必要な値。本アプリケーションでは使用しないので、適当に決めた。
+        return {"source": source-1, "target": target-1, "value": edge_value}  # 登録番号を、ノードのインデックスに変換する。
+
+
+    def names_checksum(self, names: list):
+        """
+        参加者名のリストのチェックサムを計算するヘルパー関数
+        """
+
+        return hashlib.sha1("\n".join(names).encode('utf-8')).hexdigest()
+
+
+    def net_header(self):
+        """
+        現在のNET_LAYOUTにおける、net_infoの第1行の先頭部分を返すヘルパー関数
+        """
+
+        if self.NET_LAYOUT == "matrix":
+            return ["-", self.FILE_NAMES['no_friends_img']]
+        return list(self.EDGES_HEADER)
+
+
+    def get_img_to_local(self, answers: list = None, registered_num: int = None):
         """
         プロフィール画像をダウンロードしてローカルに保存する関数
+        answers（省略した場合はself.new_answers）の回答を、登録番号registered_num+1からの回答として扱う。
+        同じGoogleドライブのファイルIDの画像が既にローカルにある場合はダウンロードしない。それ以外は、DOWNLOAD_WORKERS個のスレッドで並行してダウンロードする。
+        縮小版が無いか古い画像については、THUMBNAILERで縮小版を作る。
+        ダウンロードした画像のファイル名のリストを返す。
         """
 
-        base_uri = "https://drive.google.com/uc?export=view&id="
+        if answers is None:
+            answers = self.new_answers
+        if registered_num is None:
+            registered_num = self.partic_form_meta_info["all_answers_num"] - self.partic_form_meta_info["new_answers_num"]
 
+        downloaded = []
         try:
-            offset = 1 if self.partic_form_meta_info['all_answers_num'] - 1 <= 0 else 0  # 回答が0件のときと1件以上のときで、新しい回答をdatasheetsに追加する際の回答番号の振る舞いを変えなければいけないから。これがないと、番号がズレる。
-            for i, ans in enumerate(self.new_answers):
-                name = ans['answers'][self.ANSWERS['name']]['textAnswers']['answers'][0]['value']
-                if self.ANSWERS['prof_image'] in ans['answers']:
+            saved_imgs = self.STORE.get_meta('prof_images', {})  # ローカルの画像のファイル名と、そのGoogleドライブのファイルIDの対応
+
+            # ダウンロードが必要な画像を選ぶ。
+            jobs = {}
+            img_names = []
+            for i, ans in enumerate(answers, start=1):
+                img_name = self.img_file_name(ans, registered_num + i)
+                if img_name:
+                    img_names.append(img_name)
                     img_id = ans['answers'][self.ANSWERS['prof_image']]['fileUploadAnswers']['answers'][0]['fileId']
-                    file_format = ans['answers'][self.ANSWERS['prof_image']]['fileUploadAnswers']['answers'][0]['mimeType'].split("/")[1]
-
-                    # 【修正箇所 1】 Windows禁止文字を一括置換
-                    # \ / : * ? " < > | をすべて _ に置き換える
-                    name = re.sub(r'[\\/:*?"<>|]', '_', name)
 
-                    ans_number = self.partic_form_meta_info["all_answers_num"] + i + offset
-                    img_uri = base_uri + img_id
-                    img_name = f"{ans_number}_{name}.{file_format}"
-                    
                     # 【修正箇所 2】 パス結合は + ではなく os.path.join を使う
                     # Windowsでは \、Macでは / を自動で使い分けてくれます
                     img_path = os.path.join(self.FILE_PATHS['prof'], img_name)
 
-                    res = requests.get(img_uri)
-                    with open(img_path, 'wb') as f:
-                        f.write(res.content)
+                    if saved_imgs.get(img_name) == img_id and os.path.isfile(img_path):
+                        continue
+                    jobs[img_name] = (img_id, img_path)
+
+            # 並行してダウンロードする。
+            if jobs:
+                with concurrent.futures.ThreadPoolExecutor(max_workers=self.DOWNLOAD_WORKERS) as executor:
+                    futures = {executor.submit(self.TRACER.bind(self.download_img, "download_img", img_name=img_name), img_id, img_path): img_name for img_name, (img_id, img_path) in jobs.items()}
+                    for future in concurrent.futures.as_completed(futures):
+                        img_name = futures[future]
+                        try:
+                            future.result()
+                            saved_imgs[img_name] = jobs[img_name][0]
+                            downloaded.append(img_name)
+                        except Exception as e:
+                            print(f"Error while downloading \"{img_name}\" in \"IO.get_img_to_local()\": {e}")
+
+                self.STORE.set_meta('prof_images', saved_imgs)
+
+            # 縮小版を作る（別プロセスで行うので、完成を待たない）。
+            self.THUMBNAILER.make(img_names)
+
         except Exception as e:
             print(f"Error in \"IO.get_img_to_local()\": {e}")
 
+        return sorted(downloaded)
+
+
+    def download_img(self, img_id: str, img_path: str):
+        """
+        GoogleドライブのファイルIDがimg_idの画像を、img_pathに保存するヘルパー関数
+        本体はメモリに溜めずに、DOWNLOAD_CHUNK_SIZEごとに一時ファイルに書き込み、書き終えてからimg_pathに置き換える。
+        """
+
+        base_uri = "https://drive.google.com/uc?export=view&id="
+        tmp_path = os.path.join(os.path.dirname(img_path), f".{os.path.basename(img_path)}.part")  # 書き込み中のファイルが、プロフィール画像として拾われないようにする。
+
+        with self.download_session.get(base_uri + img_id, stream=True, timeout=self.DOWNLOAD_TIMEOUT) as res:
+            res.raise_for_status()
+            with open(tmp_path, 'wb') as f:
+                for a_chunk in res.iter_content(chunk_size=self.DOWNLOAD_CHUNK_SIZE):
+                    f.write(a_chunk)
+        os.replace(tmp_path, img_path)
+
+
+    def remove_local_imgs(self, answers: list):
+        """
+        ローカルのプロフィール画像のうち、answers（登録番号順のすべての回答）のどれにも対応しない画像を削除するヘルパー関数
+        self.FILE_NAMES['no_image_img']は削除しない。削除した画像のファイル名のリストを返す。
+        """
+
+        expected = {self.img_file_name(an_answer, reg_num) for reg_num, an_answer in enumerate(answers, start=1)}
+        expected.add(self.FILE_NAMES['no_image_img'])
+
+        removed = []
+        saved_imgs = self.STORE.get_meta('prof_images', {})
+        for each in sorted(glob.glob(os.path.join(self.FILE_PATHS['prof'], '*'))):
+            img_name = os.path.basename(each)  # ファイル名を取り出す。
+            if os.path.isfile(each) and img_name not in expected:
+                try:
+                    os.remove(each)
+                    self.THUMBNAILER.remove(img_name)
+                    saved_imgs.pop(img_name, None)
+                    removed.append(img_name)
+                except OSError as e:
+                    print(f"Error in \"IO.remove_local_imgs()\": {e}")
+        self.STORE.set_meta('prof_images', saved_imgs)
+
+        return removed
+
+
+    def img_file_name(self, answer, reg_num: int):
+        """
+        登録番号reg_numの回答answerのプロフィール画像を保存するファイル名を返すヘルパー関数
+        プロフィール画像が無い場合はNoneを返す。
+        """
+
+        if self.ANSWERS['prof_image'] not in answer.get('answers', {}):
+            return None
+
+        name = answer['answers'][self.ANSWERS['name']]['textAnswers']['answers'][0]['value']
+        file_format = answer['answers'][self.ANSWERS['prof_image']]['fileUploadAnswers']['answers'][0]['mimeType'].split("/")[1]
+
+        # 【修正箇所 1】 Windows禁止文字を一括置換
+        # \ / : * ? " < > | をすべて _ に置き換える
+        name = re.sub(r'[\\/:*?"<>|]', '_', name)
+
+        return f"{reg_num}_{name}.{file_format}"
+
 
     def convert_timedata(self, input_str: str, method: str):
         """
@@ -873,39 +1530,39 @@ class IO:
         return output_str
     
 
-    def make_body(self, answer, counter: int):
+    def make_body(self, answer, reg_num: int, total_num: int):
         """
         未処理の回答の情報を、datasheetsの各シート用の文字列に変換するメソッド
         一つの未処理の回答answerに対して、datasheetsの各シートそれぞれ用の文字列をバリューとする辞書を返す。
+            reg_num: 回答の登録番号
+            total_num: 回答を処理した後の全回答数（net_infoの行の長さを決める）
+        net_infoが"edges"形式の場合、"net"の値は友人関係の行のリストになる。
         """
 
-        time = answer.get('lastSubmittedTime')
-        name = f"{self.partic_form_meta_info['all_answers_num']+counter}_{answer.get('answers', {}).get(self.ANSWERS['name'], {}).get('textAnswers', {}).get('answers', [{}])[0].get('value')}"
-        prof_img_id = answer.get('answers', {}).get(self.ANSWERS['prof_image'], {}).get('fileUploadAnswers', {}).get('answers', [{}])[0].get('fileId')
-        friends = [x.get('value') for x in answer.get('answers', {}).get(self.ANSWERS['friends'], {}).get('textAnswers', {}).get('answers', [])]
-
-        if "/" in name:  # 入力された名前に / が入っているとpathの設定がうまくいかなくなるので、 | に置き換える。
-            name = name.replace('/', '|')
-        if "\\" in name:  # \ についても同様。
-            name = name.replace('\\', '|')
+        parsed = self.parse_answer(answer, reg_num)
+        time = parsed['timestamp']
+        name = parsed['name']
+        friend_nums = parsed['friends']
 
         # partic_info用のデータを作成
         partic_line = [
             name,
             time,
-            prof_img_id
+            parsed['img_id']
         ]
 
         # net_info用のデータを作成
-        net_line = [name]
-        answers_num = self.partic_form_meta_info["all_answers_num"] + self.partic_form_meta_info["new_answers_num"]
-        for i in range(answers_num + 1):  # 名前との分のオフセット1を施す。
-            net_line.append(0)  # 一旦全ての接続情報を0で埋める。
+        if self.NET_LAYOUT == "matrix":  # 隣接行列の1行
+            net_line = [name]
+            for i in range(total_num + 1):  # 「0_No friends / なし」の分のオフセット1を施す。
+                net_line.append(0)  # 一旦全ての接続情報を0で埋める。
 
-        if friends:
-            friend_nums = [int(x.split("_")[0]) for x in friends]  # 友人の番号をリストにする。
             for num in friend_nums:
-                net_line[num+1] = 1  # 第1要素は名前なので、その分のオフセット1を施す。
+                if num <= total_num:
+                    net_line[num+1] = 1  # 第1要素は名前なので、その分のオフセット1を施す。
+
+        else:  # 友人関係1つにつき1行。「0_No friends / なし」は友人関係としない。
+            net_line = [[reg_num, num, time] for num in friend_nums if 0 < num <= total_num]
 
         result = {
             "partic" : partic_line,
@@ -915,6 +1572,75 @@ class IO:
         return result
 
 
+    def parse_answer(self, answer, reg_num: int):
+        """
+        participants_formの回答answerから、登録番号reg_numの参加者の情報を取り出すヘルパー関数
+        name, timestamp, img_id, img_mime, friends（友人の登録番号のリスト。0は「0_No friends / なし」）をキーとする辞書を返す。
+        """
+
+        name = f"{reg_num}_{answer.get('answers', {}).get(self.ANSWERS['name'], {}).get('textAnswers', {}).get('answers', [{}])[0].get('value')}"
+        prof_img = answer.get('answers', {}).get(self.ANSWERS['prof_image'], {}).get('fileUploadAnswers', {}).get('answers', [{}])[0]
+        friends = []
+        for question_id in self.form_mirror['question_ids']:  # 知り合いの質問を分けている場合は、すべての質問の回答をまとめる。
+            friends += [x.get('value') for x in answer.get('answers', {}).get(question_id, {}).get('textAnswers', {}).get('answers', [])]
+
+        if "/" in name:  # 入力された名前に / が入っているとpathの設定がうまくいかなくなるので、 | に置き換える。
+            name = name.replace('/', '|')
+        if "\\" in name:  # \ についても同様。
+            name = name.replace('\\', '|')
+
+        return {
+            "name": name,
+            "timestamp": answer.get('lastSubmittedTime'),
+            "img_id": prof_img.get('fileId'),
+            "img_mime": prof_img.get('mimeType'),
+            "friends": [int(x.split("_")[0]) for x in friends]  # 友人の番号をリストにする。
+        }
+
+
+    def store_answers(self, answers: list, registered_num: int):
+        """
+        answersの回答を、登録番号registered_num+1から順にローカルのデータベースに保存するヘルパー関数
+        """
+
+        total_num = registered_num + len(answers)
+        participants = []
+        for counter, an_answer in enumerate(answers, start=1):
+            parsed = self.parse_answer(an_answer, registered_num + counter)
+            parsed['response_id'] = an_answer.get('responseId')
+            parsed['reg_num'] = registered_num + counter
+            parsed['answer'] = an_answer
+            parsed['friends'] = [num for num in parsed['friends'] if 0 < num <= total_num]  # 「0_No friends / なし」は友人関係としない。
+            participants.append(parsed)
+
+        try:
+            self.STORE.add_participants(participants)
+        except Exception as e:
+            print(f"Error in \"IO.store_answers()\": {e}")
+
+
+    def store_edited_answers(self, answers: list):
+        """
+        登録済みの回答が編集されたものanswersを、元の登録番号のままローカルのデータベースに保存するヘルパー関数
+        """
+
+        total_num = self.partic_form_meta_info['all_answers_num']
+        participants = []
+        try:
+            reg_nums = self.STORE.get_reg_nums([an_answer.get('responseId') for an_answer in answers])
+            for an_answer in answers:
+                reg_num = reg_nums[an_answer.get('responseId')]
+                parsed = self.parse_answer(an_answer, reg_num)
+                parsed['response_id'] = an_answer.get('responseId')
+                parsed['reg_num'] = reg_num
+                parsed['answer'] = an_answer
+                parsed['friends'] = [num for num in parsed['friends'] if 0 < num <= total_num]  # 「0_No friends / なし」は友人関係としない。
+                participants.append(parsed)
+            self.STORE.add_participants(participants)
+        except Exception as e:
+            print(f"Error in \"IO.store_edited_answers()\": {e}")
+
+
     def col_num_to_letter(self, num):
         """
         整数numをExcel風のアルファベット列名に変換する関数
@@ -933,74 +1659,32 @@ class IO:
         return result
 
 
-    def set_all_answers_as_new(self):
+    def col_letter_to_num(self, letter):
         """
-        participants_formから、すべての回答を読み取り、self.new_answersに格納するヘルパー関数
-        self.partic_form_meta_infoも更新する。
-        もし現在の未処理の回答がある場合、関数の処理の一番最初にそれらを放棄する。
+        Excel風のアルファベット列名letterを整数に変換する関数（col_num_to_letter()の逆変換）
+        例: A->1, Z->26, AA->27, AZ->52, BA->53 ...
         """
 
-        # 現在の未処理の回答を放棄する
-        if self.new_answers:
-            self.new_answers.clear()
-
-        # すべての回答を取得し、self.new_answersに保存する。
-        try:
-            response = self.FORM_SERVICE.forms().responses().list(
-                formId=self.IDS['partic_form'],
-                ).execute()
-            tmp = response.get('responses', [])
+        result = 0
+        for char in letter:
+            result = result * 26 + (ord(char) - 64)  # ord('A') は 65 。'A'を1として桁を積み上げる。
 
-        except Exception as e:
-            print(f"Error while getting all answers in \"IO.set_all_answers_as_new()\": {e}")
-
-        self.new_answers = sorted(tmp, key=lambda x: x.get('lastSubmittedTime'))  # 投稿日時でソート
-
-        # self.partic_form_meta_infoの回答数を更新
-        new_answer_nums = len(self.new_answers)
-        if new_answer_nums > 0:  # 新しい回答がない場合には、self.new_answersは空リストになっている。
-            self.partic_form_meta_info["all_answers_num"] = 0 
-            self.partic_form_meta_info["new_answers_num"] = new_answer_nums
-        else:
-            new_answer_nums = 0
-
-        # self.partic_form_meta_infoのタイムスタンプを更新
-        new_timestamps = [x.get('lastSubmittedTime') for x in self.new_answers]
-        if new_timestamps:  # new_answers が空でない場合のみ更新
-            self.partic_form_meta_info['last_timestamp'] = max(new_timestamps)
-        else:  # new_answers が空である場合には、raw_answersの作成日時をタイムスタンプにする。
-            try:
-                sheet_raw_answer_metadata = self.DRIVE_SERVICE.files().get(
-                        fileId=self.IDS['raw_answers'],
-                        fields='createdTime'
-                        ).execute()  # raw_answerの作成日時情報を得る。
-                self.partic_form_meta_info['last_timestamp'] = sheet_raw_answer_metadata.get('createdTime')
-            except Exception as e:
-                print(f"Error while setting timestamp in \"IO.set_all_answers_as_new()\": {e}")
-            
-        return new_answer_nums
+        return result
 
 
-    def add_column_if_needed(self, sheet_id, sheet_name, num):
+    def add_column_if_needed(self, sheet_id, sheet_name, num, total_num: int = None):
         """
         sheet_nameで指定されるスプレッドシートの列数が足りなくなったら、引数で指定された数だけ列を増やすヘルパー関数
+        total_numには書き込み後の全回答数を指定する。省略した場合はself.partic_form_meta_infoから求める。
+        列数はメタデータのキャッシュから求め、列を増やした場合はキャッシュの列数も更新する。
         """
 
         threshold = 10  # 現在の列数とこれからの列数の差が何以下なら列を追加するかの閾値
 
         # スプレッドシートの現在の列数を取得
-        current_num = 0
+        column_num = 0
         try:
-            # スプレッドシート全体のメタデータを取得（データの中身は取得しないので軽量）
-            spreadsheet_meta = self.SHEET_SERVICE.spreadsheets().get(
-                spreadsheetId=self.IDS[sheet_id],
-                includeGridData=False  # データ自体は不要
-            ).execute()
-
-            for sheet in spreadsheet_meta.get('sheets', []):  # 指定されたシート名を探す
-                props = sheet.get('properties', {})
-                if props.get('title') == sheet_name:
-                    column_num = props['gridProperties']['columnCount']
+            column_num = self.get_sheets_meta(sheet_id).get(sheet_name, {}).get('columnCount', 0)
 
             if column_num == 0:  # 新規作成直後などで未定義の場合はデフォルトの26(A-Z)を返す安全策
                 column_num = 26
@@ -1009,79 +1693,102 @@ class IO:
             print(f"Error in \"IO.add_column_if_needed()\": {e}")
         
         # これから追加される列の数を算出
-        answers_num = self.partic_form_meta_info["all_answers_num"] + self.partic_form_meta_info["new_answers_num"] + 2
+        if total_num is None:
+            total_num = self.partic_form_meta_info["all_answers_num"] + self.partic_form_meta_info["new_answers_num"]
+        answers_num = total_num + 2
 
         # 追加の必要性の有無を判定し、必要なら追加する。
         if 0 <= answers_num - column_num or abs(answers_num - column_num) <= threshold:
             # print("column added")
+            length = max(num, answers_num - column_num + threshold)  # 一度に大量の回答を書き込む場合に備え、足りない分をまとめて追加する。
             try:
                 body = {
                     "requests": [
                         {
                             "appendDimension": {
-                                "sheetId": self.get_sheet_id(sheet_name=sheet_name),
+                                "sheetId": self.get_sheet_id(sheet_name=sheet_name, sheet_id=sheet_id),
                                 "dimension": "COLUMNS", # 列を増やす
-                                "length": num        # 増やす数
+                                "length": length        # 増やす数
                             }
                         }
                     ]
                 }
                 
-                self.SHEET_SERVICE.spreadsheets().batchUpdate(
+                self.execute(self.SHEET_SERVICE.spreadsheets().batchUpdate(
                     spreadsheetId=self.IDS[sheet_id],
                     body=body
-                ).execute()
+                ))
+
+                # キャッシュの列数を更新する。
+                with self.sheets_meta_lock:
+                    if sheet_name in self.sheets_meta.get(sheet_id, {}):
+                        self.sheets_meta[sheet_id][sheet_name]['columnCount'] = column_num + length
             except Exception as e:
+                self.invalidate_sheets_meta(sheet_id)  # 失敗した場合は、キャッシュが古い可能性があるので破棄する。
                 print(f"Error in \"IO.add_column_if_needed()\": {e}")
 
 
-    def writing_keeper(self, order: str):
-        """
-        スプレッドシートへの書き込みがAPIの制限ないに収まる用に管理するヘルパー関数
-        使い方
-            orderが "set" なら、タイマーを起動
-            orderが "check" なら、条件を逸脱していないか確認する。
-        """
-
-        if order == "set":
-            self.timer = time.time()
-        elif order == "check":
-            self.write_count += 1
-            if self.write_count > self.COUNT_THRESHOLD:
-                diff = time.time() - self.timer
-                if diff < self.LIMIT:  # 数え始めから60秒以内なら、書き込みを停止する。
-                    time.sleep(self.LIMIT - diff + 1)  # バッファ用に1秒おまけで待つ。
-                    self.timer = time.time()  # タイマーをリセット
-                    self.write_count = 0  # 書き込み回数
-
-
-    def get_sheet_id(self, sheet_name):
+    def get_sheet_id(self, sheet_name, sheet_id='datasheets'):
         """
         シート名(例: "net_info")から、そのシート固有の整数ID(SheetId)を取得するヘルパー関数
+        メタデータのキャッシュから求める。
         """
         try:
-            spreadsheet = self.SHEET_SERVICE.spreadsheets().get(
-                spreadsheetId=self.IDS['datasheets']
-            ).execute()
-            
-            for sheet in spreadsheet.get('sheets', []):
-                if sheet['properties']['title'] == sheet_name:
-                    return sheet['properties']['sheetId']  # これが整数のID
-            return None
+            return self.get_sheets_meta(sheet_id).get(sheet_name, {}).get('sheetId')  # これが整数のID
         except Exception as e:
             print(f"Error getting sheet ID in \"IO.get_sheet_id\": {e}")
             return None
 
 
+    def get_sheets_meta(self, sheet_id, refresh: bool = False):
+        """
+        IDSのキーsheet_idで指定されるスプレッドシートの、シート名 → {"sheetId", "rowCount", "columnCount"} の辞書を返すヘルパー関数
+        キャッシュが無いか、refresh=Trueの場合のみ、メタデータを取得する（シートのID・名前・大きさのみを取得するので軽量）。
+        取得はロックの外で行い（待ち時間ややり直しで、キャッシュを読む他のスレッドを止めないため）、ロックの中ではキャッシュを差し替えるだけにする。
+        """
+
+        if not refresh:
+            with self.sheets_meta_lock:
+                if sheet_id in self.sheets_meta:
+                    return self.sheets_meta[sheet_id]
+
+        spreadsheet_meta = self.execute(self.SHEET_SERVICE.spreadsheets().get(
+            spreadsheetId=self.IDS[sheet_id],
+            includeGridData=False,  # データ自体は不要
+            fields="sheets.properties(sheetId,title,gridProperties(rowCount,columnCount))"
+        ))
+
+        sheets = {}
+        for sheet in spreadsheet_meta.get('sheets', []):
+            props = sheet.get('properties', {})
+            sheets[props.get('title')] = {
+                "sheetId": props.get('sheetId'),
+                "rowCount": props.get('gridProperties', {}).get('rowCount', 0),
+                "columnCount": props.get('gridProperties', {}).get('columnCount', 0)
+            }
+        with self.sheets_meta_lock:
+            self.sheets_meta[sheet_id] = sheets
+        return sheets
+
+
+    def invalidate_sheets_meta(self, sheet_id=None):
+        """
+        メタデータのキャッシュを破棄するヘルパー関数（sheet_idを省略した場合は、すべてのスプレッドシートのキャッシュを破棄する）
+        """
+
+        with self.sheets_meta_lock:
+            if sheet_id is None:
+                self.sheets_meta.clear()
+            else:
+                self.sheets_meta.pop(sheet_id, None)
+
+
     def change_form_status(self, is_open: bool):
         """
         GASを経由してフォームの受付状態を変更する
         is_open: Trueなら受付開始、Falseなら受付停止
         """
         
-        # Apps Script API サービスの構築
-        service = googleapiclient.discovery.build('script', 'v1', credentials=self.CREDS)
-
         # 実行リクエストの作成
         request = {
             "function": "setFormStatus",  # GAS側の関数名
@@ -1093,7 +1800,7 @@ class IO:
         }
 
         try:
-            response = service.scripts().run(scriptId=self.IDS['app_script'], body=request).execute()
+            response = self.execute(self.SCRIPT_SERVICE.scripts().run(scriptId=self.IDS['app_script'], body=request))
 
         except Exception as e:
             print(f"Error in \"IO.change_form_status\": {e}")
@@ -0,0 +1,111 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+
+"""
+O_noderにおける、グラフのレイアウトを別プロセスで計算するクラスを扱うコード
+"""
+
+__author__ = 'Muto Tao'
+__version__ = '1.0.0'
+__date__ = '2025.12.4'
+
+
+import threading
+import multiprocessing
+import concurrent.futures
+from multiprocessing import shared_memory
+
+from Drawer import run_layout
+
+
+class LayoutWorker:
+    """
+    グラフのレイアウトを、専用の1つのプロセスで計算するクラス
+    igraphのレイアウトの計算はGILを保持したまま長く続くので、同じプロセスで行うと、Flaskの応答（/data）が止まってしまう。
+    プロセスにはエッジのリストを渡し、計算された座標は共有メモリで受け取る。
+    """
+
+    ITEM_SIZE = 8  # 座標1つ（double）のバイト数
+
+    executor: concurrent.futures.ProcessPoolExecutor
+    shm: shared_memory.SharedMemory  # 座標を受け取る共有メモリ（ノード数が増えて足りなくなったら作り直す）
+    lock: threading.Lock  # 共有メモリを使う計算は、1度に1つ
+
+
+    def __init__(self):
+        """
+        コンストラクタ
+        """
+
+        self.executor = None
+        self.shm = None
+        self.lock = threading.Lock()
+
+
+    def layout(self, N: int, edges: list, job: dict):
+        """
+        N個のノードとエッジedgesからなるグラフの3次元のレイアウトを、設定jobに従って別プロセスで計算し、座標のリストと計算の報告の組を返すメソッド
+        計算が終わるまで待つが、待っている間は他のスレッドが動ける。jobの内容は、Drawer.run_layout()と同じ。
+        """
+
+        with self.lock:
+            size = max(N * 3 * self.ITEM_SIZE, self.ITEM_SIZE)
+            if self.shm is None or self.shm.size < size:
+                self.release()
+                self.shm = shared_memory.SharedMemory(create=True, size=size * 2)  # 参加者が少し増えても作り直さずに済むよう、余裕をもたせる。
+            if self.executor is None:  # 共有メモリを管理するプロセスを先に起動しておくため、共有メモリより後に作る。
+                self.executor = concurrent.futures.ProcessPoolExecutor(max_workers=1, mp_context=multiprocessing.get_context("spawn"))  # 他のスレッドが動いているプロセスをforkすると、コピーされたロックで子プロセスが止まることがあるので、spawnで起動する。
+
+            try:
+                report = self.executor.submit(layout_to_shared_memory, self.shm.name, N, edges, job).result()
+            except concurrent.futures.BrokenExecutor:  # プロセスが異常終了した場合は、次回に作り直す。
+                self.executor = None
+                raise
+
+            with self.shm.buf.cast('d') as view:
+                values = view[:N * 3].tolist()
+
+        return [values[k * 3:k * 3 + 3] for k in range(N)], report
+
+
+    def release(self):
+        """
+        共有メモリを解放するヘルパー関数
+        """
+
+        if self.shm is not None:
+            self.shm.close()
+            self.shm.unlink()
+            self.shm = None
+
+
+    def close(self):
+        """
+        プロセスを終了し、共有メモリを解放するメソッド
+        """
+
+        with self.lock:
+            if self.executor is not None:
+                self.executor.shutdown(wait=True)
+                self.executor = None
+            self.release()
+
+
+def layout_to_shared_memory(name: str, N: int, edges: list, job: dict):
+    """
+    Drawer.run_layout()でレイアウトを計算し、座標を名前nameの共有メモリに書き込んで、計算の報告を返す関数
+    別プロセスで実行するため、クラスの外に置く。
+    """
+
+    coords, report = run_layout(N, edges, job)
+    shm = shared_memory.SharedMemory(name=name)
+    try:
+        with shm.buf.cast('d') as view:
+            for k, (x, y, z) in enumerate(coords):
+                view[k * 3] = x
+                view[k * 3 + 1] = y
+                view[k * 3 + 2] = z
+    finally:
+        shm.close()
+
+    return report
@@ -0,0 +1,119 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+
+"""
+O_noderにおける、APIの呼び出しのレートを制限するクラスを扱うコード
+"""
+
+__author__ = 'Muto Tao'
+__version__ = '1.0.0'
+__date__ = '2025.12.4'
+
+
+import time
+import threading
+
+
+class Limiter:
+    """
+    トークンバケット方式で、APIの呼び出しのレートを制限するクラス
+    バケットごとに、容量（連続して呼び出せる回数）と、1秒あたりに補充されるトークンの数を設定する。複数のスレッドから使える。
+    """
+
+    BUCKETS: dict  # バケット名 → (容量, 1秒あたりの補充数)
+
+    tokens: dict  # バケット名 → 現在のトークンの数
+    updated: dict  # バケット名 → 最後にトークンを補充した時刻
+    stats: dict  # バケット名 → {"acquired": 消費したトークンの数, "rejected": try_acquire()で断った回数, "waits": 待った回数, "waited": 待った時間の合計[秒]}
+    lock: threading.Lock
+
+
+    def __init__(self, BUCKETS):
+        """
+        コンストラクタ
+        各バケットは、満杯の状態から始まる。
+        """
+
+        self.BUCKETS = BUCKETS
+        self.lock = threading.Lock()
+        now = time.monotonic()
+        self.tokens = {name: float(capacity) for name, (capacity, rate) in BUCKETS.items()}
+        self.updated = {name: now for name in BUCKETS}
+        self.stats = {name: {"acquired": 0, "rejected": 0, "waits": 0, "waited": 0.0} for name in BUCKETS}
+
+
+    def refill(self, name: str):
+        """
+        バケットnameに、前回の補充からの経過時間分のトークンを補充するヘルパー関数（ロックを取得してから呼ぶ）
+        """
+
+        now = time.monotonic()
+        capacity, rate = self.BUCKETS[name]
+        self.tokens[name] = min(capacity, self.tokens[name] + (now - self.updated[name]) * rate)
+        self.updated[name] = now
+
+
+    def try_acquire(self, name: str, tokens: int = 1, reserve: int = 0):
+        """
+        バケットnameからtokens個のトークンを取得できればTrue、できなければ待たずにFalseを返すメソッド
+        reserveを指定すると、取得した後にreserve個以上のトークンが残る場合のみ取得する（優先度の高い処理のために残しておく）。
+        """
+
+        reserve = min(reserve, self.BUCKETS[name][0] - tokens)
+        with self.lock:
+            self.refill(name)
+            if self.tokens[name] >= tokens + reserve:
+                self.tokens[name] -= tokens
+                self.stats[name]['acquired'] += tokens
+                return True
+            self.stats[name]['rejected'] += 1
+            return False
+
+
+    def acquire(self, name: str, tokens: int = 1, reserve: int = 0):
+        """
+        バケットnameからtokens個のトークンを取得するメソッド
+        足りない場合は、補充されるまで待つ。待った時間[秒]を返す。
+        reserveを指定すると、取得した後にreserve個以上のトークンが残るようになるまで待つ（優先度の低い処理は、余ったトークンだけを使う）。
+        """
+
+        reserve = min(reserve, self.BUCKETS[name][0] - tokens)  # 容量より多くは残せない。
+        waited = 0.0
+        while True:
+            with self.lock:
+                self.refill(name)
+                if self.tokens[name] >= tokens + reserve:
+                    self.tokens[name] -= tokens
+                    self.stats[name]['acquired'] += tokens
+                    if waited:
+                        self.stats[name]['waits'] += 1
+                        self.stats[name]['waited'] += waited
+                    return waited
+                wait = (tokens + reserve - self.tokens[name]) / self.BUCKETS[name][1]
+
+            time.sleep(wait)  # 待つ間はロックを手放し、他のバケットを使うスレッドを止めない。
+            waited += wait
+
+
+    def wait_time(self, name: str, tokens: int = 1, reserve: int = 0):
+        """
+        バケットnameからtokens個のトークンを（reserve個を残して）取得できるようになるまでの時間[秒]を返すメソッド（今すぐ取得できる場合は0）
+        """
+
+        reserve = min(reserve, self.BUCKETS[name][0] - tokens)
+        with self.lock:
+            self.refill(name)
+            return max(0.0, (tokens + reserve - self.tokens[name]) / self.BUCKETS[name][1])
+
+
+    def get_stats(self):
+        """
+        バケットごとの統計と、現在のトークンの数を返すメソッド
+        """
+
+        with self.lock:
+            result = {}
+            for name in self.BUCKETS:
+                self.refill(name)
+                result[name] = dict(self.stats[name], tokens=round(self.tokens[name], 2), waited=round(self.stats[name]['waited'], 3))
+            return result
@@ -0,0 +1,183 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+
+"""
+O_noderにおける、稼働状況の指標を集計するクラスを扱うコード
+"""
+
+__author__ = 'Muto Tao'
+__version__ = '1.0.0'
+__date__ = '2025.12.4'
+
+
+import math
+import threading
+
+
+class Metrics:
+    """
+    カウンタ、ゲージ、ヒストグラムの指標を集計し、Prometheusのテキスト形式で出力するクラス
+    指標は、名前とラベルの組ごとに値を持つ。複数のスレッドから使える。
+    """
+
+    BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0, 30.0, 60.0, 120.0)  # ヒストグラムの既定の区切り[秒]
+
+    kinds: dict  # 指標名 → (種類 "counter" / "gauge" / "histogram", 説明, ヒストグラムの区切り)
+    values: dict  # 指標名 → ラベルの組 → 値（ヒストグラムは {"buckets": 区切りごとの数, "sum", "count"}）
+    callbacks: dict  # 指標名 → 出力するときに呼ばれ、{ラベルの組: 値}を返す関数
+    lock: threading.Lock
+
+
+    def __init__(self):
+        """
+        コンストラクタ
+        """
+
+        self.kinds = {}
+        self.values = {}
+        self.callbacks = {}
+        self.lock = threading.Lock()
+
+
+    def describe(self, name: str, kind: str, help_text: str, buckets: tuple = None):
+        """
+        指標nameの種類と説明を登録するメソッド（登録しなくても使えるが、出力に説明が付かない）
+        """
+
+        with self.lock:
+            self.kinds[name] = (kind, help_text, tuple(buckets or self.BUCKETS))
+            self.values.setdefault(name, {})
+
+
+    def inc(self, name: str, value: float = 1, **labels):
+        """
+        カウンタnameを、value増やすメソッド
+        """
+
+        key = label_key(labels)
+        with self.lock:
+            a_metric = self.metric(name, "counter")
+            a_metric[key] = a_metric.get(key, 0) + value
+
+
+    def set(self, name: str, value: float, **labels):
+        """
+        ゲージnameを、valueにするメソッド
+        """
+
+        key = label_key(labels)
+        with self.lock:
+            self.metric(name, "gauge")[key] = value
+
+
+    def observe(self, name: str, value: float, **labels):
+        """
+        ヒストグラムnameに、値valueを記録するメソッド
+        """
+
+        key = label_key(labels)
+        with self.lock:
+            a_metric = self.metric(name, "histogram")
+            buckets = self.kinds[name][2]
+            if key not in a_metric:
+                a_metric[key] = {"buckets": [0] * len(buckets), "sum": 0.0, "count": 0}
+            a_histogram = a_metric[key]
+            for i, bound in enumerate(buckets):
+                if value <= bound:
+                    a_histogram['buckets'][i] += 1
+            a_histogram['sum'] += value
+            a_histogram['count'] += 1
+
+
+    def gauge_function(self, name: str, function, help_text: str = "", kind: str = "gauge"):
+        """
+        出力するたびにfunction()を呼び、その値をゲージ（またはkindで指定した種類の指標）nameとして出力するよう登録するメソッド
+        function()は、数値か、{ラベルの辞書をタプルにしたもの: 値}を返す。
+        """
+
+        with self.lock:
+            self.kinds[name] = (kind, help_text, self.BUCKETS)
+            self.callbacks[name] = function
+
+
+    def metric(self, name: str, kind: str):
+        """
+        指標nameの値の辞書を返すヘルパー関数（無ければ、種類kindとして登録する。ロックを取得してから呼ぶ）
+        """
+
+        if name not in self.kinds:
+            self.kinds[name] = (kind, "", self.BUCKETS)
+        return self.values.setdefault(name, {})
+
+
+    def render(self):
+        """
+        すべての指標を、Prometheusのテキスト形式（text/plain; version=0.0.4）の文字列として返すメソッド
+        """
+
+        with self.lock:
+            kinds = dict(self.kinds)
+            values = {name: {key: (dict(value, buckets=list(value['buckets'])) if isinstance(value, dict) else value) for key, value in a_metric.items()} for name, a_metric in self.values.items()}
+            callbacks = dict(self.callbacks)
+
+        # 登録された関数は、ロックの外で呼ぶ（関数の中で他のロックを取得することがあるため）。
+        for name, function in callbacks.items():
+            try:
+                result = function()
+            except Exception as e:
+                print(f"Error while collecting \"{name}\" in \"Metrics.render()\": {e}")
+                continue
+            values[name] = result if isinstance(result, dict) else {(): result}
+
+        lines = []
+        for name in sorted(values):
+            kind, help_text, buckets = kinds[name]
+            if help_text:
+                lines.append(f"# HELP {name} {help_text}")
+            lines.append(f"# TYPE {name} {kind}")
+            for key, value in sorted(values[name].items()):
+                if kind == "histogram":
+                    for bound, count in zip(buckets, value['buckets']):
+                        lines.append(f"{name}_bucket{format_labels(key + (('le', format_value(bound)),))} {count}")
+                    lines.append(f"{name}_bucket{format_labels(key + (('le', '+Inf'),))} {value['count']}")
+                    lines.append(f"{name}_sum{format_labels(key)} {format_value(value['sum'])}")
+                    lines.append(f"{name}_count{format_labels(key)} {value['count']}")
+                else:
+                    lines.append(f"{name}{format_labels(key)} {format_value(value)}")
+
+        return "\n".join(lines) + "\n"
+
+
+def label_key(labels: dict):
+    """
+    ラベルの辞書を、指標の値の辞書のキーにするタプルに変換する関数
+    """
+
+    return tuple(sorted((key, str(value)) for key, value in labels.items()))
+
+
+def format_labels(key: tuple):
+    """
+    ラベルのタプルを、{name="value",...}の形式の文字列に変換する関数
+    """
+
+    if not key:
+        return ""
+    escaped = [(name, value.replace("\\", "\\\\").replace("\"", "\\\"").replace("\n", "\\n")) for name, value in key]
+    return "{" + ",".join(f"{name}=\"{value}\"" for name, value in escaped) + "}"
+
+
+def format_value(value: float):
+    """
+    数値を、Prometheusのテキスト形式の値の文字列に変換する関数
+    """
+
+    if value is None or (isinstance(value, float) and math.isnan(value)):
+        return "NaN"
+    if isinstance(value, float) and math.isinf(value):
+        return "+Inf" if value > 0 else "-Inf"
+    if isinstance(value, bool):
+        return "1" if value else "0"
+    if isinstance(value, int) or float(value).is_integer():
+        return str(int(value))
+    return repr(float(value))
@@ -0,0 +1,171 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+
+"""
+O_noderにおける、優先度つきで処理を別スレッドで実行するクラスを扱うコード
+"""
+
+__author__ = 'Muto Tao'
+__version__ = '1.0.0'
+__date__ = '2025.12.4'
+
+
+import time
+import queue
+import threading
+import contextlib
+
+
+class Scheduler:
+    """
+    予約された処理を、優先度ごとのレーンのスレッドで非同期に実行するクラス
+    レーンごとに1つのスレッドがあり、同じレーンの処理は予約された順に1つずつ実行される。優先度の低いレーンの処理が詰まっていても、高いレーンの処理は待たされない。
+    処理の種類（ラベル）ごとに、予約されてから完了するまでの時間を記録する。
+    """
+
+    LANES: dict  # レーン名 → 優先度（小さいほど優先）
+
+    lanes: dict  # レーン名 → 処理のキュー
+    local: threading.local  # 実行中の処理のレーン名を、スレッドごとに保存する。
+    stats: dict  # ラベル → {"lane", "submitted", "done", "failed", "latency_sum", "latency_max", "latency_last"}
+    lock: threading.Lock
+
+
+    def __init__(self, LANES):
+        """
+        コンストラクタ
+        レーンごとに、処理を実行するスレッドを開始する。
+        """
+
+        self.LANES = LANES
+        self.lanes = {name: queue.Queue() for name in LANES}
+        self.local = threading.local()
+        self.stats = {}
+        self.lock = threading.Lock()
+
+        for name in LANES:
+            threading.Thread(target=self.loop, args=(name,), daemon=True).start()
+
+
+    def submit(self, lane: str, job, *args, label: str = None, submitted: float = None):
+        """
+        処理jobを、レーンlaneのスレッドで非同期に実行するよう予約するメソッド
+            label: 遅延を記録するときの処理の種類。省略した場合はレーン名。
+            submitted: 遅延を測り始める時刻（time.monotonic()）。省略した場合は予約した時刻。
+        """
+
+        label = label or lane
+        with self.lock:
+            self.stat(label, lane)['submitted'] += 1
+        self.lanes[lane].put((job, args, label, submitted or time.monotonic()))
+
+
+    def loop(self, lane: str):
+        """
+        レーンlaneのスレッドで、予約された処理を順に実行し続ける関数
+        """
+
+        self.local.lane = lane
+        a_queue = self.lanes[lane]
+        while True:
+            job, args, label, submitted = a_queue.get()
+            try:
+                job(*args)
+                self.record(label, submitted, lane)
+            except Exception as e:
+                self.record(label, submitted, lane, failed=True)
+                print(f"Error while running \"{label}\" in \"Scheduler.loop()\": {e}")
+            finally:
+                a_queue.task_done()
+
+
+    def record(self, label: str, submitted: float, lane: str = None, failed: bool = False):
+        """
+        ラベルlabelの処理が完了したことを、時刻submittedからの遅延とともに記録するメソッド
+        レーンの外で実行した処理（グラフの更新など）の遅延も、これで記録できる。
+        """
+
+        latency = time.monotonic() - submitted
+        with self.lock:
+            if lane is None:  # レーンの外で実行した処理は、完了したときに予約されたものとして数える。
+                a_stat = self.stat(label, self.current())
+                a_stat['submitted'] += 1
+            else:
+                a_stat = self.stat(label, lane)
+            if failed:
+                a_stat['failed'] += 1
+                return
+            a_stat['done'] += 1
+            a_stat['latency_sum'] += latency
+            a_stat['latency_max'] = max(a_stat['latency_max'], latency)
+            a_stat['latency_last'] = latency
+
+
+    def stat(self, label: str, lane: str):
+        """
+        ラベルlabelの統計を返すヘルパー関数（無ければ作る。ロックを取得してから呼ぶ）
+        """
+
+        if label not in self.stats:
+            self.stats[label] = {"lane": lane, "submitted": 0, "done": 0, "failed": 0, "latency_sum": 0.0, "latency_max": 0.0, "latency_last": 0.0}
+        return self.stats[label]
+
+
+    def current(self):
+        """
+        呼び出したスレッドで実行中の処理のレーン名を返すメソッド（レーンの外ならNone）
+        """
+
+        return getattr(self.local, 'lane', None)
+
+
+    def priority(self):
+        """
+        呼び出したスレッドで実行中の処理の優先度を返すメソッド（レーンの外なら最優先の0）
+        """
+
+        return self.LANES.get(self.current(), 0)
+
+
+    @contextlib.contextmanager
+    def running(self, lane: str):
+        """
+        レーンの外のスレッドで行う処理を、レーンlaneの優先度で行うためのコンテキストマネージャ
+        """
+
+        previous = self.current()
+        self.local.lane = lane
+        try:
+            yield
+        finally:
+            self.local.lane = previous
+
+
+    def join(self, lane: str = None):
+        """
+        レーンlane（省略した場合はすべてのレーン）に予約された処理が、すべて終わるまで待つメソッド
+        """
+
+        for name in ([lane] if lane else sorted(self.LANES, key=self.LANES.get)):
+            self.lanes[name].join()
+
+
+    def get_stats(self):
+        """
+        ラベルごとの、予約・完了・失敗の数と、予約から完了までの平均・最大・直近の遅延[秒]、レーンごとの待ち行列の長さを返すメソッド
+        """
+
+        with self.lock:
+            result = {}
+            for label, a_stat in self.stats.items():
+                result[label] = {
+                    "lane": a_stat['lane'],
+                    "submitted": a_stat['submitted'],
+                    "done": a_stat['done'],
+                    "failed": a_stat['failed'],
+                    "latency_avg": round(a_stat['latency_sum'] / a_stat['done'], 3) if a_stat['done'] else None,
+                    "latency_max": round(a_stat['latency_max'], 3),
+                    "latency_last": round(a_stat['latency_last'], 3)
+                }
+        result['pending'] = {name: a_queue.unfinished_tasks for name, a_queue in self.lanes.items()}
+        return result
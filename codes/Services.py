@@ -0,0 +1,58 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+
+"""
+O_noderにおける、GoogleのAPIサービスを構築するクラスを扱うコード
+"""
+
+__author__ = 'Muto Tao'
+__version__ = '1.0.0'
+__date__ = '2025.12.4'
+
+
+import os
+import json
+import threading
+import googleapiclient.discovery
+
+
+class Services:
+    """
+    GoogleのAPIサービスを、同梱したディスカバリ文書から1度だけ構築し、プロセスが終了するまで使い回すクラス
+    ディスカバリ文書はDISCOVERY_DIRに「{サービス名}.{バージョン}.json」として置く。更新する場合は、
+    https://{サービス名}.googleapis.com/$discovery/rest?version={バージョン} から取得し直したものに置き換える。
+    """
+
+    DISCOVERY_DIR = os.path.join(os.path.dirname(os.path.abspath(__file__)), "discovery")
+
+    services = {}  # (サービス名, バージョン) → 構築済みのサービス
+    lock = threading.Lock()
+
+
+    @classmethod
+    def get(cls, name: str, version: str, credentials):
+        """
+        サービス名name、バージョンversionのAPIサービスを返すメソッド
+        初回は、DISCOVERY_DIRのディスカバリ文書から構築する。文書が無い場合は、googleapiclientに同梱の文書から構築する（どちらも通信しない）。
+        """
+
+        with cls.lock:
+            key = (name, version)
+            if key not in cls.services:
+                path = os.path.join(cls.DISCOVERY_DIR, f"{name}.{version}.json")
+                if os.path.isfile(path):
+                    with open(path, 'r', encoding='utf-8') as f:
+                        cls.services[key] = googleapiclient.discovery.build_from_document(json.load(f), credentials=credentials)
+                else:
+                    cls.services[key] = googleapiclient.discovery.build(name, version, credentials=credentials, static_discovery=True)
+            return cls.services[key]
+
+
+    @classmethod
+    def clear(cls):
+        """
+        構築済みのサービスをすべて破棄するメソッド（認証情報を更新した場合などに用いる）
+        """
+
+        with cls.lock:
+            cls.services.clear()
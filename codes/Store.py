@@ -0,0 +1,195 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+
+"""
+O_noderにおける、回答とネットワーク情報をローカルに保存するクラスを扱うコード
+"""
+
+__author__ = 'Muto Tao'
+__version__ = '1.0.0'
+__date__ = '2025.12.4'
+
+
+import os
+import json
+import sqlite3
+import threading
+
+
+class Store:
+    """
+    participants_formの回答と友人関係を保存する、ローカルのSQLiteデータベースを司るクラス
+    Googleのスプレッドシートの代わりに、読み込みはこのクラスから行う。
+    """
+
+    PATH: str
+
+    connection: sqlite3.Connection
+    lock: threading.Lock  # 複数のスレッドから使うため、操作ごとにロックをかける。
+
+    SCHEMA = """
+        CREATE TABLE IF NOT EXISTS participants (
+            response_id TEXT PRIMARY KEY,  -- participants_formの回答ID
+            reg_num INTEGER NOT NULL UNIQUE,  -- 登録番号
+            name TEXT NOT NULL,  -- 登録番号付きの名前（例: 1_Alice）
+            timestamp TEXT NOT NULL,  -- フォームの日時データ形式
+            img_id TEXT,  -- プロフィール画像のGoogleドライブ上のファイルID
+            img_mime TEXT,  -- プロフィール画像のMIMEタイプ
+            answer TEXT NOT NULL  -- 回答そのもの（JSON）
+        );
+        CREATE INDEX IF NOT EXISTS idx_participants_timestamp ON participants (timestamp);
+        DROP INDEX IF EXISTS idx_participants_reg_num;  -- reg_numのUNIQUE制約が作る索引と重複していたもの（既存のデータベースから消す）
+
+        CREATE TABLE IF NOT EXISTS edges (
+            source INTEGER NOT NULL,  -- 回答した人の登録番号
+            target INTEGER NOT NULL,  -- 友人の登録番号
+            timestamp TEXT,
+            PRIMARY KEY (source, target)
+        );
+        CREATE INDEX IF NOT EXISTS idx_edges_target ON edges (target);
+
+        CREATE TABLE IF NOT EXISTS meta (
+            key TEXT PRIMARY KEY,
+            value TEXT  -- JSON
+        );
+    """
+
+
+    def __init__(self, PATH):
+        """
+        コンストラクタ
+        PATHにデータベースファイルが無ければ作成する。
+        """
+
+        self.PATH = PATH
+        if os.path.dirname(PATH):
+            os.makedirs(os.path.dirname(PATH), exist_ok=True)
+
+        self.lock = threading.Lock()
+        self.connection = sqlite3.connect(PATH, check_same_thread=False)
+        self.connection.row_factory = sqlite3.Row
+        with self.lock, self.connection:
+            self.connection.executescript(self.SCHEMA)
+
+
+    def add_participants(self, participants: list):
+        """
+        参加者と、その友人関係を保存するメソッド
+        participantsの各要素は、response_id, reg_num, name, timestamp, img_id, img_mime, answer, friends（友人の登録番号のリスト）をキーとする辞書。
+        同じ回答IDの参加者が既にある場合は、同じ登録番号のときのみ上書きする（編集された回答）。
+        回答IDと登録番号の組が既存の行と食い違う場合は、別の参加者の行を消してしまわないよう、ValueErrorを投げて何も保存しない。
+        """
+
+        with self.lock, self.connection:
+            for a_partic in participants:
+                conflict = self.connection.execute(
+                    "SELECT response_id, reg_num FROM participants WHERE (response_id = ? AND reg_num != ?) OR (reg_num = ? AND response_id != ?)",
+                    (a_partic['response_id'], a_partic['reg_num'], a_partic['reg_num'], a_partic['response_id'])
+                ).fetchone()
+                if conflict is not None:  # INSERT OR REPLACEは、UNIQUE制約に反する行を黙って消すので、先に確かめる。
+                    raise ValueError(f"response {a_partic['response_id']} (reg_num {a_partic['reg_num']}) conflicts with the stored response {conflict['response_id']} (reg_num {conflict['reg_num']}).")
+                self.connection.execute(
+                    "INSERT OR REPLACE INTO participants (response_id, reg_num, name, timestamp, img_id, img_mime, answer) VALUES (?, ?, ?, ?, ?, ?, ?)",
+                    (a_partic['response_id'], a_partic['reg_num'], a_partic['name'], a_partic['timestamp'], a_partic['img_id'], a_partic['img_mime'], json.dumps(a_partic['answer'], ensure_ascii=False))
+                )
+                self.connection.execute("DELETE FROM edges WHERE source = ?", (a_partic['reg_num'],))
+                self.connection.executemany(
+                    "INSERT OR REPLACE INTO edges (source, target, timestamp) VALUES (?, ?, ?)",
+                    [(a_partic['reg_num'], target, a_partic['timestamp']) for target in a_partic['friends']]
+                )
+
+
+    def get_answers(self):
+        """
+        保存されているすべての回答を、登録番号順のリストとして返すメソッド
+        """
+
+        with self.lock:
+            rows = self.connection.execute("SELECT answer FROM participants ORDER BY reg_num").fetchall()
+        return [json.loads(a_row['answer']) for a_row in rows]
+
+
+    def get_reg_nums(self, response_ids: list):
+        """
+        回答IDのリストのうち保存されているものについて、回答ID → 登録番号 の辞書を返すメソッド
+        """
+
+        with self.lock:
+            rows = self.connection.execute(
+                f"SELECT response_id, reg_num FROM participants WHERE response_id IN ({', '.join('?' * len(response_ids))})",
+                list(response_ids)
+            ).fetchall() if response_ids else []
+        return {a_row['response_id']: a_row['reg_num'] for a_row in rows}
+
+
+    def get_participants(self, after_reg_num: int = 0):
+        """
+        登録番号がafter_reg_numより大きい参加者を、登録番号順の辞書のリストとして返すメソッド
+        """
+
+        with self.lock:
+            rows = self.connection.execute(
+                "SELECT reg_num, name, timestamp, img_id, img_mime FROM participants WHERE reg_num > ? ORDER BY reg_num",
+                (after_reg_num,)
+            ).fetchall()
+        return [dict(a_row) for a_row in rows]
+
+
+    def get_edges(self, after_reg_num: int = 0):
+        """
+        sourceとtargetのどちらかの登録番号がafter_reg_numより大きい友人関係を、(source, target, timestamp)のリストとして返すメソッド
+        """
+
+        with self.lock:
+            rows = self.connection.execute(
+                "SELECT source, target, timestamp FROM edges WHERE source > ? OR target > ? ORDER BY source, target",
+                (after_reg_num, after_reg_num)
+            ).fetchall()
+        return [(a_row['source'], a_row['target'], a_row['timestamp']) for a_row in rows]
+
+
+    def count_participants(self):
+        """
+        保存されている参加者の数を返すメソッド
+        """
+
+        with self.lock:
+            return self.connection.execute("SELECT COUNT(*) FROM participants").fetchone()[0]
+
+
+    def count_edges(self):
+        """
+        保存されている友人関係の数を返すメソッド
+        """
+
+        with self.lock:
+            return self.connection.execute("SELECT COUNT(*) FROM edges").fetchone()[0]
+
+
+    def get_meta(self, key: str, default=None):
+        """
+        keyに対応するメタ情報を返すメソッド
+        """
+
+        with self.lock:
+            a_row = self.connection.execute("SELECT value FROM meta WHERE key = ?", (key,)).fetchone()
+        return json.loads(a_row['value']) if a_row else default
+
+
+    def set_meta(self, key: str, value):
+        """
+        keyに対応するメタ情報を保存するメソッド
+        """
+
+        with self.lock, self.connection:
+            self.connection.execute("INSERT OR REPLACE INTO meta (key, value) VALUES (?, ?)", (key, json.dumps(value, ensure_ascii=False)))
+
+
+    def clear(self):
+        """
+        保存されている参加者と友人関係をすべて消去するメソッド
+        """
+
+        with self.lock, self.connection:
+            self.connection.execute("DELETE FROM participants")
+            self.connection.execute("DELETE FROM edges")
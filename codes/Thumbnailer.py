@@ -0,0 +1,141 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+
+"""
+O_noderにおける、プロフィール画像の縮小版を作るクラスを扱うコード
+"""
+
+__author__ = 'Muto Tao'
+__version__ = '1.0.0'
+__date__ = '2025.12.4'
+
+
+import os
+import glob
+import multiprocessing
+import concurrent.futures
+
+try:  # Pillowが無い環境では縮小版を作らず、元の画像をそのまま使う。
+    from PIL import Image, ImageDraw, ImageOps, features
+except ImportError:
+    Image = None
+
+try:  # pillow-heifがあれば、HEIC形式の画像も読み込めるようにする。
+    import pillow_heif
+    pillow_heif.register_heif_opener()
+except ImportError:
+    pass
+
+
+class Thumbnailer:
+    """
+    プロフィール画像から、円形に切り抜いた一定の大きさの縮小版を作り、元の画像と同じディレクトリのTHUMB_DIRに保存するクラス
+    画像の読み込みと縮小は重いので、別プロセスで行う。
+    """
+
+    THUMB_DIR = "thumbs"  # 縮小版を保存する、プロフィール画像のディレクトリ内のディレクトリ名
+    THUMB_SIZE = 128  # 縮小版の一辺の長さ[px]
+    WORKERS = 2  # 縮小版を作るプロセスの数
+
+    PROF_PATH: str
+    THUMB_PATH: str
+    FORMAT: str  # 縮小版の形式（WebPを使えない環境ではPNG）
+    executor: concurrent.futures.ProcessPoolExecutor
+
+
+    def __init__(self, PROF_PATH):
+        """
+        コンストラクタ
+        """
+
+        self.PROF_PATH = PROF_PATH
+        self.THUMB_PATH = os.path.join(PROF_PATH, self.THUMB_DIR)
+        self.executor = None
+
+        if Image is None:
+            self.FORMAT = None
+            print("Warning in \"Thumbnailer.__init__()\": Pillow is not installed. Profile images are used without thumbnails.")
+            return
+
+        self.FORMAT = "webp" if features.check('webp') else "png"
+        os.makedirs(self.THUMB_PATH, exist_ok=True)
+
+
+    def make(self, img_names: list):
+        """
+        img_namesのプロフィール画像のうち、縮小版が無いか、元の画像より古いものについて、縮小版を作るメソッド
+        作成は別プロセスで行い、完了を待たずに戻る。
+        """
+
+        if self.FORMAT is None:
+            return
+
+        for img_name in img_names:
+            src = os.path.join(self.PROF_PATH, img_name)
+            dst = self.thumb_path(img_name)
+            if not os.path.isfile(src):
+                continue
+            if os.path.isfile(dst) and os.path.getmtime(dst) >= os.path.getmtime(src):
+                continue
+
+            if self.executor is None:
+                self.executor = concurrent.futures.ProcessPoolExecutor(max_workers=self.WORKERS, mp_context=multiprocessing.get_context("spawn"))  # 他のスレッドが動いているプロセスをforkすると、コピーされたロックで子プロセスが止まることがあるので、spawnで起動する。
+            future = self.executor.submit(make_thumbnail, src, dst, self.THUMB_SIZE)
+            future.add_done_callback(lambda a_future, img_name=img_name: self.report_error(a_future, img_name))
+
+
+    def report_error(self, future, img_name: str):
+        """
+        縮小版の作成が失敗した場合に、エラーを表示するヘルパー関数
+        """
+
+        if future.exception() is not None:
+            print(f"Error while making a thumbnail of \"{img_name}\" in \"Thumbnailer.make()\": {future.exception()}")
+
+
+    def remove(self, img_name: str):
+        """
+        プロフィール画像img_nameの縮小版を削除するメソッド
+        """
+
+        for each in glob.glob(os.path.join(self.THUMB_PATH, f"{glob.escape(os.path.splitext(img_name)[0])}.*")):
+            os.remove(each)
+
+
+    def thumb_path(self, img_name: str):
+        """
+        プロフィール画像img_nameの縮小版のpathを返すヘルパー関数
+        """
+
+        return os.path.join(self.THUMB_PATH, f"{os.path.splitext(img_name)[0]}.{self.FORMAT}")
+
+
+    def wait(self):
+        """
+        作成中の縮小版がすべて完成するまで待つメソッド
+        """
+
+        if self.executor is not None:
+            self.executor.shutdown(wait=True)
+            self.executor = None
+
+
+def make_thumbnail(src: str, dst: str, size: int):
+    """
+    srcの画像を、中央で正方形に切り抜いてsize×sizeに縮小し、円の外側を透明にしてdstに保存する関数
+    別プロセスで実行するため、クラスの外に置く。
+    """
+
+    with Image.open(src) as img:
+        img.draft("RGB", (size * 2, size * 2))  # JPEGは、読み込む段階で縮小しておく。
+        img = ImageOps.exif_transpose(img)  # スマートフォンの写真の向きを直す。
+        img = ImageOps.fit(img.convert("RGB"), (size, size), Image.LANCZOS)
+
+    # 円形に切り抜く（縁を滑らかにするため、4倍の大きさのマスクを縮小して使う）
+    mask = Image.new("L", (size * 4, size * 4), 0)
+    ImageDraw.Draw(mask).ellipse((0, 0, size * 4 - 1, size * 4 - 1), fill=255)
+    img.putalpha(mask.resize((size, size), Image.LANCZOS))
+
+    tmp = os.path.join(os.path.dirname(dst), f".{os.path.basename(dst)}.part")  # 書き込み中のファイルが、縮小版として拾われないようにする。
+    img.save(tmp, format=os.path.splitext(dst)[1][1:].upper())
+    os.replace(tmp, dst)
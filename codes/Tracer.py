@@ -0,0 +1,228 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+
+"""
+O_noderにおける、更新のサイクルごとの処理の時系列を記録するクラスを扱うコード
+"""
+
+__author__ = 'Muto Tao'
+__version__ = '1.0.0'
+__date__ = '2025.12.4'
+
+
+import time
+import threading
+import itertools
+import functools
+import contextlib
+import collections
+from datetime import datetime, timezone
+
+
+class Tracer:
+    """
+    更新のサイクル（新しい回答の取得からグラフの再構築まで）ごとに、各処理とAPIの呼び出しの開始時刻と所要時間（スパン）を記録するクラス
+    直近のCAPACITY個のサイクルをメモリ上に保持し、JSONや、Chromeのトレース形式（chrome://tracing や Perfetto で開ける）で出力する。
+    スパンは、呼び出したスレッドで実行中のサイクルに記録する。別スレッドで行う処理は、bind()で包むと、予約したときのサイクルに記録される。
+    """
+
+    CAPACITY = 300  # 保持するサイクルの数
+
+    cycles: collections.deque  # 直近のサイクルの記録
+    local: threading.local  # スレッドごとの、実行中のサイクルとスパンの入れ子
+    ids: itertools.count
+    epoch: float  # 時刻の基準（time.perf_counter()）
+    wall_epoch: float  # epochに対応する時刻（time.time()）
+    lock: threading.Lock
+
+
+    def __init__(self):
+        """
+        コンストラクタ
+        """
+
+        self.cycles = collections.deque(maxlen=self.CAPACITY)
+        self.local = threading.local()
+        self.ids = itertools.count(1)
+        self.epoch = time.perf_counter()
+        self.wall_epoch = time.time()
+        self.lock = threading.Lock()
+
+
+    def now(self):
+        """
+        epochからの経過時間[秒]を返すヘルパー関数
+        """
+
+        return time.perf_counter() - self.epoch
+
+
+    @contextlib.contextmanager
+    def cycle(self, kind: str, **tags):
+        """
+        種類kind（"update"、"bootstrap"、"reconcile"など）のサイクルを開始し、その記録（辞書）を渡すコンテキストマネージャ
+        サイクルは開始した時点で保持され、実行中でも出力される。記録の"tags"には、処理した回答数などを後から追加できる。
+        """
+
+        a_cycle = {
+            "id": next(self.ids),
+            "kind": kind,
+            "start": datetime.fromtimestamp(time.time(), timezone.utc).isoformat(timespec='milliseconds'),
+            "ts": self.now(),
+            "duration": None,
+            "thread": threading.current_thread().name,
+            "tid": threading.get_ident(),
+            "tags": dict(tags),
+            "spans": []
+        }
+        with self.lock:
+            self.cycles.append(a_cycle)
+
+        previous = self.swap(a_cycle, [])
+        try:
+            yield a_cycle
+        except Exception as e:
+            a_cycle['tags']['error'] = repr(e)
+            raise
+        finally:
+            a_cycle['duration'] = self.now() - a_cycle['ts']
+            self.swap(*previous)
+
+
+    def discard(self, a_cycle: dict):
+        """
+        記録する必要のなかったサイクル（新しい回答が無かった場合など）を、保持しているサイクルから取り除くメソッド
+        """
+
+        with self.lock:
+            if a_cycle in self.cycles:
+                self.cycles.remove(a_cycle)
+
+
+    @contextlib.contextmanager
+    def span(self, name: str, **tags):
+        """
+        処理nameのスパンを、実行中のサイクルに記録するコンテキストマネージャ
+        スパンの記録（辞書）を渡すので、"tags"に結果などを後から追加できる。実行中のサイクルが無い場合は記録しない。
+        """
+
+        a_cycle = getattr(self.local, 'cycle', None)
+        a_span = {"name": name, "ts": self.now(), "duration": None, "thread": threading.current_thread().name, "tid": threading.get_ident(), "tags": dict(tags)}
+        if a_cycle is None:
+            yield a_span
+            return
+
+        stack = self.local.stack
+        a_span['parent'] = stack[-1]['name'] if stack else None
+        stack.append(a_span)
+        try:
+            yield a_span
+        except Exception as e:
+            a_span['tags']['error'] = repr(e)
+            raise
+        finally:
+            stack.pop()
+            a_span['duration'] = self.now() - a_span['ts']
+            with self.lock:
+                a_cycle['spans'].append(a_span)
+
+
+    def bind(self, function, name: str = None, **tags):
+        """
+        呼び出した時点のサイクルで、function（別スレッドで実行する処理）を実行する関数を返すメソッド
+        nameを指定すると、処理全体をそのスパンとして記録する。
+        """
+
+        a_cycle = getattr(self.local, 'cycle', None)
+
+        @functools.wraps(function)
+        def bound(*args, **kwargs):
+            previous = self.swap(a_cycle, [])
+            try:
+                if name is None:
+                    return function(*args, **kwargs)
+                with self.span(name, **tags):
+                    return function(*args, **kwargs)
+            finally:
+                self.swap(*previous)
+
+        return bound
+
+
+    def swap(self, a_cycle: dict, stack: list):
+        """
+        呼び出したスレッドの実行中のサイクルとスパンの入れ子を差し替え、元の組を返すヘルパー関数
+        """
+
+        previous = (getattr(self.local, 'cycle', None), getattr(self.local, 'stack', []))
+        self.local.cycle = a_cycle
+        self.local.stack = stack
+        return previous
+
+
+    def get_cycles(self, limit: int = None, kind: str = None):
+        """
+        保持しているサイクルを、新しい順の辞書のリストとして返すメソッド（スパンの時刻は、サイクルの開始からの秒数）
+            limit: 返すサイクルの数の上限
+            kind: 指定した場合、この種類のサイクルのみを返す。
+        """
+
+        with self.lock:
+            cycles = [dict(a_cycle, tags=dict(a_cycle['tags']), spans=list(a_cycle['spans'])) for a_cycle in reversed(self.cycles) if kind is None or a_cycle['kind'] == kind]
+        cycles = cycles[:limit] if limit else cycles
+
+        for a_cycle in cycles:
+            spans = sorted(a_cycle['spans'], key=lambda a_span: a_span['ts'])
+            a_cycle['spans'] = [
+                {
+                    "name": a_span['name'],
+                    "parent": a_span.get('parent'),
+                    "offset": round(a_span['ts'] - a_cycle['ts'], 6),
+                    "duration": round(a_span['duration'], 6) if a_span['duration'] is not None else None,
+                    "thread": a_span['thread'],
+                    "tags": a_span['tags']
+                }
+                for a_span in spans
+            ]
+            a_cycle['duration'] = round(a_cycle['duration'], 6) if a_cycle['duration'] is not None else None
+            span_ends = [a_span['offset'] + (a_span['duration'] or 0) for a_span in a_cycle['spans']]
+            a_cycle['last_span_end'] = round(max(span_ends), 6) if span_ends else None  # 別スレッドの処理も含めて、最後のスパンが終わった時刻
+            a_cycle['ts'] = round(a_cycle['ts'], 6)
+            a_cycle.pop('tid')
+        return cycles
+
+
+    def chrome_trace(self, limit: int = None, kind: str = None):
+        """
+        保持しているサイクルを、Chromeのトレース形式（Trace Event Format）の辞書として返すメソッド
+        サイクルとスパンは、実行したスレッドごとの"X"（所要時間つき）のイベントになる。
+        """
+
+        with self.lock:
+            cycles = [dict(a_cycle, tags=dict(a_cycle['tags']), spans=list(a_cycle['spans'])) for a_cycle in self.cycles if kind is None or a_cycle['kind'] == kind]
+        cycles = cycles[-limit:] if limit else cycles
+
+        now = self.now()
+        events = []
+        threads = {}
+        for a_cycle in cycles:
+            cycle_args = {"cycle": a_cycle['id'], **a_cycle['tags']}
+            threads[a_cycle['tid']] = a_cycle['thread']
+            events.append({
+                "name": f"cycle {a_cycle['id']} ({a_cycle['kind']})", "cat": "cycle", "ph": "X", "pid": 1, "tid": a_cycle['tid'],
+                "ts": round(a_cycle['ts'] * 1e6), "dur": round(((a_cycle['duration'] if a_cycle['duration'] is not None else now - a_cycle['ts'])) * 1e6),
+                "args": cycle_args
+            })
+            for a_span in a_cycle['spans']:
+                threads[a_span['tid']] = a_span['thread']
+                events.append({
+                    "name": a_span['name'], "cat": a_cycle['kind'], "ph": "X", "pid": 1, "tid": a_span['tid'],
+                    "ts": round(a_span['ts'] * 1e6), "dur": round((a_span['duration'] or 0) * 1e6),
+                    "args": dict(cycle_args, **a_span['tags'])
+                })
+
+        events.append({"name": "process_name", "ph": "M", "pid": 1, "args": {"name": "O_noder"}})
+        for tid, thread_name in threads.items():
+            events.append({"name": "thread_name", "ph": "M", "pid": 1, "tid": tid, "args": {"name": thread_name}})
+
+        return {"traceEvents": events, "displayTimeUnit": "ms", "otherData": {"epoch": datetime.fromtimestamp(self.wall_epoch, timezone.utc).isoformat()}}